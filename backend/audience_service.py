@@ -0,0 +1,254 @@
+"""
+Local audience-size estimation for TargetingFilters.
+Columnar NumPy audience table with packed bitmap indexes per attribute value.
+"""
+
+import hashlib
+import os
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+AUDIENCE_TABLE_PATH = os.environ.get("DMM_AUDIENCE_TABLE")  # optional .npz export
+SYNTHETIC_ROWS = int(os.environ.get("DMM_AUDIENCE_ROWS", "262144"))
+SYNTHETIC_POPULATION = int(os.environ.get("DMM_AUDIENCE_POPULATION", "60000000"))
+
+AGE_MIN, AGE_MAX = 13, 65
+
+# Synthetic vocabulary (India-first; imported tables bring their own)
+GEO: Dict[str, Dict[str, List[str]]] = {
+    "Maharashtra": {"Mumbai": ["Andheri", "Bandra", "Powai", "Thane"], "Pune": ["Baner", "Kothrud", "Hinjewadi"]},
+    "Karnataka": {"Bengaluru": ["Whitefield", "Indiranagar", "Koramangala"], "Mysuru": ["Gokulam"]},
+    "Delhi": {"New Delhi": ["Dwarka", "Saket", "Rohini"]},
+    "Haryana": {"Gurugram": ["DLF Phase 1", "Sohna Road"], "Faridabad": ["Sector 15"]},
+    "Tamil Nadu": {"Chennai": ["Adyar", "Anna Nagar", "Velachery"], "Coimbatore": ["RS Puram"]},
+    "Telangana": {"Hyderabad": ["Gachibowli", "Banjara Hills", "Kondapur"]},
+    "Gujarat": {"Ahmedabad": ["Satellite", "Bopal"], "Surat": ["Adajan"]},
+    "West Bengal": {"Kolkata": ["Salt Lake", "New Town"]},
+}
+STATE_WEIGHTS = [0.2, 0.15, 0.13, 0.08, 0.14, 0.12, 0.1, 0.08]
+GENDERS = ["Male", "Female", "Other"]
+GENDER_WEIGHTS = [0.52, 0.47, 0.01]
+INTERESTS = {
+    "Gardening": 0.12, "Home Decor": 0.18, "Sustainability": 0.1, "Real Estate": 0.08, "Interior Design": 0.09,
+    "Fitness": 0.2, "Travel": 0.25, "Food": 0.35, "Technology": 0.3, "Parenting": 0.12, "Luxury": 0.05,
+}
+HOME_INTERESTS = {"Gardening", "Home Decor", "Real Estate", "Interior Design"}
+BEHAVIORS = {
+    "Online Shoppers": 0.4, "Frequent Travelers": 0.1, "New Homeowners": 0.03, "Small Business Owners": 0.06,
+    "Engaged Shoppers": 0.2,
+}
+DEVICES = {"Mobile": 0.92, "Desktop": 0.35, "Tablet": 0.1}
+PLACEMENTS = {"Feed": 0.9, "Stories": 0.65, "Reels": 0.6, "Search": 0.7, "Display": 0.5, "Video": 0.55}
+INDUSTRIES = ["Real Estate", "Hospitality", "IT Services", "Manufacturing", "Healthcare", "Education", "Retail"]
+JOB_TITLES = ["Founder", "Facility Manager", "Architect", "Interior Designer", "HR Manager", "Procurement Manager"]
+COMPANY_SIZES = ["1-10", "11-50", "51-200", "201-500", "501-1000", "1000+"]
+B2B_SHARE = 0.35
+
+
+def _popcount(bitmap: np.ndarray) -> int:
+    return int(np.bitwise_count(bitmap).sum())
+
+
+class AudienceIndex:
+    """Bitmap index over an audience table; each bitmap is a packed uint64 array (one bit per row)"""
+
+    def __init__(self, n_rows: int, population: int, version: str = ""):
+        self.n_rows = n_rows
+        self.scale = population / max(n_rows, 1)
+        # Identifies the table the index was built from (same across workers; changes when the table does)
+        self.version = version
+        self.words = (n_rows + 63) // 64
+        self.all = self._pack(np.ones(n_rows, dtype=bool))
+        # dimension -> lowercased value -> (display value, bitmap)
+        self.dims: Dict[str, Dict[str, Tuple[str, np.ndarray]]] = {}
+        # age_le[a - AGE_MIN] = rows with age <= a; any age range is two lookups
+        self.age_le: Optional[np.ndarray] = None
+
+    def _pack(self, mask: np.ndarray) -> np.ndarray:
+        padded = np.zeros(self.words * 64, dtype=bool)
+        padded[:mask.shape[0]] = mask
+        return np.packbits(padded, bitorder="little").view(np.uint64)
+
+    def add_dim(self, dim: str, value: str, mask: np.ndarray):
+        self.dims.setdefault(dim, {})[value.lower()] = (value, self._pack(mask))
+
+    def set_ages(self, ages: np.ndarray):
+        # AGE_MAX means "65+" as in the ad platforms' targeting, so older (imported) rows count as 65
+        ages = np.clip(ages, AGE_MIN, AGE_MAX)
+        self.age_le = np.stack([self._pack(ages <= a) for a in range(AGE_MIN, AGE_MAX + 1)])
+
+    def age_range(self, lo: Optional[int], hi: Optional[int]) -> np.ndarray:
+        # Saved campaign docs may carry ages as strings from the form
+        lo = max(int(lo) if lo else AGE_MIN, AGE_MIN)
+        hi = min(int(hi) if hi else AGE_MAX, AGE_MAX)
+        if lo > hi:
+            return np.zeros(self.words, dtype=np.uint64)
+        upper = self.age_le[hi - AGE_MIN]
+        return upper if lo == AGE_MIN else upper & ~self.age_le[lo - 1 - AGE_MIN]
+
+    def any_of(self, dim: str, values: List[str], unknown: List[str]) -> np.ndarray:
+        out = np.zeros(self.words, dtype=np.uint64)
+        index = self.dims.get(dim, {})
+        for v in values:
+            hit = index.get(v.strip().lower())
+            if hit is None:
+                unknown.append(f"{dim}:{v}")
+            else:
+                out |= hit[1]
+        return out
+
+    def vocabulary(self) -> Dict[str, List[str]]:
+        return {dim: [display for display, _ in values.values()] for dim, values in self.dims.items()}
+
+    def steps(self, t: Dict[str, Any], unknown: List[str]) -> List[Tuple[str, np.ndarray]]:
+        """One bitmap per filter in a TargetingFilters dict (OR within a dimension)"""
+        steps: List[Tuple[str, np.ndarray]] = []
+        if t.get("age_min") or t.get("age_max"):
+            steps.append(("age", self.age_range(t.get("age_min"), t.get("age_max"))))
+        if t.get("country"):
+            steps.append(("country", self.any_of("country", [t["country"]], unknown)))
+        # Geo hierarchy: the most specific level given decides
+        for level in ("areas", "cities", "states"):
+            if t.get(level):
+                steps.append((level, self.any_of(level, t[level], unknown)))
+                break
+        for dim in ("gender", "interests", "behaviors", "devices", "placements",
+                    "industries", "job_titles", "company_sizes"):
+            if t.get(dim):
+                steps.append((dim, self.any_of(dim, t[dim], unknown)))
+        return steps
+
+    def compile(self, t: Dict[str, Any]) -> Tuple[np.ndarray, List[str]]:
+        """Rows matched by a TargetingFilters dict (AND across dimensions) and any unknown values"""
+        unknown: List[str] = []
+        current = self.all.copy()
+        for _, bitmap in self.steps(t, unknown):
+            current &= bitmap
+        return current, unknown
+
+    def estimate(self, t: Dict[str, Any]) -> Dict[str, Any]:
+        """Reach estimate for a TargetingFilters dict: OR within a dimension, AND across dimensions"""
+        started = time.perf_counter()
+        unknown: List[str] = []
+        steps = self.steps(t, unknown)
+        current = self.all.copy()
+        funnel = []
+        for name, bitmap in steps:
+            current &= bitmap
+            rows = _popcount(current)
+            funnel.append({"filter": name, "estimated_reach": int(rows * self.scale)})
+        rows = _popcount(current)
+        return {
+            "estimated_reach": int(rows * self.scale),
+            "reach_low": int(max(rows - 2 * np.sqrt(rows), 0) * self.scale),
+            "reach_high": int((rows + 2 * np.sqrt(rows)) * self.scale),
+            "universe": int(self.n_rows * self.scale),
+            "share": round(rows / self.n_rows, 6) if self.n_rows else 0.0,
+            "funnel": funnel,
+            "unknown_values": unknown,
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+
+def _multi(rng: np.random.RandomState, n: int, probs: Dict[str, float]):
+    for value, p in probs.items():
+        yield value, rng.random_sample(n) < p
+
+
+def build_synthetic(n_rows: int = SYNTHETIC_ROWS, population: int = SYNTHETIC_POPULATION, seed: int = 7) -> AudienceIndex:
+    rng = np.random.RandomState(seed)
+    idx = AudienceIndex(n_rows, population, version=f"synthetic:{n_rows}:{population}:{seed}")
+    ages = np.clip(rng.normal(33, 11, n_rows).round(), AGE_MIN, AGE_MAX).astype(np.int16)
+    idx.set_ages(ages)
+    # Older users skew towards home/real-estate interests
+    home_boost = 0.6 + (ages - AGE_MIN) / (AGE_MAX - AGE_MIN)
+
+    gender = rng.choice(len(GENDERS), n_rows, p=GENDER_WEIGHTS)
+    for i, g in enumerate(GENDERS):
+        idx.add_dim("gender", g, gender == i)
+
+    idx.add_dim("country", "India", np.ones(n_rows, dtype=bool))
+    states = list(GEO)
+    state_code = rng.choice(len(states), n_rows, p=STATE_WEIGHTS)
+    city_code = np.full(n_rows, -1, dtype=np.int32)
+    area_code = np.full(n_rows, -1, dtype=np.int32)
+    city_names: List[str] = []
+    area_names: List[str] = []
+    for s_i, state in enumerate(states):
+        in_state = state_code == s_i
+        idx.add_dim("states", state, in_state)
+        city_pick = rng.randint(0, len(GEO[state]), n_rows)
+        for c_i, (city, areas) in enumerate(GEO[state].items()):
+            in_city = in_state & (city_pick == c_i)
+            city_code[in_city] = len(city_names)
+            city_names.append(city)
+            area_pick = rng.randint(0, len(areas), n_rows)
+            for a_i, area in enumerate(areas):
+                area_code[in_city & (area_pick == a_i)] = len(area_names)
+                area_names.append(area)
+    for c_id, city in enumerate(city_names):
+        idx.add_dim("cities", city, city_code == c_id)
+    for a_id, area in enumerate(area_names):
+        idx.add_dim("areas", area, area_code == a_id)
+
+    for value, p in INTERESTS.items():
+        prob = np.clip(p * home_boost, 0, 1) if value in HOME_INTERESTS else p
+        idx.add_dim("interests", value, rng.random_sample(n_rows) < prob)
+    for value, mask in _multi(rng, n_rows, BEHAVIORS):
+        idx.add_dim("behaviors", value, mask)
+    for value, mask in _multi(rng, n_rows, DEVICES):
+        idx.add_dim("devices", value, mask)
+    for value, mask in _multi(rng, n_rows, PLACEMENTS):
+        idx.add_dim("placements", value, mask)
+
+    is_b2b = (rng.random_sample(n_rows) < B2B_SHARE) & (ages >= 22)
+    for dim, values in (("industries", INDUSTRIES), ("job_titles", JOB_TITLES), ("company_sizes", COMPANY_SIZES)):
+        code = rng.randint(0, len(values), n_rows)
+        for i, v in enumerate(values):
+            idx.add_dim(dim, v, is_b2b & (code == i))
+    return idx
+
+
+def load_table(path: str, population: Optional[int] = None) -> AudienceIndex:
+    """Build the index from an .npz export.
+
+    Expected arrays: ``age`` (int) plus, per dimension, ``<dim>__values`` (str) and
+    ``<dim>__codes`` (int, one per row; -1 = missing) for single-valued dims or
+    ``<dim>__<i>`` boolean masks for multi-valued dims.
+    """
+    data = np.load(path, allow_pickle=False)
+    ages = data["age"]
+    n_rows = int(ages.shape[0])
+    if population is None:
+        population = int(data["population"]) if "population" in data.files else n_rows
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    idx = AudienceIndex(n_rows, population, version=f"table:{digest.hexdigest()[:16]}")
+    idx.set_ages(ages)
+    for key in data.files:
+        if not key.endswith("__values"):
+            continue
+        dim = key[: -len("__values")]
+        values = [str(v) for v in data[key]]
+        if f"{dim}__codes" in data:
+            codes = data[f"{dim}__codes"]
+            for i, v in enumerate(values):
+                idx.add_dim(dim, v, codes == i)
+        else:
+            for i, v in enumerate(values):
+                idx.add_dim(dim, v, data[f"{dim}__{i}"].astype(bool))
+    return idx
+
+
+_index: Optional[AudienceIndex] = None
+
+
+def get_index() -> AudienceIndex:
+    global _index
+    if _index is None:
+        _index = load_table(AUDIENCE_TABLE_PATH) if AUDIENCE_TABLE_PATH else build_synthetic()
+    return _index
@@ -0,0 +1,131 @@
+"""
+Deterministic budget allocation across campaign channels.
+Saturating per-channel response curves solved with vectorized water-filling (NumPy).
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# Default response curves in the budget currency (INR-scale defaults).
+# cpc: cost per click at low spend; cpm: cost per 1000 impressions;
+# max_daily_clicks: saturation level the channel approaches as daily spend grows.
+DEFAULT_CURVES: Dict[str, Dict[str, float]] = {
+    "google_ads": {"cpc": 18.0, "cpm": 220.0, "max_daily_clicks": 4000, "cvr": 0.045},
+    "facebook_ads": {"cpc": 9.0, "cpm": 120.0, "max_daily_clicks": 6000, "cvr": 0.025},
+    "instagram_ads": {"cpc": 11.0, "cpm": 140.0, "max_daily_clicks": 5000, "cvr": 0.022},
+    "youtube_ads": {"cpc": 7.0, "cpm": 90.0, "max_daily_clicks": 3500, "cvr": 0.012},
+    "linkedin_ads": {"cpc": 65.0, "cpm": 600.0, "max_daily_clicks": 800, "cvr": 0.05},
+    "email_marketing": {"cpc": 2.5, "cpm": 40.0, "max_daily_clicks": 1200, "cvr": 0.035},
+    "sms_marketing": {"cpc": 4.0, "cpm": 150.0, "max_daily_clicks": 900, "cvr": 0.02},
+    "influencer_marketing": {"cpc": 12.0, "cpm": 180.0, "max_daily_clicks": 2500, "cvr": 0.018},
+}
+GENERIC_CURVE = {"cpc": 15.0, "cpm": 180.0, "max_daily_clicks": 2000, "cvr": 0.02}
+
+_BISECT_ITERS = 60
+
+
+def channel_curves(channels: List[str], overrides: Optional[Dict[str, Dict[str, float]]] = None) -> Dict[str, Dict[str, float]]:
+    overrides = overrides or {}
+    curves = {}
+    for ch in channels:
+        curves[ch] = {**DEFAULT_CURVES.get(ch, GENERIC_CURVE), **{k: v for k, v in (overrides.get(ch) or {}).items() if v}}
+    return curves
+
+
+def _solve(daily_budget: float, cap: np.ndarray, scale: np.ndarray, value: np.ndarray) -> np.ndarray:
+    """Maximize sum value*cap*(1-exp(-x/scale)) subject to sum x = budget, x >= 0.
+
+    KKT: marginal value (value*cap/scale)*exp(-x/scale) equals a common lambda, so
+    x = scale*ln(value*cap/(scale*lambda)) clipped at 0; bisect lambda on the budget.
+    """
+    if daily_budget <= 0:
+        return np.zeros_like(cap)
+    slope0 = value * cap / scale
+    lo, hi = 1e-12, float(slope0.max())
+    for _ in range(_BISECT_ITERS):
+        lam = np.sqrt(lo * hi)
+        spend = np.maximum(scale * np.log(slope0 / lam), 0.0).sum()
+        if spend > daily_budget:
+            lo = lam
+        else:
+            hi = lam
+    x = np.maximum(scale * np.log(slope0 / hi), 0.0)
+    # Spread the bisection residue proportionally so the plan sums exactly
+    total = x.sum()
+    return x * (daily_budget / total) if total > 0 else np.full_like(cap, daily_budget / len(cap))
+
+
+def allocate(
+    channels: List[str],
+    budget: float,
+    duration_days: int,
+    overrides: Optional[Dict[str, Dict[str, float]]] = None,
+    optimize_for: str = "conversions",
+) -> Dict[str, Any]:
+    """Split budget across channels and return a structured daily plan.
+
+    optimize_for is "conversions" (clicks weighted by channel CVR) or "clicks".
+    """
+    started = time.perf_counter()
+    channels = list(dict.fromkeys(channels))
+    days = max(int(duration_days or 1), 1)
+    if not channels:
+        return {"channels": [], "daily_plan": [], "total_budget": budget, "duration_days": days, "optimize_for": optimize_for}
+    curves = channel_curves(channels, overrides)
+    cpc = np.array([curves[c]["cpc"] for c in channels], dtype=float)
+    cpm = np.array([curves[c]["cpm"] for c in channels], dtype=float)
+    cvr = np.array([curves[c]["cvr"] for c in channels], dtype=float)
+    cap = np.array([curves[c]["max_daily_clicks"] for c in channels], dtype=float)
+    # Initial slope cap/scale must equal 1/cpc (clicks per unit spend at low spend)
+    scale = cap * cpc
+
+    daily_budget = float(budget) / days
+    value = cvr if optimize_for == "conversions" else np.ones_like(cvr)
+    daily = _solve(daily_budget, cap, scale, value)
+    clicks = cap * (1 - np.exp(-daily / scale))
+    impressions = daily / cpm * 1000
+    conversions = clicks * cvr
+    total_clicks = clicks.sum() * days
+
+    allocations = []
+    for i, ch in enumerate(channels):
+        allocations.append({
+            "channel": ch,
+            "daily_budget": round(float(daily[i]), 2),
+            "total_budget": round(float(daily[i] * days), 2),
+            "share": round(float(daily[i] / daily_budget), 4) if daily_budget else 0.0,
+            "expected_daily_clicks": round(float(clicks[i]), 1),
+            "expected_impressions": int(impressions[i] * days),
+            "expected_clicks": int(clicks[i] * days),
+            "expected_conversions": round(float(conversions[i] * days), 1),
+            "effective_cpc": round(float(daily[i] / clicks[i]), 2) if clicks[i] > 0 else None,
+            "saturation": round(float(clicks[i] / cap[i]), 3),
+            "curve": curves[ch],
+        })
+    daily_row = {ch: round(float(daily[i]), 2) for i, ch in enumerate(channels)}
+    return {
+        "total_budget": float(budget),
+        "duration_days": days,
+        "optimize_for": optimize_for,
+        "daily_budget": round(daily_budget, 2),
+        "channels": allocations,
+        "daily_plan": [{"day": d + 1, "spend": daily_row} for d in range(days)],
+        "expected_clicks": int(total_clicks),
+        "expected_conversions": round(float(conversions.sum() * days), 1),
+        "blended_cpc": round(float(budget) / total_clicks, 2) if total_clicks else None,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def allocation_summary(plan: Dict[str, Any]) -> str:
+    """One-line grounding text for the LLM prompt"""
+    parts = [
+        f"{a['channel']}={a['share'] * 100:.0f}% ({a['daily_budget']}/day, ~{a['expected_clicks']} clicks, "
+        f"saturation {a['saturation'] * 100:.0f}%)"
+        for a in plan.get("channels", [])
+    ]
+    if not parts:
+        return "None"
+    return "; ".join(parts) + f"; blended CPC {plan.get('blended_cpc')}"
@@ -0,0 +1,206 @@
+"""
+Batch Canva design rendering.
+One template, many variable sets: identical sets are rendered once, results are
+stored by (template, variables hash) so repeats are free, and renders run through
+a bounded worker pool with retry while batch progress is kept in Mongo.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import os
+import random
+import time
+import uuid
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+DESIGNS_COLLECTION = "canva_designs"
+BATCHES_COLLECTION = "canva_batches"
+CONCURRENCY = int(os.environ.get("DMM_CANVA_CONCURRENCY", "4"))
+MAX_ATTEMPTS = int(os.environ.get("DMM_CANVA_MAX_ATTEMPTS", "3"))
+RENDER_TIMEOUT_SECONDS = float(os.environ.get("DMM_CANVA_RENDER_TIMEOUT_SECONDS", "60"))
+RETRY_BASE_SECONDS = 0.5
+MAX_BATCH = 1000
+HEARTBEAT_SECONDS = 10.0
+# A running batch without a heartbeat for this long lost its worker (restart/crash) and is marked failed
+STALE_SECONDS = float(os.environ.get("DMM_CANVA_STALE_SECONDS", "60"))
+ABANDONED_ERROR = "worker stopped before the batch finished; resubmit to render the rest (finished designs are cached)"
+
+
+def variables_hash(template_id: str, variables: Dict[str, Any]) -> str:
+    canonical = json.dumps({"t": template_id, "v": variables}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()[:40]
+
+
+class MockCanvaBackend:
+    """Stand-in for the Canva autofill API: latency plus an optional transient failure rate"""
+
+    def __init__(self, latency: float = 0.05, failure_rate: float = 0.0):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.renders = 0
+
+    async def render(self, template_id: str, variables: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.sleep(self.latency)
+        if random.random() < self.failure_rate:
+            raise RuntimeError("mock Canva render failed")
+        self.renders += 1
+        design_id = f"mock_design_{uuid.uuid4().hex[:8]}"
+        return {"design_id": design_id, "edit_url": f"https://www.canva.com/design/{design_id}/edit"}
+
+
+class CanvaBatchRenderer:
+    def __init__(self, get_db: Callable[[], Awaitable[Any]], backend: Any, concurrency: int = CONCURRENCY):
+        self.get_db = get_db
+        self.backend = backend
+        self.concurrency = concurrency
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    async def ensure_indexes(self, db):
+        await db[BATCHES_COLLECTION].create_index("id", unique=True)
+        await db[DESIGNS_COLLECTION].create_index([("template_id", 1), ("created_at", -1)])
+
+    async def submit(self, template_id: str, variable_sets: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create the batch record and start rendering in the background"""
+        db = await self.get_db()
+        keys = [variables_hash(template_id, v) for v in variable_sets]
+        unique: Dict[str, Dict[str, Any]] = {}
+        for key, variables in zip(keys, variable_sets):
+            unique.setdefault(key, variables)
+        existing = await db[DESIGNS_COLLECTION].find(
+            {"_id": {"$in": list(unique)}, "status": "done"}, {"_id": 1}
+        ).to_list(length=len(unique))
+        cached = {d["_id"] for d in existing}
+        batch = {
+            "id": str(uuid.uuid4()),
+            "template_id": template_id,
+            "keys": keys,
+            "total": len(keys),
+            "unique": len(unique),
+            "cached": len(cached),
+            "done": len(cached),
+            "failed": 0,
+            "status": "running" if len(cached) < len(unique) else "done",
+            "created_at": time.time(),
+            "heartbeat_at": time.time(),
+            "finished_at": None if len(cached) < len(unique) else time.time(),
+        }
+        await db[BATCHES_COLLECTION].insert_one(dict(batch))
+        todo = {k: v for k, v in unique.items() if k not in cached}
+        if todo:
+            # Fresh context: the batch must outlive the submitting request's deadline
+            task = asyncio.get_running_loop().create_task(
+                self._run(batch["id"], template_id, todo), context=contextvars.Context()
+            )
+            self._tasks[batch["id"]] = task
+            task.add_done_callback(lambda _: self._tasks.pop(batch["id"], None))
+        batch.pop("keys")
+        return batch
+
+    async def _run(self, batch_id: str, template_id: str, todo: Dict[str, Dict[str, Any]]):
+        db = await self.get_db()
+        sem = asyncio.Semaphore(self.concurrency)
+
+        async def one(key: str, variables: Dict[str, Any]):
+            async with sem:
+                ok = await self._render_once(db, key, template_id, variables)
+            await db[BATCHES_COLLECTION].update_one(
+                {"id": batch_id}, {"$inc": {"done" if ok else "failed": 1}, "$set": {"heartbeat_at": time.time()}}
+            )
+
+        async def heartbeat():
+            # Renders can take minutes; readers tell a slow batch from an orphaned one by this
+            while True:
+                await asyncio.sleep(HEARTBEAT_SECONDS)
+                await db[BATCHES_COLLECTION].update_one({"id": batch_id}, {"$set": {"heartbeat_at": time.time()}})
+
+        beat = asyncio.ensure_future(heartbeat())
+        status, error = "done", None
+        try:
+            await asyncio.gather(*(one(k, v) for k, v in todo.items()))
+        except Exception as e:
+            status, error = "failed", f"{type(e).__name__}: {e}"[:300]
+            logger.warning(f"canva batch {batch_id} failed: {error}")
+        finally:
+            beat.cancel()
+        await db[BATCHES_COLLECTION].update_one(
+            {"id": batch_id}, {"$set": {"status": status, "error": error, "finished_at": time.time()}}
+        )
+
+    async def fail_stale(self, db) -> int:
+        """Mark running batches whose worker stopped heartbeating as failed (at startup and on read)"""
+        now = time.time()
+        cutoff = now - STALE_SECONDS
+        result = await db[BATCHES_COLLECTION].update_many(
+            {"status": "running", "$or": [
+                {"heartbeat_at": {"$lt": cutoff}},
+                {"heartbeat_at": {"$exists": False}, "created_at": {"$lt": cutoff}},
+            ]},
+            {"$set": {"status": "failed", "error": ABANDONED_ERROR, "finished_at": now}},
+        )
+        return result.modified_count
+
+    async def _render_once(self, db, key: str, template_id: str, variables: Dict[str, Any]) -> bool:
+        """Render a variable set unless another batch in this process already is; True on success"""
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.ensure_future(self._render(db, key, template_id, variables))
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(future)
+
+    async def _render(self, db, key: str, template_id: str, variables: Dict[str, Any]) -> bool:
+        error = ""
+        for attempt in range(1, MAX_ATTEMPTS + 1):
+            try:
+                result = await asyncio.wait_for(self.backend.render(template_id, variables), timeout=RENDER_TIMEOUT_SECONDS)
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"[:300]
+                if attempt < MAX_ATTEMPTS:
+                    await asyncio.sleep(RETRY_BASE_SECONDS * 2 ** (attempt - 1) * (0.5 + random.random()))
+                continue
+            await db[DESIGNS_COLLECTION].update_one(
+                {"_id": key},
+                {"$set": {"template_id": template_id, "variables": variables, "status": "done", "attempts": attempt,
+                          "error": None, "created_at": time.time(), **result}},
+                upsert=True,
+            )
+            return True
+        await db[DESIGNS_COLLECTION].update_one(
+            {"_id": key},
+            {"$set": {"template_id": template_id, "variables": variables, "status": "failed", "attempts": MAX_ATTEMPTS,
+                      "error": error, "created_at": time.time()}},
+            upsert=True,
+        )
+        return False
+
+    async def get(self, batch_id: str, include_results: bool = True) -> Optional[Dict[str, Any]]:
+        db = await self.get_db()
+        batch = await db[BATCHES_COLLECTION].find_one({"id": batch_id}, {"_id": 0})
+        if batch is None:
+            return None
+        if batch["status"] == "running" and batch.get("heartbeat_at", batch["created_at"]) < time.time() - STALE_SECONDS:
+            taken = await db[BATCHES_COLLECTION].update_one(
+                {"id": batch_id, "status": "running"},
+                {"$set": {"status": "failed", "error": ABANDONED_ERROR, "finished_at": time.time()}},
+            )
+            if taken.modified_count:
+                batch.update(status="failed", error=ABANDONED_ERROR)
+        keys = batch.pop("keys")
+        processed = batch["done"] + batch["failed"]
+        batch["progress"] = round(processed / batch["unique"], 4) if batch["unique"] else 1.0
+        if include_results:
+            designs = await db[DESIGNS_COLLECTION].find({"_id": {"$in": list(set(keys))}}).to_list(length=len(keys))
+            by_key = {d.pop("_id"): d for d in designs}
+            # One row per submitted variable set, in submission order
+            batch["results"] = [
+                {"index": i, "key": k, **({f: by_key[k].get(f) for f in ("status", "design_id", "edit_url", "error")}
+                                          if k in by_key else {"status": "pending"})}
+                for i, k in enumerate(keys)
+            ]
+        return batch
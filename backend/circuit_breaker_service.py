@@ -0,0 +1,147 @@
+"""
+Circuit breakers for outbound LLM providers.
+One breaker per (provider, model) with rolling error-rate and slow-call windows,
+half-open probing, and immediate rejection while open.
+"""
+
+import os
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Deque, Dict, Tuple, TypeVar
+
+T = TypeVar("T")
+
+WINDOW_SECONDS = float(os.environ.get("DMM_BREAKER_WINDOW_SECONDS", "60"))
+MIN_CALLS = int(os.environ.get("DMM_BREAKER_MIN_CALLS", "5"))
+ERROR_RATE_THRESHOLD = float(os.environ.get("DMM_BREAKER_ERROR_RATE", "0.5"))
+SLOW_CALL_SECONDS = float(os.environ.get("DMM_BREAKER_SLOW_CALL_SECONDS", "30"))
+SLOW_RATE_THRESHOLD = float(os.environ.get("DMM_BREAKER_SLOW_RATE", "0.8"))
+OPEN_SECONDS = float(os.environ.get("DMM_BREAKER_OPEN_SECONDS", "30"))
+HALF_OPEN_PROBES = int(os.environ.get("DMM_BREAKER_HALF_OPEN_PROBES", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the provider while the breaker is open"""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        # Bumped on every state change; calls admitted under an older generation don't count
+        self.generation = 0
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        # (timestamp, ok, latency_seconds)
+        self.calls: Deque[Tuple[float, bool, float]] = deque()
+        self.rejected = 0
+        self.last_error: str = ""
+
+    def _prune(self, now: float):
+        while self.calls and self.calls[0][0] < now - WINDOW_SECONDS:
+            self.calls.popleft()
+
+    def _rates(self) -> Tuple[int, float, float]:
+        n = len(self.calls)
+        if not n:
+            return 0, 0.0, 0.0
+        errors = sum(1 for _, ok, _ in self.calls if not ok)
+        slow = sum(1 for _, _, lat in self.calls if lat >= SLOW_CALL_SECONDS)
+        return n, errors / n, slow / n
+
+    def _before_call(self) -> int:
+        """Admit a call (or raise) and return the generation it was admitted under"""
+        now = time.monotonic()
+        if self.state == OPEN:
+            if now - self.opened_at < OPEN_SECONDS:
+                self.rejected += 1
+                raise CircuitOpenError(f"circuit {self.name} is open")
+            self._transition(HALF_OPEN)
+            self.probes_in_flight = 0
+        if self.state == HALF_OPEN:
+            if self.probes_in_flight >= HALF_OPEN_PROBES:
+                self.rejected += 1
+                raise CircuitOpenError(f"circuit {self.name} is half-open (probe in flight)")
+            self.probes_in_flight += 1
+        return self.generation
+
+    def _record(self, generation: int, ok: bool, latency: float, error: str = ""):
+        now = time.monotonic()
+        if not ok:
+            self.last_error = error[:200]
+        if generation != self.generation:
+            # Admitted before the last state change (e.g. a slow CLOSED call finishing while
+            # HALF_OPEN): it is neither the probe nor part of the current window
+            return
+        if self.state == HALF_OPEN:
+            self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+            if ok and latency < SLOW_CALL_SECONDS:
+                self._transition(CLOSED)
+                self.calls.clear()
+            else:
+                self._open(now)
+            return
+        self.calls.append((now, ok, latency))
+        self._prune(now)
+        n, error_rate, slow_rate = self._rates()
+        if n >= MIN_CALLS and (error_rate >= ERROR_RATE_THRESHOLD or slow_rate >= SLOW_RATE_THRESHOLD):
+            self._open(now)
+
+    def _transition(self, state: str):
+        self.state = state
+        self.generation += 1
+
+    def _open(self, now: float):
+        self._transition(OPEN)
+        self.opened_at = now
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        generation = self._before_call()
+        started = time.monotonic()
+        try:
+            result = await fn()
+        except CircuitOpenError:
+            raise
+        except BaseException as e:
+            # Cancellation (e.g. a losing hedge) says nothing about provider health
+            if isinstance(e, Exception):
+                self._record(generation, False, time.monotonic() - started, f"{type(e).__name__}: {e}")
+            elif self.state == HALF_OPEN and generation == self.generation:
+                self.probes_in_flight = max(self.probes_in_flight - 1, 0)
+            raise
+        self._record(generation, True, time.monotonic() - started)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        self._prune(time.monotonic())
+        n, error_rate, slow_rate = self._rates()
+        latencies = sorted(lat for _, _, lat in self.calls)
+        return {
+            "state": self.state,
+            "window_calls": n,
+            "error_rate": round(error_rate, 3),
+            "slow_rate": round(slow_rate, 3),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1) if latencies else None,
+            "rejected": self.rejected,
+            "open_for_s": round(max(OPEN_SECONDS - (time.monotonic() - self.opened_at), 0), 1) if self.state == OPEN else 0,
+            "last_error": self.last_error or None,
+        }
+
+
+class BreakerRegistry:
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+
+    def get(self, provider: str, model: str) -> CircuitBreaker:
+        name = f"{provider}:{model}"
+        if name not in self._breakers:
+            self._breakers[name] = CircuitBreaker(name)
+        return self._breakers[name]
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        return {name: b.snapshot() for name, b in self._breakers.items()}
+
+
+breakers = BreakerRegistry()
@@ -0,0 +1,106 @@
+"""
+Per-request deadlines carried in a contextvar.
+The budget comes from the X-Request-Timeout header or a route default; Mongo
+(via pymongo's timeout context, which sets maxTimeMS), LLM and httpx timeouts are
+derived from what is left, and an exhausted budget answers 504.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from typing import Dict, Optional
+
+import pymongo
+from fastapi import HTTPException
+
+HEADER = b"x-request-timeout"  # seconds, e.g. "12.5"
+DEFAULT_SECONDS = float(os.environ.get("DMM_DEADLINE_SECONDS", "30"))
+MAX_SECONDS = float(os.environ.get("DMM_DEADLINE_MAX_SECONDS", "300"))
+# Longest matching path prefix wins
+ROUTE_DEFAULTS: Dict[str, float] = {
+    "/api/ai/": float(os.environ.get("DMM_DEADLINE_AI_SECONDS", "120")),
+    "/api/ai/generate-content/fanout": float(os.environ.get("DMM_DEADLINE_FANOUT_SECONDS", "300")),
+}
+
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("dmm_deadline", default=None)
+
+
+class DeadlineExceeded(HTTPException):
+    def __init__(self, detail: str = "Request deadline exceeded"):
+        super().__init__(status_code=504, detail=detail)
+
+
+def remaining() -> Optional[float]:
+    """Seconds left for the current request, or None outside a request"""
+    deadline = _deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+def budget(cap: float) -> float:
+    """Timeout for a downstream call: min(cap, time left). Raises DeadlineExceeded when nothing is left."""
+    left = remaining()
+    if left is None:
+        return cap
+    if left <= 0:
+        raise DeadlineExceeded()
+    return min(cap, left)
+
+
+def route_default(path: str) -> float:
+    best, seconds = "", DEFAULT_SECONDS
+    for prefix, value in ROUTE_DEFAULTS.items():
+        if path.startswith(prefix) and len(prefix) > len(best):
+            best, seconds = prefix, value
+    return seconds
+
+
+def _requested(scope) -> Optional[float]:
+    raw = dict(scope.get("headers") or []).get(HEADER)
+    if not raw:
+        return None
+    try:
+        value = float(raw)
+    except ValueError:
+        return None
+    return value if value > 0 else None
+
+
+class DeadlineMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        seconds = min(_requested(scope) or route_default(scope["path"]), MAX_SECONDS)
+        token = _deadline.set(time.monotonic() + seconds)
+        started = False
+
+        async def deadline_send(message):
+            nonlocal started
+            if message["type"] == "http.response.start":
+                started = True
+                left = remaining()
+                if message["status"] >= 500 and left is not None and left <= 0:
+                    # A dependency failed because the budget ran out: report it as such
+                    message = {**message, "status": 504}
+            await send(message)
+
+        try:
+            # pymongo derives maxTimeMS / socket timeouts for every operation from this
+            with pymongo.timeout(seconds):
+                await asyncio.wait_for(self.app(scope, receive, deadline_send), timeout=seconds)
+        except asyncio.TimeoutError:
+            if started:
+                # Streaming response already under way; just stop it
+                return
+            body = b'{"detail":"Request deadline exceeded"}'
+            await send({
+                "type": "http.response.start",
+                "status": 504,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+            })
+            await send({"type": "http.response.body", "body": body})
+        finally:
+            _deadline.reset(token)
@@ -0,0 +1,185 @@
+"""
+Near-duplicate detection for generated marketing content.
+Computes SimHash + MinHash fingerprints and keeps a banded LSH index in Mongo.
+"""
+
+import hashlib
+import re
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Content collections that get fingerprinted on insert
+DEDUP_ITEM_TYPES = ("reel", "ugc")
+# Fields whose text identifies a content doc; manual saves may carry only a placeholder ai_content
+CONTENT_TEXT_FIELDS = ("ai_content", "title", "caption", "script", "brief", "target_audience")
+
+SHINGLE_SIZE = 3
+NUM_PERM = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERM // LSH_BANDS
+
+# Near-duplicate thresholds (either condition flags a match)
+JACCARD_THRESHOLD = 0.8
+SIMHASH_MAX_DISTANCE = 3
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+_rng = np.random.RandomState(1)
+_PERM_A = _rng.randint(1, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+_PERM_B = _rng.randint(0, 1 << 32, size=NUM_PERM, dtype=np.uint64)
+
+_TOKEN_RE = re.compile(r"[a-z0-9#@]+")
+
+
+def _hash64(token: str) -> int:
+    return int.from_bytes(hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall((text or "").lower())
+
+
+def shingles(tokens: List[str], size: int = SHINGLE_SIZE) -> List[str]:
+    if len(tokens) < size:
+        return [" ".join(tokens)] if tokens else []
+    return [" ".join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)]
+
+
+def simhash(tokens: List[str]) -> int:
+    """64-bit SimHash over token frequencies"""
+    if not tokens:
+        return 0
+    counts: Dict[str, int] = {}
+    for tok in tokens:
+        counts[tok] = counts.get(tok, 0) + 1
+    hashes = np.array([_hash64(t) for t in counts], dtype=np.uint64)
+    weights = np.array(list(counts.values()), dtype=np.int64)
+    bits = np.unpackbits(hashes.view(np.uint8).reshape(-1, 8), axis=1, bitorder="little").astype(np.int64)
+    score = (weights[:, None] * (2 * bits - 1)).sum(axis=0)
+    packed = np.packbits((score > 0).astype(np.uint8), bitorder="little")
+    return int.from_bytes(packed.tobytes(), "little")
+
+
+def minhash(shingle_set: List[str]) -> List[int]:
+    """MinHash signature (NUM_PERM x 32-bit) over the shingle set"""
+    if not shingle_set:
+        return [int(_MAX_HASH)] * NUM_PERM
+    hv = np.array([_hash64(s) & 0xFFFFFFFF for s in set(shingle_set)], dtype=np.uint64)
+    phv = ((hv[:, None] * _PERM_A + _PERM_B) % _MERSENNE_PRIME) & _MAX_HASH
+    return phv.min(axis=0).astype(np.int64).tolist()
+
+
+def lsh_bands(signature: List[int]) -> List[str]:
+    keys = []
+    for b in range(LSH_BANDS):
+        chunk = signature[b * LSH_ROWS:(b + 1) * LSH_ROWS]
+        digest = hashlib.blake2b(repr(chunk).encode(), digest_size=8).hexdigest()
+        keys.append(f"{b}:{digest}")
+    return keys
+
+
+def jaccard_estimate(a: List[int], b: List[int]) -> float:
+    if not a or not b:
+        return 0.0
+    return float(np.mean(np.asarray(a) == np.asarray(b)))
+
+
+def hamming64(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def fingerprint(text: str) -> Dict[str, Any]:
+    tokens = tokenize(text)
+    sig = minhash(shingles(tokens))
+    return {
+        # Stored as hex: Mongo ints are signed 64-bit
+        "simhash": format(simhash(tokens), "016x"),
+        "minhash": sig,
+        "bands": lsh_bands(sig),
+    }
+
+
+def content_text(doc: Dict[str, Any]) -> str:
+    """Text that identifies a content doc for dedup purposes (empty when it has none)"""
+    return " ".join(str(doc[f]) for f in CONTENT_TEXT_FIELDS if isinstance(doc.get(f), str) and doc[f].strip())
+
+
+def brief_text(content_type: str, platform: str, brief: str, target_audience: str, festival: Optional[str]) -> str:
+    """Text that identifies a generation request (for short-circuiting)"""
+    return " ".join([content_type or "", platform or "", brief or "", target_audience or "", festival or ""])
+
+
+class ContentDeduplicator:
+    """Fingerprint store + LSH lookup backed by the marketing_fingerprints collection"""
+
+    def __init__(self, db):
+        self.db = db
+        self.collection = db["marketing_fingerprints"]
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([("bands", 1)])
+        await self.collection.create_index([("item_type", 1), ("kind", 1), ("item_id", 1)], unique=True)
+
+    async def find_similar(
+        self, fp: Dict[str, Any], item_type: str, kind: str = "content", exclude_id: Optional[str] = None
+    ) -> Optional[Tuple[str, float]]:
+        """Best (item_id, similarity) above threshold among LSH candidates, or None"""
+        q: Dict[str, Any] = {"item_type": item_type, "kind": kind, "bands": {"$in": fp["bands"]}}
+        if exclude_id:
+            q["item_id"] = {"$ne": exclude_id}
+        candidates = await self.collection.find(q, {"_id": 0, "item_id": 1, "simhash": 1, "minhash": 1}).to_list(length=200)
+        best: Optional[Tuple[str, float]] = None
+        own_simhash = int(fp["simhash"], 16)
+        for c in candidates:
+            sim = jaccard_estimate(fp["minhash"], c.get("minhash") or [])
+            close = hamming64(own_simhash, int(c.get("simhash") or "0", 16)) <= SIMHASH_MAX_DISTANCE
+            if (sim >= JACCARD_THRESHOLD or close) and (best is None or sim > best[1]):
+                best = (c["item_id"], sim)
+        return best
+
+    async def index(self, item_id: str, item_type: str, fp: Dict[str, Any], kind: str = "content"):
+        await self.collection.update_one(
+            {"item_id": item_id, "item_type": item_type, "kind": kind},
+            {"$set": {**fp, "created_at": datetime.now(timezone.utc)}},
+            upsert=True,
+        )
+
+    async def check(self, doc: Dict[str, Any], item_type: str) -> Tuple[Dict[str, Any], Optional[Dict[str, Any]]]:
+        """Dedup fields to merge into a doc before insert, plus the fingerprint to index once the insert
+        succeeds; a doc without text gets neither (every empty doc would "match" every other)"""
+        text = content_text(doc)
+        if not tokenize(text):
+            return {}, None
+        fp = fingerprint(text)
+        match = await self.find_similar(fp, item_type, exclude_id=doc.get("id"))
+        fields: Dict[str, Any] = {"simhash": fp["simhash"]}
+        if match:
+            fields["near_duplicate_of"] = match[0]
+            fields["duplicate_similarity"] = round(match[1], 3)
+        return fields, fp
+
+    async def check_and_index(self, doc: Dict[str, Any], item_type: str) -> Dict[str, Any]:
+        """check() + index() for a doc that is already stored"""
+        fields, fp = await self.check(doc, item_type)
+        if fp is not None:
+            await self.index(doc["id"], item_type, fp)
+        return fields
+
+    async def backfill(self, item_type: str, collection, batch_size: int = 200) -> Dict[str, int]:
+        """Fingerprint existing docs that have no simhash yet and flag near-duplicates"""
+        scanned = flagged = skipped = 0
+        cursor = collection.find({"simhash": {"$exists": False}}, {"_id": 0}).sort("created_at", 1).batch_size(batch_size)
+        async for doc in cursor:
+            if not doc.get("id"):
+                continue
+            scanned += 1
+            fields = await self.check_and_index(doc, item_type)
+            if not fields:
+                skipped += 1
+                continue
+            if "near_duplicate_of" in fields:
+                flagged += 1
+            await collection.update_one({"id": doc["id"]}, {"$set": fields})
+        return {"scanned": scanned, "flagged": flagged, "skipped_no_text": skipped}
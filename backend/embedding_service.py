@@ -0,0 +1,302 @@
+"""
+Local semantic index over strategies and content docs.
+Text is embedded with a signed hashing vectorizer (unigrams + bigrams, no network,
+no model download) into L2-normalised float32 rows; a top-k query is one matrix-vector
+product. The matrix is updated on insert, snapshotted to disk, and caught up from Mongo
+by created_at so other workers' inserts show up too.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from datetime import timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from dedup_service import tokenize
+from timestamp_service import as_datetime, range_filter
+
+logger = logging.getLogger(__name__)
+
+DIM = int(os.environ.get("DMM_EMBED_DIM", "1024"))
+INDEX_PATH = os.environ.get(
+    "DMM_EMBED_INDEX_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "index", "embeddings.npz")
+)
+# Cosine similarity at or above which a generator serves the stored doc instead of calling the LLM
+REUSE_THRESHOLD = float(os.environ.get("DMM_SIMILAR_REUSE_THRESHOLD", "0.92"))
+SYNC_SECONDS = float(os.environ.get("DMM_EMBED_SYNC_SECONDS", "30"))
+SAVE_DELAY_SECONDS = 2.0
+# Inserts can commit slightly out of created_at order across workers
+SYNC_OVERLAP_SECONDS = 5.0
+
+STOPWORDS = frozenset("a an and are as at be by for from in is it of on or our the to with your".split())
+SNIPPET_CHARS = 160
+# Nearest candidates best() checks for one from the requester's own company
+BEST_CANDIDATES = 20
+
+
+def _features(text: str) -> Dict[str, float]:
+    tokens = [t for t in tokenize(text) if t not in STOPWORDS]
+    counts: Dict[str, float] = {}
+    for gram in tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]:
+        counts[gram] = counts.get(gram, 0.0) + 1.0
+    return counts
+
+
+def embed(text: str, dim: int = DIM) -> np.ndarray:
+    """Signed feature hashing with sublinear tf, L2-normalised (all-zero for empty text)"""
+    vec = np.zeros(dim, dtype=np.float32)
+    for gram, count in _features(text).items():
+        h = int.from_bytes(hashlib.blake2b(gram.encode("utf-8"), digest_size=8).digest(), "little")
+        vec[h % dim] += (1.0 if h >> 63 else -1.0) * (1.0 + math.log(count))
+    norm = float(np.linalg.norm(vec))
+    return vec / norm if norm else vec
+
+
+def item_text(item_type: str, doc: Dict[str, Any]) -> str:
+    """What a doc is "about" for reuse: the request fields, not the generated prose"""
+    if item_type == "strategy":
+        industry = doc.get("industry") or ""
+        # Industry counts twice: reuse across industries is rarely what anyone wants
+        parts = [industry, industry, doc.get("target_audience"), " ".join(doc.get("goals") or []), doc.get("budget")]
+    else:
+        parts = [doc.get("content_type") or item_type, doc.get("platform"), doc.get("brief"),
+                 doc.get("target_audience"), doc.get("festival")]
+    return " ".join(str(p) for p in parts if p)
+
+
+def item_scope(item_type: str, doc: Dict[str, Any]) -> str:
+    """Hard filter applied before ranking: industry for strategies, platform for content"""
+    value = doc.get("industry") if item_type == "strategy" else doc.get("platform")
+    return str(value or "").strip().lower()
+
+
+def item_owner(item_type: str, doc: Dict[str, Any]) -> str:
+    """Whose doc this is: strategies are only reused within the same company (content has no owner)"""
+    return str(doc.get("company_name") or "").strip().lower() if item_type == "strategy" else ""
+
+
+def _meta(item_type: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    if item_type == "strategy":
+        fields = ("company_name", "industry", "target_audience")
+        snippet = doc.get("strategy_content") or ""
+    else:
+        fields = ("content_type", "platform", "brief", "target_audience", "festival")
+        snippet = doc.get("ai_content") or ""
+    meta = {f: doc.get(f) for f in fields if doc.get(f)}
+    meta["snippet"] = str(snippet)[:SNIPPET_CHARS]
+    return meta
+
+
+class EmbeddingIndex:
+    def __init__(
+        self,
+        get_db: Callable[[], Awaitable[Any]],
+        collections: Dict[str, str],
+        path: str = INDEX_PATH,
+        dim: int = DIM,
+    ):
+        self.get_db = get_db
+        self.collections = collections  # item_type -> collection name
+        self.path = path
+        self.dim = dim
+        self._types = {t: i for i, t in enumerate(collections)}
+        self._vectors = np.zeros((256, dim), dtype=np.float32)
+        self._type_codes = np.zeros(256, dtype=np.int16)
+        self._scope_codes = np.zeros(256, dtype=np.int32)
+        self._scopes: Dict[str, int] = {"": 0}
+        self.size = 0
+        self.keys: List[Tuple[str, str]] = []
+        self.meta: List[Dict[str, Any]] = []
+        self._rows: Dict[Tuple[str, str], int] = {}
+        self.watermark: Optional[Any] = None  # newest created_at seen in Mongo
+        self.synced_at = 0.0
+        self._sync_task: Optional[asyncio.Task] = None
+        self._save_task: Optional[asyncio.Task] = None
+
+    # ----------------------
+    # Updates
+    # ----------------------
+    def _grow(self):
+        cap = self._vectors.shape[0] * 2
+        self._vectors = np.resize(self._vectors, (cap, self.dim))
+        self._type_codes = np.resize(self._type_codes, cap)
+        self._scope_codes = np.resize(self._scope_codes, cap)
+
+    def add(self, item_type: str, doc: Dict[str, Any]):
+        """Insert or replace one doc's row (no-op for unindexed types or docs without an id)"""
+        if item_type not in self._types or not doc.get("id"):
+            return
+        key = (item_type, doc["id"])
+        row = self._rows.get(key)
+        if row is None:
+            if self.size == self._vectors.shape[0]:
+                self._grow()
+            row = self.size
+            self.size += 1
+            self._rows[key] = row
+            self.keys.append(key)
+            self.meta.append({})
+        scope = item_scope(item_type, doc)
+        self._vectors[row] = embed(item_text(item_type, doc), self.dim)
+        self._type_codes[row] = self._types[item_type]
+        self._scope_codes[row] = self._scopes.setdefault(scope, len(self._scopes))
+        self.meta[row] = _meta(item_type, doc)
+        created = as_datetime(doc.get("created_at"))
+        if created is not None and (self.watermark is None or created > self.watermark):
+            self.watermark = created
+        self._schedule_save()
+
+    # ----------------------
+    # Queries
+    # ----------------------
+    def search(
+        self, item_type: str, text: str, k: int = 5, scope: Optional[str] = None, min_score: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        self._maybe_sync()
+        if item_type not in self._types or not self.size:
+            return []
+        query = embed(text, self.dim)
+        scores = self._vectors[:self.size] @ query
+        mask = self._type_codes[:self.size] == self._types[item_type]
+        if scope:
+            code = self._scopes.get(scope.strip().lower())
+            if code is None:
+                return []
+            mask &= self._scope_codes[:self.size] == code
+        scores = np.where(mask, scores, -np.inf)
+        k = max(1, min(k, self.size))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"type": self.keys[i][0], "id": self.keys[i][1], "score": round(float(scores[i]), 4), **self.meta[i]}
+            for i in top
+            if np.isfinite(scores[i]) and scores[i] >= min_score
+        ]
+
+    def best(
+        self, item_type: str, doc: Dict[str, Any], threshold: float = REUSE_THRESHOLD
+    ) -> Optional[Dict[str, Any]]:
+        """Closest stored doc in the same scope and of the same owner when it is similar enough to reuse"""
+        hits = self.search(item_type, item_text(item_type, doc), BEST_CANDIDATES,
+                           scope=item_scope(item_type, doc) or None, min_score=threshold)
+        owner = item_owner(item_type, doc)
+        return next((h for h in hits if item_owner(item_type, h) == owner), None)
+
+    # ----------------------
+    # Mongo catch-up
+    # ----------------------
+    def _maybe_sync(self):
+        if time.monotonic() - self.synced_at < SYNC_SECONDS or (self._sync_task and not self._sync_task.done()):
+            return
+        self.synced_at = time.monotonic()
+        # Fresh context: spawned from a request, the sync must not inherit its deadline/pymongo timeout
+        self._sync_task = asyncio.get_running_loop().create_task(self.sync(), context=contextvars.Context())
+
+    async def sync(self) -> int:
+        """Index docs created since the watermark (everything on the first run)"""
+        db = await self.get_db()
+        since = self.watermark
+        q: Dict[str, Any] = {}
+        if since is not None:
+            q = range_filter("created_at", since - timedelta(seconds=SYNC_OVERLAP_SECONDS))
+        added = 0
+        try:
+            for item_type, name in self.collections.items():
+                async for doc in db[name].find(q, {"_id": 0}):
+                    self.add(item_type, doc)
+                    added += 1
+        except Exception as e:
+            logger.warning(f"embedding index sync failed: {type(e).__name__}: {e}")
+        self.synced_at = time.monotonic()
+        return added
+
+    # ----------------------
+    # Persistence
+    # ----------------------
+    def _schedule_save(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._save_task is None or self._save_task.done():
+            self._save_task = loop.create_task(self._save_later(), context=contextvars.Context())
+
+    async def _save_later(self):
+        await asyncio.sleep(SAVE_DELAY_SECONDS)
+        await self.flush()
+
+    async def flush(self):
+        # Copy on the loop thread so the write sees a consistent snapshot
+        n = self.size
+        snapshot = {
+            "vectors": self._vectors[:n].copy(),
+            "type_codes": self._type_codes[:n].copy(),
+            "scope_codes": self._scope_codes[:n].copy(),
+            "header": np.array(json.dumps({
+                "dim": self.dim,
+                "types": list(self._types),
+                "scopes": list(self._scopes),
+                "keys": self.keys[:n],
+                "meta": self.meta[:n],
+                "watermark": self.watermark.isoformat() if self.watermark else None,
+            })),
+        }
+        await asyncio.to_thread(self._write, snapshot)
+
+    def _write(self, snapshot: Dict[str, np.ndarray]):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            np.savez(f, **snapshot)
+        os.replace(tmp, self.path)
+
+    def load(self) -> bool:
+        """Restore the last snapshot; False (and an empty index) when missing or built differently"""
+        try:
+            with np.load(self.path, allow_pickle=False) as data:
+                header = json.loads(str(data["header"]))
+                if header["dim"] != self.dim or header["types"] != list(self._types):
+                    return False
+                vectors, type_codes, scope_codes = data["vectors"], data["type_codes"], data["scope_codes"]
+        except (OSError, KeyError, ValueError) as e:
+            if not isinstance(e, FileNotFoundError):
+                logger.warning(f"embedding index snapshot unreadable, rebuilding: {e}")
+            return False
+        n = len(header["keys"])
+        cap = max(256, 1 << max(n - 1, 1).bit_length())
+        self._vectors = np.zeros((cap, self.dim), dtype=np.float32)
+        self._vectors[:n] = vectors
+        self._type_codes = np.zeros(cap, dtype=np.int16)
+        self._type_codes[:n] = type_codes
+        self._scope_codes = np.zeros(cap, dtype=np.int32)
+        self._scope_codes[:n] = scope_codes
+        self._scopes = {s: i for i, s in enumerate(header["scopes"])}
+        self.keys = [tuple(k) for k in header["keys"]]
+        self.meta = header["meta"]
+        self._rows = {k: i for i, k in enumerate(self.keys)}
+        self.size = n
+        self.watermark = as_datetime(header["watermark"])
+        return True
+
+    async def start(self):
+        """Load the snapshot off the event loop, then catch up from Mongo"""
+        await asyncio.to_thread(self.load)
+        self.synced_at = time.monotonic()
+        self._sync_task = asyncio.get_running_loop().create_task(self.sync(), context=contextvars.Context())
+
+    def snapshot(self) -> Dict[str, Any]:
+        counts = np.bincount(self._type_codes[:self.size], minlength=len(self._types))
+        return {
+            "size": self.size,
+            "dim": self.dim,
+            "by_type": {t: int(counts[i]) for t, i in self._types.items()},
+            "watermark": self.watermark,
+            "reuse_threshold": REUSE_THRESHOLD,
+        }
@@ -0,0 +1,82 @@
+"""
+Per-collection version stamps for conditional GETs.
+Every write path bumps its collection's stamp; list/detail endpoints derive a
+weak ETag from the stamps they read plus the query, and answer 304 without
+touching the data when the client's copy is current.
+"""
+
+import hashlib
+import os
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+COLLECTION = "collection_versions"
+# How long a stamp read from Mongo is trusted in-process (writes from this
+# process update it immediately; other workers' writes show up within this window)
+STAMP_TTL_SECONDS = float(os.environ.get("DMM_ETAG_STAMP_TTL_SECONDS", "1"))
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Weak comparison (RFC 7232 §2.3.2) against an If-None-Match header"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    opaque = tag[2:] if tag.startswith("W/") else tag
+    return any((t.strip()[2:] if t.strip().startswith("W/") else t.strip()) == opaque for t in if_none_match.split(","))
+
+
+class VersionStamps:
+    def __init__(self, get_db: Callable[[], Awaitable[Any]], ttl: float = STAMP_TTL_SECONDS):
+        self.get_db = get_db
+        self.ttl = ttl
+        self._local: Dict[str, Tuple[str, float]] = {}  # name -> (stamp, fetched_at)
+        self._written: Dict[str, float] = {}  # name -> last known write by any worker (monotonic)
+
+    async def bump(self, *names: str):
+        coll = (await self.get_db())[COLLECTION]
+        now = time.monotonic()
+        for name in names:
+            doc = await coll.find_one_and_update(
+                {"_id": name},
+                # epoch guards against counters restarting if the stamp collection is dropped
+                {"$inc": {"v": 1}, "$set": {"at": datetime.now(timezone.utc)},
+                 "$setOnInsert": {"epoch": uuid.uuid4().hex[:8]}},
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+            self._local[name] = (f"{doc['epoch']}.{doc['v']}", now)
+            self._written[name] = now
+
+    def since_write(self, name: str) -> Optional[float]:
+        """Seconds since the collection's last write (this process's, or another worker's as of the last
+        stamp fetch), None if unknown"""
+        written = self._written.get(name)
+        return None if written is None else time.monotonic() - written
+
+    async def stamps(self, names: Iterable[str]) -> Dict[str, str]:
+        now = time.monotonic()
+        names = list(names)
+        stale = [n for n in names if n not in self._local or now - self._local[n][1] > self.ttl]
+        if stale:
+            rows = await (await self.get_db())[COLLECTION].find({"_id": {"$in": stale}}).to_list(length=len(stale))
+            found = {r["_id"]: f"{r['epoch']}.{r['v']}" for r in rows}
+            wall = datetime.now(timezone.utc)
+            for r in rows:
+                at = r.get("at")
+                if isinstance(at, datetime):
+                    at = at if at.tzinfo else at.replace(tzinfo=timezone.utc)
+                    written = now - max((wall - at).total_seconds(), 0.0)
+                    self._written[r["_id"]] = max(self._written.get(r["_id"], written), written)
+            for n in stale:
+                self._local[n] = (found.get(n, "0"), now)
+        return {n: self._local[n][0] for n in names}
+
+    async def etag(self, names: Iterable[str], *query: Any) -> str:
+        stamps = await self.stamps(names)
+        raw = "|".join(f"{k}={v}" for k, v in sorted(stamps.items())) + "|" + repr(query)
+        return f'W/"{hashlib.sha1(raw.encode()).hexdigest()[:20]}"'
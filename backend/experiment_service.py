@@ -0,0 +1,254 @@
+"""
+A/B test analysis for campaign variants.
+Per-variant daily impressions/clicks/conversions are ingested (JSON or CSV) and
+rolled up per experiment; Beta-Binomial posteriors give each variant's probability
+of being best, and an expected-loss stopping rule says when a test can end. Every
+experiment being analysed is stacked into one (experiments x variants x draws) array.
+"""
+
+import asyncio
+import csv
+import io
+import math
+import os
+import time
+import uuid
+from datetime import date, datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from pymongo import UpdateOne
+
+EXPERIMENTS_COLLECTION = "experiments"
+DAILY_COLLECTION = "experiment_daily"
+COUNTERS = ("impressions", "clicks", "conversions")
+# metric -> (successes, trials)
+METRICS: Dict[str, Tuple[str, str]] = {
+    "ctr": ("clicks", "impressions"),
+    "cvr": ("conversions", "clicks"),
+    "conversion_rate": ("conversions", "impressions"),
+}
+DRAWS = int(os.environ.get("DMM_EXPERIMENT_DRAWS", "4000"))
+# Trials (the metric's denominator) every variant needs before a stop is called
+MIN_SAMPLE = int(os.environ.get("DMM_EXPERIMENT_MIN_SAMPLE", "1000"))
+# Stop once choosing the leader costs less than this fraction of the control's rate in expectation
+LOSS_THRESHOLD = float(os.environ.get("DMM_EXPERIMENT_LOSS_THRESHOLD", "0.01"))
+PROB_BEST_THRESHOLD = 0.95
+MAX_VARIANTS = 20
+# Counters are stored as Mongo int64
+MAX_COUNT = 2 ** 63 - 1
+# Upper bound on posterior samples held at once; larger batches are processed in chunks
+CHUNK_ELEMENTS = 2_000_000
+
+
+async def ensure_indexes(db):
+    await db[EXPERIMENTS_COLLECTION].create_index("id", unique=True)
+    await db[EXPERIMENTS_COLLECTION].create_index([("status", 1), ("created_at", -1)])
+    await db[DAILY_COLLECTION].create_index([("experiment_id", 1), ("variant", 1), ("date", 1)], unique=True)
+
+
+# ----------------------
+# Analysis
+# ----------------------
+def _counts(experiment: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+    succ_field, trial_field = METRICS[experiment.get("metric") or "conversion_rate"]
+    totals = experiment.get("totals") or {}
+    succ = np.array([float((totals.get(v) or {}).get(succ_field, 0)) for v in experiment["variants"]])
+    trials = np.array([float((totals.get(v) or {}).get(trial_field, 0)) for v in experiment["variants"]])
+    # Guard against reports where e.g. clicks exceed impressions
+    return np.minimum(succ, trials), trials
+
+
+def _analyze_chunk(chunk: List[Dict[str, Any]], draws: int, rng: np.random.Generator) -> List[Dict[str, Any]]:
+    e, k = len(chunk), max(len(x["variants"]) for x in chunk)
+    succ = np.zeros((e, k))
+    trials = np.zeros((e, k))
+    valid = np.zeros((e, k), dtype=bool)
+    for i, x in enumerate(chunk):
+        s, n = _counts(x)
+        succ[i, :len(s)], trials[i, :len(n)], valid[i, :len(s)] = s, n, True
+    # Beta(1, 1) prior; padded variant slots are sampled but masked out of every statistic
+    samples = rng.beta((1 + succ)[..., None], (1 + trials - succ)[..., None], size=(e, k, draws))
+    samples = np.where(valid[..., None], samples, -np.inf)
+    best = samples.max(axis=1)  # (e, draws)
+    prob_best = (samples.argmax(axis=1)[:, None, :] == np.arange(k)[None, :, None]).mean(axis=2)
+    loss = np.where(valid, (best[:, None, :] - samples).mean(axis=2), np.inf)
+    control_idx = np.array([x["variants"].index(x.get("control") or x["variants"][0]) for x in chunk])
+    control = samples[np.arange(e), control_idx]  # (e, draws)
+    beats_control = (samples > control[:, None, :]).mean(axis=2)
+    lift = np.where(valid[..., None], samples / np.maximum(control[:, None, :], 1e-12) - 1, 0.0)
+    lift_p = np.percentile(lift, [5, 50, 95], axis=2)  # (3, e, k)
+
+    out = []
+    for i, x in enumerate(chunk):
+        n_var = len(x["variants"])
+        leader = int(np.argmin(loss[i, :n_var]))
+        control_mean = (1 + succ[i, control_idx[i]]) / (2 + trials[i, control_idx[i]])
+        threshold = LOSS_THRESHOLD * control_mean
+        enough = bool((trials[i, :n_var] >= MIN_SAMPLE).all())
+        if enough and loss[i, leader] <= threshold:
+            decision = "stop_winner" if prob_best[i, leader] >= PROB_BEST_THRESHOLD else "stop_equivalent"
+        else:
+            decision = "continue"
+        out.append({
+            "experiment_id": x["id"],
+            "metric": x.get("metric") or "conversion_rate",
+            "decision": decision,
+            "leader": x["variants"][leader],
+            "loss_threshold": round(float(threshold), 8),
+            "min_sample_met": enough,
+            "variants": [
+                {
+                    "variant": v,
+                    "successes": int(succ[i, j]),
+                    "trials": int(trials[i, j]),
+                    "rate": round(float(succ[i, j] / trials[i, j]), 6) if trials[i, j] else None,
+                    "posterior_mean": round(float((1 + succ[i, j]) / (2 + trials[i, j])), 6),
+                    "prob_best": round(float(prob_best[i, j]), 4),
+                    "prob_beats_control": None if j == control_idx[i] else round(float(beats_control[i, j]), 4),
+                    "expected_loss": round(float(loss[i, j]), 8),
+                    "lift_vs_control": None if j == control_idx[i] else {
+                        "p5": round(float(lift_p[0, i, j]), 4),
+                        "p50": round(float(lift_p[1, i, j]), 4),
+                        "p95": round(float(lift_p[2, i, j]), 4),
+                    },
+                }
+                for j, v in enumerate(x["variants"])
+            ],
+        })
+    return out
+
+
+def analyze(experiments: List[Dict[str, Any]], draws: int = DRAWS, seed: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Posterior summaries and stop/continue decisions, vectorized across experiments"""
+    if not experiments:
+        return []
+    rng = np.random.default_rng(seed)
+    per_chunk = max(1, CHUNK_ELEMENTS // (draws * max(len(x["variants"]) for x in experiments)))
+    out: List[Dict[str, Any]] = []
+    for start in range(0, len(experiments), per_chunk):
+        out.extend(_analyze_chunk(experiments[start:start + per_chunk], draws, rng))
+    return out
+
+
+class ResultCache:
+    """Analysis per experiment keyed by its revision, so dashboards only recompute changed tests"""
+
+    def __init__(self):
+        self._results: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+
+    async def results(self, experiments: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        stale = [x for x in experiments if self._results.get(x["id"], (None,))[0] != x.get("revision", 0)]
+        if stale:
+            started = time.perf_counter()
+            fresh = await asyncio.to_thread(analyze, stale)
+            elapsed = round((time.perf_counter() - started) * 1000, 3)
+            for x, r in zip(stale, fresh):
+                self._results[x["id"]] = (x.get("revision", 0), {**r, "computed_ms": elapsed})
+        return {x["id"]: self._results[x["id"]][1] for x in experiments if x["id"] in self._results}
+
+
+# ----------------------
+# Ingest
+# ----------------------
+def parse_csv(text: str) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """Rows of experiment_id, variant, impressions, clicks, conversions[, date]; returns (rows, errors)"""
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    fields = {(f or "").strip().lower() for f in reader.fieldnames or []}
+    missing = {"experiment_id", "variant"} - fields
+    if missing:
+        return [], [f"missing column(s): {', '.join(sorted(missing))}"]
+    rows, errors = [], []
+    for line, raw in enumerate(reader, start=2):
+        r = {k.strip().lower(): (v or "").strip() for k, v in raw.items() if k is not None}
+        try:
+            rows.append(normalize_row(r))
+        except ValueError as e:
+            errors.append(f"line {line}: {e}")
+    return rows, errors
+
+
+def normalize_row(r: Dict[str, Any]) -> Dict[str, Any]:
+    if not r.get("experiment_id") or not r.get("variant"):
+        raise ValueError("experiment_id and variant are required")
+    row = {"experiment_id": str(r["experiment_id"]), "variant": str(r["variant"])}
+    for c in COUNTERS:
+        value = float(r.get(c) or 0)
+        # float() accepts "inf"/"nan", which int() then rejects with OverflowError/ValueError
+        if not math.isfinite(value) or value > MAX_COUNT:
+            raise ValueError(f"{c} must be a finite count")
+        if value < 0:
+            raise ValueError(f"{c} must be >= 0")
+        row[c] = int(value)
+    day = r.get("date")
+    row["date"] = date.fromisoformat(str(day)[:10]).isoformat() if day else datetime.now(timezone.utc).date().isoformat()
+    return row
+
+
+async def ingest(db, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Upsert per-day counts (re-sending a day replaces it) and refresh the touched experiments' totals"""
+    ids = sorted({r["experiment_id"] for r in rows})
+    known = {
+        x["id"]: x for x in await db[EXPERIMENTS_COLLECTION].find(
+            {"id": {"$in": ids}}, {"_id": 0, "id": 1, "variants": 1, "status": 1}
+        ).to_list(length=len(ids))
+    }
+    ops, touched = [], set()
+    rejected = {"unknown_experiment": 0, "concluded_experiment": 0, "unknown_variant": 0}
+    for r in rows:
+        exp = known.get(r["experiment_id"])
+        if exp is None:
+            rejected["unknown_experiment"] += 1
+            continue
+        if exp.get("status") == "concluded":
+            # The decision has been recorded; late data must not move it
+            rejected["concluded_experiment"] += 1
+            continue
+        if r["variant"] not in exp["variants"]:
+            # Arms are fixed at creation; a typo would otherwise become a new variant
+            rejected["unknown_variant"] += 1
+            continue
+        touched.add(exp["id"])
+        ops.append(UpdateOne(
+            {"experiment_id": r["experiment_id"], "variant": r["variant"], "date": r["date"]},
+            {"$set": {c: r[c] for c in COUNTERS}},
+            upsert=True,
+        ))
+    if ops:
+        await db[DAILY_COLLECTION].bulk_write(ops, ordered=False)
+    touched = sorted(touched)
+    if touched:
+        sums = await db[DAILY_COLLECTION].aggregate([
+            {"$match": {"experiment_id": {"$in": touched}}},
+            {"$group": {"_id": {"e": "$experiment_id", "v": "$variant"}, **{c: {"$sum": f"${c}"} for c in COUNTERS}}},
+        ]).to_list(length=None)
+        totals: Dict[str, Dict[str, Dict[str, int]]] = {e: {} for e in touched}
+        for s in sums:
+            totals[s["_id"]["e"]][s["_id"]["v"]] = {c: int(s[c]) for c in COUNTERS}
+        await db[EXPERIMENTS_COLLECTION].bulk_write([
+            UpdateOne(
+                {"id": e},
+                {"$set": {"totals": totals[e], "updated_at": datetime.now(timezone.utc)},
+                 "$inc": {"revision": 1}},
+            )
+            for e in touched
+        ], ordered=False)
+    return {"rows": len(rows), "accepted": len(ops), **{f"rejected_{k}": v for k, v in rejected.items()},
+            "experiments": touched}
+
+
+def new_experiment(name: str, variants: List[str], metric: str, control: Optional[str], campaign_id: Optional[str]) -> Dict[str, Any]:
+    now = datetime.now(timezone.utc)
+    return {
+        "id": str(uuid.uuid4()),
+        "name": name,
+        "campaign_id": campaign_id,
+        "metric": metric,
+        "variants": variants,
+        "control": control or variants[0],
+        "status": "running",
+        "totals": {},
+        "revision": 0,
+        "created_at": now,
+        "updated_at": now,
+    }
@@ -0,0 +1,105 @@
+"""
+Concurrent content fan-out.
+Generates one document per (content_type, platform) pair with bounded concurrency,
+streams each as NDJSON the moment it is ready (marked pending), then writes them
+with one insert_many per target collection and reports exactly which ids were stored.
+"""
+
+import asyncio
+import json
+import os
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo.errors import BulkWriteError
+
+FANOUT_CONCURRENCY = int(os.environ.get("DMM_FANOUT_CONCURRENCY", "4"))
+
+# (doc, content fingerprint or None, sub-request)
+Entry = Tuple[Dict[str, Any], Optional[Dict[str, Any]], Any]
+
+
+def pairs(content_types: List[str], platforms: List[str]) -> List[Tuple[str, str]]:
+    """Every (content_type, platform) combination once, in request order"""
+    return [(ct, p) for ct in dict.fromkeys(content_types) for p in dict.fromkeys(platforms)]
+
+
+def _line(payload: Dict[str, Any], default: Optional[Callable[[Any], Any]]) -> str:
+    return json.dumps(payload, default=default) + "\n"
+
+
+async def stream_fanout(
+    subs: List[Any],
+    build: Callable[[Any], Awaitable[Dict[str, Any]]],
+    collection_key: Callable[[Any], str],
+    prepare: Callable[[str, Dict[str, Any]], Awaitable[Optional[Dict[str, Any]]]],
+    collections: Dict[str, Any],
+    after_insert: Callable[[str, List[Entry]], Awaitable[None]],
+    concurrency: int = FANOUT_CONCURRENCY,
+    json_default: Optional[Callable[[Any], Any]] = None,
+) -> AsyncIterator[str]:
+    """NDJSON lines: a "result" (pending) or "error" per sub-request, then one "done".
+
+    ``prepare`` runs per doc before insert (dedup flags); ``after_insert`` runs per
+    collection once its batch is stored (indexes, stamps). A failing pair or
+    collection never ends the stream early: "done" lists inserted and failed ids.
+    """
+    sem = asyncio.Semaphore(concurrency)
+
+    async def run_one(sub) -> Tuple[Any, Optional[str], Optional[Entry], Optional[Exception]]:
+        async with sem:
+            try:
+                doc = await build(sub)
+                key = collection_key(sub)
+                return sub, key, (doc, await prepare(key, doc), sub), None
+            except Exception as e:
+                return sub, None, None, e
+
+    tasks = [asyncio.ensure_future(run_one(sub)) for sub in subs]
+    try:
+        grouped: Dict[str, List[Entry]] = {}
+        errors: List[str] = []
+        for fut in asyncio.as_completed(tasks):
+            sub, key, entry, error = await fut
+            if error is not None:
+                errors.append(f"{sub.content_type}/{sub.platform}: {error}")
+                yield _line({"event": "error", "content_type": sub.content_type, "platform": sub.platform,
+                             "error": str(error)}, json_default)
+                continue
+            grouped.setdefault(key, []).append(entry)
+            # Not stored yet: the ids only count once "done" lists them as inserted
+            yield _line({"event": "result", "pending": True, "content": entry[0]}, json_default)
+
+        inserted: List[str] = []
+        failed: List[str] = []
+        for key, entries in grouped.items():
+            stored = entries
+            try:
+                await collections[key].insert_many([dict(d) for d, _, _ in entries])
+            except BulkWriteError as e:
+                # Ordered insert: everything before the first error was written
+                stored = entries[:e.details.get("nInserted", 0)]
+                errors.append(f"{key}: {e}")
+            except Exception as e:
+                stored = []
+                errors.append(f"{key}: {e}")
+            ids = {d["id"] for d, _, _ in stored}
+            failed.extend(d["id"] for d, _, _ in entries if d["id"] not in ids)
+            if stored:
+                try:
+                    await after_insert(key, stored)
+                except Exception as e:
+                    # The docs are stored; only their indexes/stamps lag
+                    errors.append(f"{key} (post-insert): {e}")
+                inserted.extend(d["id"] for d, _, _ in stored)
+        yield _line({
+            "event": "done",
+            "success": not errors,
+            "inserted": len(inserted),
+            "inserted_ids": inserted,
+            "failed_ids": failed,
+            "errors": errors,
+        }, json_default)
+    finally:
+        # Client went away mid-stream: stop generating what nobody will receive
+        for task in tasks:
+            task.cancel()
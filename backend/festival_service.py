@@ -0,0 +1,360 @@
+"""
+Festival content pre-generation.
+Ahead of each festival, an off-peak batch job generates content ideas for every
+(platform, content_type, industry) combination and caches them, so the rush of
+festival requests in the days before Diwali, Holi, etc. is served without an LLM
+call. Runs are capped by a daily token budget, and a Mongo lease keeps them to one
+worker at a time.
+"""
+
+import asyncio
+import contextvars
+import json
+import logging
+import os
+import re
+import time
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from zoneinfo import ZoneInfo
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+CACHE_COLLECTION = "festival_content"
+JOBS_COLLECTION = "festival_jobs"
+FESTIVAL_TZ = ZoneInfo(os.environ.get("DMM_FESTIVAL_TZ", "Asia/Kolkata"))
+LOOKAHEAD_DAYS = int(os.environ.get("DMM_FESTIVAL_LOOKAHEAD_DAYS", "21"))
+DAILY_TOKEN_BUDGET = int(os.environ.get("DMM_FESTIVAL_TOKEN_BUDGET", "200000"))
+# Local hours [start, end) in which the scheduled run may spend tokens
+OFFPEAK_HOURS = tuple(int(h) for h in os.environ.get("DMM_FESTIVAL_OFFPEAK_HOURS", "1-6").split("-", 1))
+CONCURRENCY = int(os.environ.get("DMM_FESTIVAL_CONCURRENCY", "2"))
+CHECK_SECONDS = float(os.environ.get("DMM_FESTIVAL_CHECK_SECONDS", "900"))
+PLATFORMS = [p.strip() for p in os.environ.get("DMM_FESTIVAL_PLATFORMS", "Instagram,Facebook,YouTube").split(",") if p.strip()]
+CONTENT_TYPES = [c.strip() for c in os.environ.get("DMM_FESTIVAL_CONTENT_TYPES", "reel,ugc,brand").split(",") if c.strip()]
+INDUSTRIES = [i.strip() for i in os.environ.get(
+    "DMM_FESTIVAL_INDUSTRIES", "Landscaping,Interior Design,Real Estate"
+).split(",") if i.strip()]
+AUDIENCE = os.environ.get("DMM_FESTIVAL_AUDIENCE", "Urban Indian households")
+KEEP_DAYS_AFTER = 7  # cached ideas expire a week after the festival
+LEASE_SECONDS = 1800
+INITIAL_TOKEN_ESTIMATE = 1500
+MAX_CONSECUTIVE_FAILURES = 3
+
+# Lunar festival dates move every year; DMM_FESTIVAL_CALENDAR (JSON [{"name", "date"}]) replaces this list.
+# Runs log a warning once the lookahead window passes the last date here.
+FESTIVALS: List[Tuple[str, str]] = [
+    ("Navratri", "2026-10-11"),
+    ("Dussehra", "2026-10-20"),
+    ("Karwa Chauth", "2026-10-29"),
+    ("Dhanteras", "2026-11-06"),
+    ("Diwali", "2026-11-08"),
+    ("Bhai Dooj", "2026-11-11"),
+    ("Chhath Puja", "2026-11-15"),
+    ("Christmas", "2026-12-25"),
+    ("New Year", "2027-01-01"),
+    ("Makar Sankranti", "2027-01-14"),
+    ("Pongal", "2027-01-15"),
+    ("Republic Day", "2027-01-26"),
+    ("Eid al-Fitr", "2027-03-10"),
+    ("Holi", "2027-03-22"),
+    ("Gudi Padwa", "2027-04-07"),
+    ("Independence Day", "2027-08-15"),
+    ("Raksha Bandhan", "2027-08-17"),
+    ("Ganesh Chaturthi", "2027-09-04"),
+    ("Onam", "2027-09-12"),
+    ("Diwali", "2027-10-29"),
+]
+
+
+def slug(value: str) -> str:
+    return re.sub(r"[^a-z0-9]+", "-", (value or "").lower()).strip("-")
+
+
+def load_calendar() -> List[Tuple[str, date]]:
+    path = os.environ.get("DMM_FESTIVAL_CALENDAR")
+    rows = FESTIVALS
+    if path:
+        try:
+            with open(path) as f:
+                rows = [(r["name"], r["date"]) for r in json.load(f)]
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f"festival calendar {path} unreadable, using built-in dates: {e}")
+    return sorted(((name, date.fromisoformat(d)) for name, d in rows), key=lambda r: r[1])
+
+
+def calendar_exhausted(calendar: List[Tuple[str, date]], today: date, days: int = LOOKAHEAD_DAYS) -> bool:
+    """True once the lookahead window reaches past the last known festival date"""
+    return not calendar or calendar[-1][1] < today + timedelta(days=days)
+
+
+def local_today(now: Optional[float] = None) -> date:
+    return datetime.fromtimestamp(now if now is not None else time.time(), FESTIVAL_TZ).date()
+
+
+def upcoming(calendar: List[Tuple[str, date]], today: date, days: int = LOOKAHEAD_DAYS) -> List[Tuple[str, date]]:
+    return [(name, d) for name, d in calendar if today <= d <= today + timedelta(days=days)]
+
+
+def occurrence(calendar: List[Tuple[str, date]], festival: str, today: date) -> Optional[date]:
+    """Date of the festival's current occurrence: next one, or one still inside the keep window"""
+    key = slug(festival)
+    for name, d in calendar:
+        if slug(name) == key and d + timedelta(days=KEEP_DAYS_AFTER) >= today:
+            return d
+    return None
+
+
+def cache_key(festival: str, day: date, platform: str, content_type: str, industry: str) -> str:
+    return ":".join([slug(festival), str(day.year), slug(platform), slug(content_type), slug(industry)])
+
+
+def plan(calendar: List[Tuple[str, date]], today: date) -> List[Dict[str, Any]]:
+    """Every combination for festivals in the lookahead window, soonest festival first"""
+    return [
+        {
+            "_id": cache_key(name, day, platform, content_type, industry),
+            "festival": name,
+            "festival_date": day.isoformat(),
+            "platform": platform,
+            "content_type": content_type,
+            "industry": industry,
+        }
+        for name, day in upcoming(calendar, today)
+        for content_type in CONTENT_TYPES
+        for platform in PLATFORMS
+        for industry in INDUSTRIES
+    ]
+
+
+def content_params(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """ContentRequest fields used to generate a cache entry"""
+    return {
+        "content_type": entry["content_type"],
+        "platform": entry["platform"],
+        "festival": entry["festival"],
+        "brief": f"{entry['festival']} campaign for a {entry['industry']} brand",
+        "target_audience": AUDIENCE,
+    }
+
+
+class FestivalPregenerator:
+    def __init__(
+        self,
+        get_db: Callable[[], Awaitable[Any]],
+        generate: Callable[[Dict[str, Any]], Awaitable[Tuple[str, Optional[Dict[str, Any]]]]],
+    ):
+        self.get_db = get_db
+        self.generate = generate  # ContentRequest fields -> (text, llm usage); raises when the LLM fails
+        self.owner = f"{os.getpid()}-{id(self):x}"  # prefix of every run's lease token
+        self._task: Optional[asyncio.Task] = None
+        self._running: Optional[asyncio.Task] = None
+        self.last_run: Optional[Dict[str, Any]] = None
+        self._calendar_warned: Optional[date] = None
+
+    async def ensure_indexes(self, db):
+        await db[CACHE_COLLECTION].create_index("expires_at", expireAfterSeconds=0)
+        await db[CACHE_COLLECTION].create_index([("festival_slug", 1), ("festival_date", 1)])
+
+    # -- lifecycle --
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    async def stop(self):
+        for task in (self._task, self._running):
+            if task is not None:
+                task.cancel()
+        await asyncio.gather(*(t for t in (self._task, self._running) if t), return_exceptions=True)
+        self._task = self._running = None
+
+    async def _loop(self):
+        while True:
+            try:
+                hour = datetime.now(FESTIVAL_TZ).hour
+                if OFFPEAK_HOURS[0] <= hour < OFFPEAK_HOURS[1]:
+                    await self.run()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning(f"festival pre-generation failed: {type(e).__name__}: {e}")
+            await asyncio.sleep(CHECK_SECONDS)
+
+    def trigger(self, token_budget: Optional[int] = None) -> bool:
+        """Start a run in the background (outside any request deadline); False if one is already going"""
+        if self._running is not None and not self._running.done():
+            return False
+        self._running = asyncio.get_running_loop().create_task(
+            self.run(token_budget), context=contextvars.Context()
+        )
+        return True
+
+    # -- budget & lease --
+    async def tokens_spent(self, db, today: date) -> int:
+        doc = await db[JOBS_COLLECTION].find_one({"_id": f"budget:{today.isoformat()}"})
+        return int(doc["tokens"]) if doc else 0
+
+    async def _acquire(self, db) -> Optional[str]:
+        """Lease token for one run, or None while any other run (this process's included) holds the lease"""
+        now = time.time()
+        token = f"{self.owner}-{uuid.uuid4().hex[:8]}"
+        try:
+            await db[JOBS_COLLECTION].update_one(
+                {"_id": "lease", "until": {"$lt": now}},
+                {"$set": {"owner": token, "until": now + LEASE_SECONDS}},
+                upsert=True,
+            )
+        except DuplicateKeyError:
+            return None  # an unexpired lease exists
+        return token
+
+    async def _renew(self, db, token: str) -> bool:
+        """Extend our lease; False once it expired and another run took it over"""
+        result = await db[JOBS_COLLECTION].update_one(
+            {"_id": "lease", "owner": token}, {"$set": {"until": time.time() + LEASE_SECONDS}}
+        )
+        return result.matched_count == 1
+
+    async def _release(self, db, token: str):
+        await db[JOBS_COLLECTION].update_one({"_id": "lease", "owner": token}, {"$set": {"until": 0}})
+
+    # -- run --
+    def _check_calendar(self, calendar: List[Tuple[str, date]], today: date):
+        if calendar_exhausted(calendar, today) and self._calendar_warned != today:
+            # Once a day, or the log drowns in it for every check until someone updates the dates
+            self._calendar_warned = today
+            last = calendar[-1][1].isoformat() if calendar else "none"
+            logger.warning(
+                f"festival calendar ends {last}: festivals after it get no pre-generated content; "
+                "point DMM_FESTIVAL_CALENDAR at next year's dates"
+            )
+
+    async def pending(self, db, today: date) -> List[Dict[str, Any]]:
+        calendar = load_calendar()
+        self._check_calendar(calendar, today)
+        entries = plan(calendar, today)
+        if not entries:
+            return []
+        done = await db[CACHE_COLLECTION].find(
+            {"_id": {"$in": [e["_id"] for e in entries]}}, {"_id": 1}
+        ).to_list(length=len(entries))
+        cached = {d["_id"] for d in done}
+        return [e for e in entries if e["_id"] not in cached]
+
+    async def run(self, token_budget: Optional[int] = None) -> Dict[str, Any]:
+        """Generate missing entries, soonest festival first, until the token budget is spent"""
+        db = await self.get_db()
+        today = local_today()
+        report: Dict[str, Any] = {"date": today.isoformat(), "generated": 0, "failed": 0, "tokens": 0,
+                                  "pending": 0, "stopped": None, "started_at": time.time()}
+        token = await self._acquire(db)
+        if token is None:
+            report["stopped"] = "locked"
+            return report
+        try:
+            budget_key = f"budget:{today.isoformat()}"
+            remaining = DAILY_TOKEN_BUDGET - await self.tokens_spent(db, today)
+            if token_budget is not None:
+                remaining = min(remaining, token_budget)
+            todo = await self.pending(db, today)
+            report["pending"] = len(todo)
+            estimate = float(INITIAL_TOKEN_ESTIMATE)
+            failures = 0
+            lock = asyncio.Lock()
+            queue = list(reversed(todo))
+
+            async def worker():
+                nonlocal remaining, estimate, failures
+                while queue:
+                    async with lock:
+                        # Reserve the expected cost up front so concurrent calls can't overshoot together
+                        if remaining < estimate:
+                            report["stopped"] = report["stopped"] or "budget"
+                            return
+                        if failures >= MAX_CONSECUTIVE_FAILURES:
+                            report["stopped"] = report["stopped"] or "llm_unavailable"
+                            return
+                        if report["stopped"] == "lease_lost":
+                            return
+                        entry = queue.pop()
+                        remaining -= estimate
+                    ok, spent = await self._generate_one(db, entry, token)
+                    async with lock:
+                        remaining += estimate - spent
+                        if ok is None:
+                            # Another run owns the cache now; its writes win and ours stop here
+                            report["stopped"] = "lease_lost"
+                        elif ok:
+                            failures = 0
+                            report["generated"] += 1
+                            # Running average keeps the reservation close to real prompt + completion cost
+                            estimate = 0.8 * estimate + 0.2 * spent if spent else estimate
+                        else:
+                            failures += 1
+                            report["failed"] += 1
+                        report["tokens"] += spent
+                    if spent:
+                        await db[JOBS_COLLECTION].update_one({"_id": budget_key}, {"$inc": {"tokens": spent}}, upsert=True)
+
+            await asyncio.gather(*(worker() for _ in range(CONCURRENCY)))
+            report["stopped"] = report["stopped"] or "complete"
+        finally:
+            await self._release(db, token)
+        report["finished_at"] = time.time()
+        self.last_run = report
+        await db[JOBS_COLLECTION].update_one({"_id": "last_run"}, {"$set": report}, upsert=True)
+        return report
+
+    async def _generate_one(self, db, entry: Dict[str, Any], token: str) -> Tuple[Optional[bool], int]:
+        """(stored?, tokens spent); stored is None when the lease was lost before the write"""
+        params = content_params(entry)
+        try:
+            text, usage = await self.generate(params)
+        except Exception as e:
+            logger.info(f"festival pre-generation {entry['_id']} failed: {type(e).__name__}: {e}")
+            return False, 0
+        spent = int((usage or {}).get("prompt_tokens", 0)) + int((usage or {}).get("completion_tokens", 0))
+        festival_day = date.fromisoformat(entry["festival_date"])
+        expires = datetime.combine(festival_day + timedelta(days=KEEP_DAYS_AFTER), datetime.min.time(), timezone.utc)
+        # A slow run can outlive LEASE_SECONDS; renewing per write keeps it ours or tells us it isn't
+        if not await self._renew(db, token):
+            logger.warning(f"festival pre-generation lease lost before storing {entry['_id']}")
+            return None, spent
+        await db[CACHE_COLLECTION].update_one(
+            {"_id": entry["_id"]},
+            {"$set": {**entry, **params, "festival_slug": slug(entry["festival"]), "ai_content": text,
+                      "llm_usage": usage, "created_at": datetime.now(timezone.utc), "expires_at": expires}},
+            upsert=True,
+        )
+        return True, spent
+
+    # -- retrieval --
+    async def lookup(
+        self, festival: str, platform: str, content_type: str, industry: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Cached ideas for this festival occurrence and exactly this industry (None without one: another
+        industry's ideas would be served as if they were written for the caller)"""
+        day = occurrence(load_calendar(), festival, local_today())
+        if day is None or not industry:
+            return None
+        coll = (await self.get_db())[CACHE_COLLECTION]
+        return await coll.find_one({"_id": cache_key(festival, day, platform, content_type, industry)})
+
+    async def snapshot(self) -> Dict[str, Any]:
+        db = await self.get_db()
+        today = local_today()
+        calendar = load_calendar()
+        return {
+            "upcoming": [{"festival": n, "date": d.isoformat()} for n, d in upcoming(calendar, today)],
+            "calendar_ends": calendar[-1][1].isoformat() if calendar else None,
+            "calendar_exhausted": calendar_exhausted(calendar, today),
+            "pending": len(await self.pending(db, today)),
+            "cached": await db[CACHE_COLLECTION].count_documents({}),
+            "tokens_spent_today": await self.tokens_spent(db, today),
+            "daily_token_budget": DAILY_TOKEN_BUDGET,
+            "offpeak_hours": list(OFFPEAK_HOURS),
+            "running": self._running is not None and not self._running.done(),
+            "last_run": self.last_run or await db[JOBS_COLLECTION].find_one({"_id": "last_run"}, {"_id": 0}),
+        }
@@ -0,0 +1,140 @@
+"""
+Hedged requests for tail-latency reduction on the LLM path.
+When a primary call outlives the endpoint's observed p90, a second request is
+fired (optionally to a cheaper model); the first success wins and the other is cancelled.
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+HEDGE_MODEL = os.environ.get("DMM_HEDGE_MODEL") or None  # None = same model as the primary
+HEDGE_BUDGET = float(os.environ.get("DMM_HEDGE_BUDGET", "0.1"))  # max share of calls that may hedge
+HEDGE_MIN_SAMPLES = int(os.environ.get("DMM_HEDGE_MIN_SAMPLES", "20"))
+HEDGE_DEFAULT_DELAY = float(os.environ.get("DMM_HEDGE_DEFAULT_DELAY_SECONDS", "15"))
+LATENCY_SAMPLES = 200
+
+
+def _endpoints_from_env() -> Dict[str, float]:
+    # DMM_HEDGE_ENDPOINTS="strategy=0.2,content": endpoint -> hedge budget (DMM_HEDGE_BUDGET when omitted)
+    endpoints: Dict[str, float] = {}
+    for item in os.environ.get("DMM_HEDGE_ENDPOINTS", "").split(","):
+        name, _, budget = (p.strip() for p in item.partition("="))
+        if name:
+            try:
+                endpoints[name] = min(max(float(budget), 0.0), 1.0) if budget else HEDGE_BUDGET
+            except ValueError:
+                endpoints[name] = HEDGE_BUDGET
+    return endpoints
+
+
+@dataclass
+class HedgePolicy:
+    endpoint: str
+    model: Optional[str] = None
+    budget: float = HEDGE_BUDGET
+
+
+class EndpointStats:
+    def __init__(self):
+        self.latencies: Deque[float] = deque(maxlen=LATENCY_SAMPLES)
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_wins_after_hedge = 0
+
+    def p90(self) -> Optional[float]:
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.9) - 1]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p90 = self.p90()
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_rate": round(self.hedged / self.calls, 3) if self.calls else 0.0,
+            "hedge_wins": self.hedge_wins,
+            "hedge_win_rate": round(self.hedge_wins / self.hedged, 3) if self.hedged else None,
+            "primary_wins_after_hedge": self.primary_wins_after_hedge,
+            "p90_ms": round(p90 * 1000, 1) if p90 is not None else None,
+        }
+
+
+class Hedger:
+    def __init__(self, policies: Dict[str, HedgePolicy]):
+        self.policies = policies
+        self.stats: Dict[str, EndpointStats] = {}
+
+    def policy(self, endpoint: str) -> Optional[HedgePolicy]:
+        return self.policies.get(endpoint)
+
+    def _stats(self, endpoint: str) -> EndpointStats:
+        return self.stats.setdefault(endpoint, EndpointStats())
+
+    def record(self, endpoint: str, latency: float):
+        self._stats(endpoint).latencies.append(latency)
+
+    def _within_budget(self, endpoint: str, stats: EndpointStats) -> bool:
+        policy = self.policies.get(endpoint)
+        return policy is not None and (stats.hedged + 1) <= policy.budget * max(stats.calls, 1)
+
+    async def run(
+        self,
+        endpoint: str,
+        primary: Callable[[], Awaitable[T]],
+        hedge: Callable[[], Awaitable[T]],
+    ) -> Tuple[T, str]:
+        """Run primary, hedging with a second call after the observed p90. Returns (result, "primary"|"hedge")."""
+        stats = self._stats(endpoint)
+        stats.calls += 1
+        started = time.monotonic()
+        primary_task = asyncio.ensure_future(primary())
+        names = {primary_task: "primary"}
+        try:
+            delay = stats.p90() or HEDGE_DEFAULT_DELAY
+            done, _ = await asyncio.wait({primary_task}, timeout=delay)
+            if done or not self._within_budget(endpoint, stats):
+                result = await primary_task
+                self.record(endpoint, time.monotonic() - started)
+                return result, "primary"
+
+            stats.hedged += 1
+            names[asyncio.ensure_future(hedge())] = "hedge"
+            pending = set(names)
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        winner = names[task]
+                        if winner == "hedge":
+                            stats.hedge_wins += 1
+                        else:
+                            stats.primary_wins_after_hedge += 1
+                        # Whichever call answered sets the latency the p90 learns from; recording only
+                        # primary wins would bias the hedge delay towards fast calls
+                        self.record(endpoint, time.monotonic() - started)
+                        return task.result(), winner
+                    error = task.exception()
+            raise error  # both attempts failed
+        finally:
+            # Also reached when the caller is cancelled (deadline, disconnect): no call may outlive it
+            for task in names:
+                if not task.done():
+                    task.cancel()
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "enabled_endpoints": {e: {"model": p.model, "budget": p.budget} for e, p in self.policies.items()},
+            "endpoints": {e: s.snapshot() for e, s in self.stats.items()},
+        }
+
+
+hedger = Hedger({e: HedgePolicy(e, HEDGE_MODEL, budget) for e, budget in _endpoints_from_env().items()})
@@ -0,0 +1,209 @@
+"""
+Idempotency-Key support for POST endpoints.
+Pure ASGI middleware; responses are kept in a TTL-indexed Mongo collection and
+concurrent duplicates wait for the first execution instead of re-running it.
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+HEADER = b"idempotency-key"
+REPLAY_HEADER = b"idempotent-replayed"
+COLLECTION = "idempotency_keys"
+
+DEFAULT_TTL_SECONDS = 24 * 3600
+LOCK_SECONDS = 180  # an in-progress claim older than this is considered abandoned
+WAIT_TIMEOUT_SECONDS = 120
+POLL_INTERVAL_SECONDS = 0.25
+MAX_STORED_BODY = 4 * 1024 * 1024
+
+
+def _utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+async def ensure_indexes(db):
+    await db[COLLECTION].create_index("expires_at", expireAfterSeconds=0)
+
+
+class IdempotencyMiddleware:
+    def __init__(self, app, get_db: Callable[[], Awaitable[Any]], ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.app = app
+        self.get_db = get_db
+        self.ttl = timedelta(seconds=ttl_seconds)
+        # Same-process waiters get woken immediately; other workers poll Mongo
+        self._local: Dict[str, asyncio.Event] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST":
+            return await self.app(scope, receive, send)
+        key = dict(scope.get("headers") or []).get(HEADER)
+        if not key:
+            return await self.app(scope, receive, send)
+
+        body = await self._read_body(receive)
+        fingerprint = hashlib.sha256(body).hexdigest()
+        record_id = hashlib.sha256(scope["path"].encode() + b"\0" + key).hexdigest()
+        coll = (await self.get_db())[COLLECTION]
+
+        record = await self._claim(coll, record_id, key.decode("latin-1"), scope["path"], fingerprint)
+        if record is not None:
+            if record.get("fingerprint") != fingerprint:
+                return await self._send_simple(send, 422, b'{"detail":"Idempotency-Key reused with a different request body"}')
+            if record.get("state") != "done":
+                record = await self._wait(coll, record_id)
+                if record is None:
+                    return await self._send_simple(send, 409, b'{"detail":"A request with this Idempotency-Key is still in progress"}')
+            return await self._replay(send, record["response"])
+
+        event = self._local.setdefault(record_id, asyncio.Event())
+        try:
+            await self._execute(scope, receive, body, send, coll, record_id)
+        finally:
+            event.set()
+            self._local.pop(record_id, None)
+
+    @staticmethod
+    async def _read_body(receive) -> bytes:
+        chunks: List[bytes] = []
+        more = True
+        while more:
+            message = await receive()
+            chunks.append(message.get("body", b""))
+            more = message.get("more_body", False)
+        return b"".join(chunks)
+
+    async def _claim(self, coll, record_id: str, key: str, path: str, fingerprint: str) -> Optional[Dict[str, Any]]:
+        """Insert an in-progress marker. Returns None when we own the key, else the existing record."""
+        now = _utcnow()
+        doc = {
+            "_id": record_id,
+            "key": key,
+            "path": path,
+            "fingerprint": fingerprint,
+            "state": "in_progress",
+            "locked_until": now + timedelta(seconds=LOCK_SECONDS),
+            "created_at": now,
+            "expires_at": now + self.ttl,
+        }
+        try:
+            await coll.insert_one(doc)
+            return None
+        except DuplicateKeyError:
+            pass
+        # Take over an abandoned claim (worker died mid-request)
+        taken = await coll.update_one(
+            {"_id": record_id, "state": "in_progress", "locked_until": {"$lt": now}, "fingerprint": fingerprint},
+            {"$set": {"locked_until": now + timedelta(seconds=LOCK_SECONDS)}},
+        )
+        if taken.modified_count:
+            return None
+        return await coll.find_one({"_id": record_id}) or {"fingerprint": fingerprint, "state": "in_progress"}
+
+    async def _wait(self, coll, record_id: str) -> Optional[Dict[str, Any]]:
+        deadline = asyncio.get_running_loop().time() + WAIT_TIMEOUT_SECONDS
+        while asyncio.get_running_loop().time() < deadline:
+            event = self._local.get(record_id)
+            if event is not None:
+                try:
+                    await asyncio.wait_for(event.wait(), timeout=POLL_INTERVAL_SECONDS * 4)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(POLL_INTERVAL_SECONDS)
+            record = await coll.find_one({"_id": record_id})
+            if record is None:
+                # First execution failed and released the key
+                return None
+            if record.get("state") == "done":
+                return record
+        return None
+
+    async def _execute(self, scope, receive, body: bytes, send, coll, record_id: str):
+        sent_body = False
+
+        async def replay_receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            # Body already consumed; later reads only watch for the client disconnecting
+            return await receive()
+
+        status = 500
+        headers: List[List[bytes]] = []
+        chunks: List[bytes] = []
+        size = 0
+
+        async def capture_send(message):
+            nonlocal status, headers, size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = [list(h) for h in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                chunk = message.get("body", b"")
+                size += len(chunk)
+                if size <= MAX_STORED_BODY:
+                    chunks.append(chunk)
+            await send(message)
+
+        try:
+            await self.app(scope, replay_receive, capture_send)
+        except BaseException:
+            # Includes cancellation by the request deadline: release the key so a retry can run
+            await self._release(coll, record_id)
+            raise
+        if status >= 500 or size > MAX_STORED_BODY:
+            # Let the client retry server errors for real
+            await self._release(coll, record_id)
+            return
+        try:
+            await coll.update_one(
+                {"_id": record_id},
+                {"$set": {
+                    "state": "done",
+                    "response": {"status": status, "headers": headers, "body": b"".join(chunks)},
+                    "completed_at": _utcnow(),
+                }},
+            )
+        except Exception as e:
+            logger.warning(f"Failed to store idempotent response: {e}")
+            await self._release(coll, record_id)
+
+    @staticmethod
+    async def _release(coll, record_id: str):
+        """Drop our claim. Runs in a fresh context: after a deadline the request's pymongo timeout has
+        already expired (and pymongo.timeout(None) can't extend it), so the delete would fail and the key
+        would stay in_progress for LOCK_SECONDS"""
+        task = asyncio.get_running_loop().create_task(
+            coll.delete_one({"_id": record_id}), context=contextvars.Context()
+        )
+        try:
+            # Shielded: a second cancellation of the request must not abandon the release
+            await asyncio.shield(task)
+        except Exception as e:
+            logger.warning(f"Failed to release idempotency key: {e}")
+
+    @staticmethod
+    async def _replay(send, response: Dict[str, Any]):
+        headers = [(bytes(k), bytes(v)) for k, v in response.get("headers", [])]
+        headers.append((REPLAY_HEADER, b"true"))
+        await send({"type": "http.response.start", "status": response["status"], "headers": headers})
+        await send({"type": "http.response.body", "body": bytes(response.get("body", b""))})
+
+    @staticmethod
+    async def _send_simple(send, status: int, body: bytes):
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,125 @@
+"""
+Derivatives for generated images.
+Decoding and WebP encoding run in a process pool; outputs (thumbnail plus
+1:1 feed, 9:16 story and 1.91:1 link-ad crops) are cached on disk by content hash,
+so repeat views are served straight from the file with a strong ETag.
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Optional
+
+MEDIA_DIR = os.environ.get("DMM_MEDIA_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "media"))
+IMAGE_DIR = os.path.join(MEDIA_DIR, "images")
+IMAGE_WORKERS = int(os.environ.get("DMM_IMAGE_WORKERS", "2"))
+WEBP_QUALITY = int(os.environ.get("DMM_IMAGE_WEBP_QUALITY", "82"))
+MAX_INPUT_BYTES = 20 * 1024 * 1024
+
+# name -> (width, height); thumb keeps the source aspect ratio within its box
+VARIANTS: Dict[str, tuple] = {
+    "thumb": (320, 320),
+    "feed": (1080, 1080),     # 1:1
+    "story": (1080, 1920),    # 9:16
+    "link": (1200, 628),      # 1.91:1
+}
+MANIFEST = "manifest.json"
+
+
+def content_hash(raw: bytes) -> str:
+    return hashlib.sha256(raw).hexdigest()[:32]
+
+
+def variant_path(digest: str, variant: str) -> str:
+    return os.path.join(IMAGE_DIR, digest, f"{variant}.webp")
+
+
+def etag(digest: str, variant: str) -> str:
+    # Files are content-addressed and never rewritten, so hash + variant is a strong validator
+    return f'"{digest}-{variant}"'
+
+
+def _write_atomic(path: str, data: bytes):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def render_variants(raw: bytes, out_dir: str) -> Dict[str, Any]:
+    """Runs in a worker process: decode once, write every variant, then the manifest."""
+    from PIL import Image, ImageOps
+
+    os.makedirs(out_dir, exist_ok=True)
+    with Image.open(io.BytesIO(raw)) as src:
+        src = ImageOps.exif_transpose(src)
+        src = src.convert("RGBA" if src.mode in ("RGBA", "LA", "P") else "RGB")
+        variants: Dict[str, Any] = {}
+        for name, size in VARIANTS.items():
+            if name == "thumb":
+                img = src.copy()
+                img.thumbnail(size, Image.LANCZOS)
+            else:
+                img = ImageOps.fit(src, size, Image.LANCZOS, centering=(0.5, 0.5))
+            buf = io.BytesIO()
+            img.save(buf, "WEBP", quality=WEBP_QUALITY, method=4)
+            data = buf.getvalue()
+            _write_atomic(os.path.join(out_dir, f"{name}.webp"), data)
+            variants[name] = {"width": img.width, "height": img.height, "bytes": len(data)}
+        manifest = {"source": {"width": src.width, "height": src.height, "bytes": len(raw)}, "variants": variants}
+    _write_atomic(os.path.join(out_dir, MANIFEST), json.dumps(manifest).encode())
+    return manifest
+
+
+class ImageDerivatives:
+    def __init__(self, workers: int = IMAGE_WORKERS):
+        self.workers = workers
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+    def _executor(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    @staticmethod
+    def _cached(digest: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(os.path.join(IMAGE_DIR, digest, MANIFEST)) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    async def ingest(self, raw: bytes) -> Dict[str, Any]:
+        """Derivatives for an encoded image; rendered once per distinct content"""
+        if len(raw) > MAX_INPUT_BYTES:
+            raise ValueError("image too large")
+        digest = content_hash(raw)
+        manifest = self._cached(digest)
+        if manifest is None:
+            future = self._inflight.get(digest)
+            if future is None:
+                loop = asyncio.get_running_loop()
+                future = loop.run_in_executor(self._executor(), render_variants, raw, os.path.join(IMAGE_DIR, digest))
+                self._inflight[digest] = future
+                future.add_done_callback(lambda _: self._inflight.pop(digest, None))
+            manifest = await asyncio.shield(future)
+        return {
+            "hash": digest,
+            "source": manifest["source"],
+            "variants": {
+                name: {**meta, "url": f"/api/media/images/{digest}/{name}"}
+                for name, meta in manifest["variants"].items()
+            },
+        }
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+image_derivatives = ImageDerivatives()
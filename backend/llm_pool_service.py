@@ -0,0 +1,147 @@
+"""
+Bounded pool of pre-initialised LLM chat clients.
+Clients are keyed by (model, system prompt), checked out per request and returned,
+so client setup is paid once per slot instead of once per call.
+"""
+
+import asyncio
+import logging
+import os
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+POOL_SIZE = int(os.environ.get("DMM_LLM_POOL_SIZE", "4"))
+CLIENT_MAX_AGE_SECONDS = float(os.environ.get("DMM_LLM_POOL_MAX_AGE_SECONDS", "1800"))
+CLIENT_MAX_USES = int(os.environ.get("DMM_LLM_POOL_MAX_USES", "200"))
+
+
+class _Slot:
+    def __init__(self, client: Any):
+        self.client = client
+        self.created = time.monotonic()
+        self.uses = 0
+        # Conversation state grows on every send; keep pristine copies to restore on release
+        self.baseline = {k: (list(v) if isinstance(v, list) else dict(v))
+                         for k, v in vars(client).items() if isinstance(v, (list, dict))}
+        session_id = getattr(client, "session_id", None)
+        self.session_prefix = session_id.rsplit("-", 1)[0] if isinstance(session_id, str) else None
+
+    def healthy(self) -> bool:
+        return time.monotonic() - self.created < CLIENT_MAX_AGE_SECONDS and self.uses < CLIENT_MAX_USES
+
+    def reset(self):
+        for k, v in self.baseline.items():
+            setattr(self.client, k, list(v) if isinstance(v, list) else dict(v))
+
+    def new_session(self):
+        # History kept outside the client (by session id) must not leak to the next borrower
+        if self.session_prefix is not None:
+            self.client.session_id = f"{self.session_prefix}-{uuid.uuid4().hex[:8]}"
+
+
+class ClientPool:
+    def __init__(self, key: Tuple[str, str], factory: Callable[[], Any], size: int = POOL_SIZE):
+        self.key = key
+        self.factory = factory
+        self.size = size
+        # None marks a freed place: it wakes a waiter, who then builds a fresh client
+        self.idle: "asyncio.Queue[Optional[_Slot]]" = asyncio.Queue()
+        self.vacancies = 0
+        self.created = 0
+        self.discarded = 0
+        self.acquired = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _new_slot(self) -> _Slot:
+        self.created += 1
+        return _Slot(self.factory())
+
+    def warm(self, n: int):
+        while self.created - self.discarded < min(n, self.size):
+            self.idle.put_nowait(self._new_slot())
+
+    async def acquire(self) -> _Slot:
+        started = time.monotonic()
+        while True:
+            if not self.idle.empty():
+                slot = self.idle.get_nowait()
+            elif self.created - self.discarded < self.size:
+                slot = self._new_slot()
+            else:
+                slot = await self.idle.get()
+            if slot is None:
+                self.vacancies -= 1
+                continue
+            if slot.healthy():
+                break
+            self.discarded += 1
+        waited = time.monotonic() - started
+        self.acquired += 1
+        self.wait_total += waited
+        self.wait_max = max(self.wait_max, waited)
+        slot.uses += 1
+        slot.new_session()
+        return slot
+
+    def release(self, slot: _Slot, ok: bool):
+        if ok and slot.healthy():
+            slot.reset()
+            self.idle.put_nowait(slot)
+        else:
+            # Failed or stale clients are dropped; the next acquire builds a fresh one
+            self.discarded += 1
+            self.vacancies += 1
+            self.idle.put_nowait(None)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "model": self.key[0],
+            "size": self.size,
+            "live": self.created - self.discarded,
+            "idle": self.idle.qsize() - self.vacancies,
+            "created": self.created,
+            "discarded": self.discarded,
+            "acquired": self.acquired,
+            "avg_wait_ms": round(self.wait_total / self.acquired * 1000, 3) if self.acquired else 0.0,
+            "max_wait_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+class ClientPools:
+    def __init__(self):
+        self._pools: Dict[Tuple[str, str], ClientPool] = {}
+
+    def pool(self, model: str, system_message: str, factory: Callable[[], Any]) -> ClientPool:
+        key = (model, system_message)
+        if key not in self._pools:
+            self._pools[key] = ClientPool(key, factory)
+        return self._pools[key]
+
+    @asynccontextmanager
+    async def checkout(self, model: str, system_message: str, factory: Callable[[], Any]):
+        pool = self.pool(model, system_message, factory)
+        slot = await pool.acquire()
+        ok = False
+        try:
+            yield slot.client
+            ok = True
+        finally:
+            pool.release(slot, ok)
+
+    def warmup(self, specs: List[Tuple[str, str, Callable[[], Any]]], per_pool: int = POOL_SIZE):
+        for model, system_message, factory in specs:
+            try:
+                self.pool(model, system_message, factory).warm(per_pool)
+            except Exception as e:
+                logger.warning(f"LLM pool warmup failed for {model}: {e}")
+
+    def snapshot(self) -> List[Dict[str, Any]]:
+        return [p.snapshot() for p in self._pools.values()]
+
+
+pools = ClientPools()
@@ -0,0 +1,225 @@
+"""
+Local cache for finished video generations.
+Assets are downloaded once from the provider, kept on disk under an LRU byte quota
+and served with HTTP Range support (zero-copy when the ASGI server offers it).
+"""
+
+import asyncio
+import contextvars
+import hashlib
+import logging
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import httpx
+from starlette.responses import Response
+
+from image_service import MEDIA_DIR
+
+logger = logging.getLogger(__name__)
+
+VIDEO_DIR = os.path.join(MEDIA_DIR, "videos")
+QUOTA_BYTES = int(os.environ.get("DMM_VIDEO_CACHE_BYTES", str(5 * 1024 ** 3)))
+DOWNLOAD_TIMEOUT_SECONDS = float(os.environ.get("DMM_VIDEO_DOWNLOAD_TIMEOUT_SECONDS", "300"))
+CHUNK_SIZE = 256 * 1024
+
+KINDS = {"video": (".mp4", "video/mp4"), "thumbnail": (".jpg", "image/jpeg")}
+RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def cache_name(generation_id: str, kind: str) -> str:
+    digest = hashlib.sha256(generation_id.encode()).hexdigest()[:32]
+    return f"{digest}-{kind}{KINDS[kind][0]}"
+
+
+class VideoCache:
+    def __init__(self, root: str = VIDEO_DIR, quota: int = QUOTA_BYTES):
+        self.root = root
+        self.quota = quota
+        # name -> size, least recently used first
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._loaded = False
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+
+    def _load(self):
+        if self._loaded:
+            return
+        os.makedirs(self.root, exist_ok=True)
+        files = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if name.endswith(".part"):
+                os.remove(path)  # interrupted download
+                continue
+            st = os.stat(path)
+            files.append((st.st_atime, name, st.st_size))
+        for _, name, size in sorted(files):
+            self._entries[name] = size
+        self._loaded = True
+
+    @property
+    def used_bytes(self) -> int:
+        return sum(self._entries.values())
+
+    def path(self, generation_id: str, kind: str) -> Optional[str]:
+        """Cached file for a generation, or None. Counts as a use for LRU purposes."""
+        self._load()
+        name = cache_name(generation_id, kind)
+        if name not in self._entries:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(name)
+        self.hits += 1
+        path = os.path.join(self.root, name)
+        try:
+            # Bump atime only (recency across restarts); mtime feeds the validator
+            os.utime(path, (time.time(), os.stat(path).st_mtime))
+        except OSError:
+            self._entries.pop(name, None)
+            return None
+        return path
+
+    def _evict_for(self, incoming: int):
+        while self._entries and self.used_bytes + incoming > self.quota:
+            name, _ = self._entries.popitem(last=False)
+            try:
+                os.remove(os.path.join(self.root, name))
+            except OSError:
+                pass
+            self.evicted += 1
+
+    async def _download(self, name: str, url: str):
+        tmp = os.path.join(self.root, f"{name}.part")
+        size = 0
+        async with httpx.AsyncClient(timeout=DOWNLOAD_TIMEOUT_SECONDS, follow_redirects=True) as client:
+            async with client.stream("GET", url) as r:
+                r.raise_for_status()
+                with open(tmp, "wb") as f:
+                    async for chunk in r.aiter_bytes(CHUNK_SIZE):
+                        size += len(chunk)
+                        if size > self.quota:
+                            raise ValueError("asset larger than the cache quota")
+                        f.write(chunk)
+        self._evict_for(size)
+        os.replace(tmp, os.path.join(self.root, name))
+        self._entries[name] = size
+
+    def ensure(self, generation_id: str, kind: str, url: str) -> Optional[asyncio.Task]:
+        """Start caching an asset unless it is cached or already downloading. Returns the download task."""
+        self._load()
+        name = cache_name(generation_id, kind)
+        if name in self._entries:
+            return None
+        task = self._inflight.get(name)
+        if task is None:
+            # Fresh context: the download outlives the request and must not inherit its deadline
+            task = asyncio.get_running_loop().create_task(self._run(name, url), context=contextvars.Context())
+            self._inflight[name] = task
+        return task
+
+    async def _run(self, name: str, url: str):
+        try:
+            await self._download(name, url)
+        except Exception as e:
+            logger.warning(f"Video cache download failed for {name}: {e}")
+            try:
+                os.remove(os.path.join(self.root, f"{name}.part"))
+            except OSError:
+                pass
+        finally:
+            self._inflight.pop(name, None)
+
+    def snapshot(self) -> Dict[str, int]:
+        self._load()
+        return {
+            "files": len(self._entries),
+            "used_bytes": self.used_bytes,
+            "quota_bytes": self.quota,
+            "downloading": len(self._inflight),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+        }
+
+
+def parse_range(header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """Single byte range -> inclusive (start, end). None = whole file; ValueError = unsatisfiable."""
+    if not header:
+        return None
+    m = RANGE_RE.match(header.strip())
+    if not m:
+        return None  # multi-range or unknown unit: serve the full entity
+    first, last = m.groups()
+    if not first and not last:
+        return None
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError
+    return start, end
+
+
+class RangeFileResponse(Response):
+    """File response honouring Range / If-Range.
+
+    Uses the ASGI zero-copy send extension (sendfile) when the server advertises
+    it, else streams the slice in chunks read off the event loop.
+    """
+
+    def __init__(self, path: str, media_type: str, range_header: Optional[str] = None,
+                 if_range: Optional[str] = None, headers: Optional[Dict[str, str]] = None):
+        st = os.stat(path)
+        self.path = path
+        self.size = st.st_size
+        tag = f'"{st.st_size:x}-{int(st.st_mtime):x}"'
+        base = {"accept-ranges": "bytes", "etag": tag, **(headers or {})}
+        self.slice: Tuple[int, int] = (0, self.size - 1)
+        status = 200
+        if if_range is None or if_range == tag:
+            try:
+                rng = parse_range(range_header, self.size)
+            except ValueError:
+                super().__init__(status_code=416, headers={**base, "content-range": f"bytes */{self.size}"})
+                self.slice = (0, -1)
+                return
+            if rng is not None:
+                self.slice = rng
+                status = 206
+                base["content-range"] = f"bytes {rng[0]}-{rng[1]}/{self.size}"
+        super().__init__(status_code=status, media_type=media_type, headers=base)
+        self.headers["content-length"] = str(self.slice[1] - self.slice[0] + 1)
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        start, end = self.slice
+        count = end - start + 1
+        if scope["method"].upper() == "HEAD" or count <= 0:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        with open(self.path, "rb") as f:
+            if "http.response.zerocopysend" in scope.get("extensions", {}):
+                await send({"type": "http.response.zerocopysend", "file": f, "offset": start, "count": count})
+                return
+            f.seek(start)
+            while count > 0:
+                chunk = await asyncio.to_thread(f.read, min(CHUNK_SIZE, count))
+                if not chunk:
+                    break
+                count -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": count > 0})
+            if count > 0:
+                await send({"type": "http.response.body", "body": b""})
+
+
+video_cache = VideoCache()
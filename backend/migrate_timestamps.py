@@ -0,0 +1,58 @@
+"""
+Convert legacy ISO-string (or epoch-seconds) created_at/updated_at fields to BSON datetimes.
+
+    python migrate_timestamps.py                 # every marketing_* collection, marketing_revisions included
+    python migrate_timestamps.py --collections marketing_reels --batch-size 200 --pause 0.1
+    python migrate_timestamps.py --dry-run       # count only, no writes or checkpoints
+
+Progress is checkpointed per collection in `migrations`, so an interrupted run
+picks up where it stopped. The API reads both formats meanwhile.
+"""
+
+import argparse
+import asyncio
+import os
+
+from dotenv import load_dotenv
+from motor.motor_asyncio import AsyncIOMotorClient
+
+from etag_service import VersionStamps
+from timestamp_service import MIGRATIONS_COLLECTION, migrate
+
+load_dotenv()
+
+MONGO_URL = os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+DB_NAME = os.environ.get("DB_NAME", "aavana_dmm")
+
+
+async def main(args: argparse.Namespace):
+    db = AsyncIOMotorClient(MONGO_URL, tz_aware=True)[DB_NAME]
+
+    async def get_db():
+        return db
+
+    if args.restart:
+        await db[MIGRATIONS_COLLECTION].delete_many({"_id": {"$regex": "^timestamps:"}})
+    names = args.collections or sorted(n for n in await db.list_collection_names() if n.startswith("marketing_"))
+
+    async def progress(name: str, scanned: int, converted: int):
+        print(f"{name}: +{scanned} scanned, {converted} fields converted")
+
+    reports = await migrate(
+        db, names, batch_size=args.batch_size, dry_run=args.dry_run, pause_seconds=args.pause, on_batch=progress
+    )
+    if not args.dry_run:
+        # Serialized timestamps changed shape, so cached list/detail ETags must not match any more
+        await VersionStamps(get_db).bump(*(r["collection"] for r in reports if r["converted"]))
+    for r in reports:
+        print(f"{r['collection']}: converted={r['converted']} skipped={r['skipped']} resumed={r['resumed']} done={r['done']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--collections", nargs="*", help="defaults to every marketing_* collection")
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--pause", type=float, default=0.0, help="seconds to sleep between batches")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--restart", action="store_true", help="discard checkpoints and rescan from the start")
+    asyncio.run(main(parser.parse_args()))
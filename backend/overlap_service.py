@@ -0,0 +1,274 @@
+"""
+Audience overlap across campaigns.
+Each campaign's targeting is compiled against the audience index into a roaring-style
+chunked bitmap: the universe is reordered geo-first, cut into fixed-size containers,
+and only non-empty containers are kept. A pairwise overlap matrix is then one pass over
+containers, where each container multiplies just the campaigns present in it. Compiled
+bitmaps and pair counts are cached by targeting hash, so a targeting change only
+recomputes that campaign's row.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from audience_service import AudienceIndex
+
+CONTAINER_ROWS = 4096  # rows per container (64 uint64 words)
+CONTAINER_WORDS = CONTAINER_ROWS // 64
+CACHE_SIZE = int(os.environ.get("DMM_OVERLAP_CACHE_SIZE", "2000"))
+# Share of the smaller audience that two campaigns must have in common to be flagged
+ALERT_SHARE = float(os.environ.get("DMM_OVERLAP_ALERT_SHARE", "0.3"))
+GEO_LEVELS = ("states", "cities", "areas")
+
+
+def targeting_hash(targeting: Dict[str, Any]) -> str:
+    # schedule decides when ads run, not who sees them
+    t = {k: v for k, v in (targeting or {}).items() if v not in (None, [], "") and k != "schedule"}
+    return hashlib.sha1(json.dumps(t, sort_keys=True, default=str).encode()).hexdigest()[:20]
+
+
+class ChunkedBitmap:
+    """Non-empty containers of a bitmap: sorted container keys plus a (k, CONTAINER_WORDS) block array"""
+
+    __slots__ = ("keys", "blocks", "cardinality", "unknown")
+
+    def __init__(self, keys: np.ndarray, blocks: np.ndarray, unknown: List[str]):
+        self.keys = keys
+        self.blocks = blocks
+        self.cardinality = int(np.bitwise_count(blocks).sum())
+        self.unknown = unknown
+
+    @property
+    def nbytes(self) -> int:
+        return int(self.keys.nbytes + self.blocks.nbytes)
+
+
+class OverlapEngine:
+    def __init__(self, get_index: Callable[[], AudienceIndex]):
+        self.get_index = get_index
+        self._index: Optional[AudienceIndex] = None
+        self._order: Optional[np.ndarray] = None
+        self._compiled: "OrderedDict[str, ChunkedBitmap]" = OrderedDict()
+        # Pair counts live in a slot-indexed matrix; each cached targeting owns one row/column
+        self._slots: Dict[str, int] = {}
+        self._free: List[int] = []
+        self._counts = np.zeros((64, 64), dtype=np.int64)
+        self._known = np.zeros((64, 64), dtype=bool)
+        self._campaign_hash: Dict[str, str] = {}
+        # matrix() runs in worker threads; every cache above is shared between them (re-entrant: matrix
+        # calls compile/invalidate)
+        self._lock = threading.RLock()
+        self.stats = {"compiled": 0, "compile_hits": 0, "pairs_computed": 0, "pairs_cached": 0, "invalidated": 0}
+
+    # ----------------------
+    # Compilation
+    # ----------------------
+    def _geo_order(self, index: AudienceIndex) -> np.ndarray:
+        """Row permutation that clusters each state/city/area into contiguous containers"""
+        keys = []
+        for level in reversed(GEO_LEVELS):  # lexsort: last key is primary
+            values = index.dims.get(level)
+            if not values:
+                continue
+            code = np.full(index.words * 64, -1, dtype=np.int32)
+            for i, (_, bitmap) in enumerate(values.values()):
+                code[np.unpackbits(bitmap.view(np.uint8), bitorder="little").astype(bool)] = i
+            keys.append(code)
+        return np.lexsort(keys) if keys else np.arange(index.words * 64)
+
+    def _sync_index(self) -> AudienceIndex:
+        index = self.get_index()
+        if index is not self._index:
+            # New audience table: every compiled bitmap and pair count refers to the old rows
+            self._index, self._order = index, self._geo_order(index)
+            self._compiled.clear()
+            self._slots.clear()
+            self._free.clear()
+            self._known[:] = False
+        return index
+
+    def compile(self, targeting: Dict[str, Any], pinned: frozenset = frozenset()) -> Tuple[str, ChunkedBitmap]:
+        """Cached chunked bitmap for a targeting; keys in `pinned` (still needed by the caller) are never evicted"""
+        with self._lock:
+            return self._compile(targeting, pinned)
+
+    def _compile(self, targeting: Dict[str, Any], pinned: frozenset) -> Tuple[str, ChunkedBitmap]:
+        index = self._sync_index()
+        key = targeting_hash(targeting)
+        hit = self._compiled.get(key)
+        if hit is not None:
+            self._compiled.move_to_end(key)
+            self.stats["compile_hits"] += 1
+            return key, hit
+        dense, unknown = index.compile(targeting or {})
+        bits = np.unpackbits(dense.view(np.uint8), bitorder="little")[self._order]
+        pad = (-bits.shape[0]) % CONTAINER_ROWS
+        words = np.packbits(np.concatenate([bits, np.zeros(pad, np.uint8)]), bitorder="little").view(np.uint64)
+        blocks = words.reshape(-1, CONTAINER_WORDS)
+        present = np.flatnonzero(blocks.any(axis=1))
+        compiled = ChunkedBitmap(present.astype(np.int32), blocks[present].copy(), unknown)
+        self._compiled[key] = compiled
+        self.stats["compiled"] += 1
+        # Least recently used first; once the oldest entry is pinned, the cache runs over size for this call
+        while len(self._compiled) > CACHE_SIZE:
+            old = next(iter(self._compiled))
+            if old in pinned:
+                break
+            del self._compiled[old]
+            self._drop_pairs(old)
+        return key, compiled
+
+    def _slot(self, key: str) -> int:
+        slot = self._slots.get(key)
+        if slot is None:
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot = len(self._slots)
+                if slot == self._counts.shape[0]:
+                    cap = slot * 2
+                    counts = np.zeros((cap, cap), dtype=np.int64)
+                    known = np.zeros((cap, cap), dtype=bool)
+                    counts[:slot, :slot], known[:slot, :slot] = self._counts, self._known
+                    self._counts, self._known = counts, known
+            self._slots[key] = slot
+        return slot
+
+    def _drop_pairs(self, key: str):
+        slot = self._slots.pop(key, None)
+        if slot is not None:
+            self._known[slot, :] = False
+            self._known[:, slot] = False
+            self._free.append(slot)
+
+    def invalidate(self, campaign_id: str, targeting: Optional[Dict[str, Any]] = None):
+        """Forget a campaign's previous targeting once it changes (or the campaign goes away)"""
+        with self._lock:
+            self._invalidate(campaign_id, targeting)
+
+    def _invalidate(self, campaign_id: str, targeting: Optional[Dict[str, Any]]):
+        old = self._campaign_hash.get(campaign_id)
+        new = targeting_hash(targeting) if targeting is not None else None
+        if old is None or old == new:
+            return
+        del self._campaign_hash[campaign_id]
+        if old not in self._campaign_hash.values():
+            self._compiled.pop(old, None)
+            self._drop_pairs(old)
+            self.stats["invalidated"] += 1
+
+    # ----------------------
+    # Overlap
+    # ----------------------
+    @staticmethod
+    def _pair_counts(left: List[ChunkedBitmap], right: List[ChunkedBitmap]) -> np.ndarray:
+        """|L_i & R_j| for all i, j: per container, a GEMM over the unpacked bits of the campaigns present"""
+        out = np.zeros((len(left), len(right)), dtype=np.float64)
+        by_key: Dict[int, Tuple[List[int], List[np.ndarray]]] = {}
+        for j, bm in enumerate(right):
+            for pos, k in enumerate(bm.keys.tolist()):
+                entry = by_key.setdefault(k, ([], []))
+                entry[0].append(j)
+                entry[1].append(bm.blocks[pos])
+        left_by_key: Dict[int, Tuple[List[int], List[np.ndarray]]] = {}
+        for i, bm in enumerate(left):
+            for pos, k in enumerate(bm.keys.tolist()):
+                if k in by_key:
+                    entry = left_by_key.setdefault(k, ([], []))
+                    entry[0].append(i)
+                    entry[1].append(bm.blocks[pos])
+        for k, (li, lb) in left_by_key.items():
+            rj, rb = by_key[k]
+            lu = np.unpackbits(np.stack(lb).view(np.uint8), axis=1, bitorder="little").astype(np.float32)
+            ru = np.unpackbits(np.stack(rb).view(np.uint8), axis=1, bitorder="little").astype(np.float32)
+            out[np.ix_(li, rj)] += lu @ ru.T
+        return out.round().astype(np.int64)
+
+    def matrix(
+        self, campaigns: List[Dict[str, Any]], alert_share: float = ALERT_SHARE, max_alerts: int = 500
+    ) -> Dict[str, Any]:
+        """Pairwise overlap for campaign docs with a targeting dict; cached pairs are reused"""
+        with self._lock:
+            return self._matrix(campaigns, alert_share, max_alerts)
+
+    def _matrix(self, campaigns: List[Dict[str, Any]], alert_share: float, max_alerts: int) -> Dict[str, Any]:
+        started = time.perf_counter()
+        index = self._sync_index()
+        pinned = frozenset(targeting_hash(c.get("targeting") or {}) for c in campaigns)
+        keys: List[str] = []
+        for c in campaigns:
+            self._invalidate(c["id"], c.get("targeting") or {})
+            key, _ = self._compile(c.get("targeting") or {}, pinned)
+            self._campaign_hash[c["id"]] = key
+            keys.append(key)
+        unique = list(dict.fromkeys(keys))
+        slots = np.array([self._slot(k) for k in unique], dtype=np.int64)
+        computed = 0
+        # New targetings first (their rows fill every gap in their columns), then any pairs never seen together
+        for pick in (lambda known: ~np.diag(known), lambda known: ~known.all(axis=1)):
+            rows = np.flatnonzero(pick(self._known[np.ix_(slots, slots)]))
+            if not rows.size:
+                continue
+            fresh = self._pair_counts([self._compiled[unique[r]] for r in rows], [self._compiled[k] for k in unique])
+            self._counts[np.ix_(slots[rows], slots)] = fresh
+            self._counts[np.ix_(slots, slots[rows])] = fresh.T
+            self._known[np.ix_(slots[rows], slots)] = True
+            self._known[np.ix_(slots, slots[rows])] = True
+            computed += int(fresh.size)
+        self.stats["pairs_computed"] += computed
+        self.stats["pairs_cached"] += max(len(unique) ** 2 - computed, 0)
+
+        pos = {k: i for i, k in enumerate(unique)}
+        idx = slots[[pos[k] for k in keys]]
+        full = self._counts[np.ix_(idx, idx)]
+        sizes = np.diag(full).astype(np.float64)
+        smaller = np.minimum(sizes[:, None], sizes[None, :])
+        union = sizes[:, None] + sizes[None, :] - full
+        share = np.divide(full, smaller, out=np.zeros_like(smaller), where=smaller > 0)
+        jaccard = np.divide(full, union, out=np.zeros_like(union), where=union > 0)
+
+        n = len(campaigns)
+        iu, ju = np.triu_indices(n, k=1)
+        flagged = np.flatnonzero(share[iu, ju] >= alert_share)
+        flagged = flagged[np.argsort(-share[iu, ju][flagged], kind="stable")]
+        return {
+            "campaigns": [
+                {"id": c["id"], "campaign_name": c.get("campaign_name"), "status": c.get("status"),
+                 "estimated_reach": int(sizes[i] * index.scale), "unknown_values": self._compiled[keys[i]].unknown}
+                for i, c in enumerate(campaigns)
+            ],
+            "overlap_share": share.round(4).tolist(),
+            "jaccard": jaccard.round(4).tolist(),
+            "shared_reach": (full * index.scale).astype(np.int64).tolist(),
+            "alerts": [
+                {"a": campaigns[iu[f]]["id"], "b": campaigns[ju[f]]["id"],
+                 "overlap_share": round(float(share[iu[f], ju[f]]), 4),
+                 "jaccard": round(float(jaccard[iu[f], ju[f]]), 4),
+                 "shared_reach": int(full[iu[f], ju[f]] * index.scale)}
+                for f in flagged[:max_alerts].tolist()
+            ],
+            "alert_count": int(flagged.size),
+            "alert_share": alert_share,
+            "unique_targetings": len(unique),
+            "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+        }
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return self._snapshot()
+
+    def _snapshot(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "index_version": self._index.version if self._index is not None else None,
+            "cached_bitmaps": len(self._compiled),
+            "cached_bitmap_bytes": sum(c.nbytes for c in self._compiled.values()),
+            "cached_pairs": int(self._known.sum()),
+        }
@@ -0,0 +1,186 @@
+"""
+Tolerant JSON extraction and section mapping for LLM responses.
+Pulls the JSON object out of free-form model output, repairs common damage
+(code fences, trailing commas, truncation) and maps keys onto per-endpoint sections.
+"""
+
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+_FENCE_RE = re.compile(r"```(?:json)?", re.IGNORECASE)
+_TRAILING_COMMA_RE = re.compile(r",\s*([}\]])")
+_KEY_RE = re.compile(r"[^a-z0-9]+")
+_DANGLING_KEY_RE = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+
+class JsonScanner:
+    """Incremental scanner: feed chunks, get the first complete top-level JSON object/array.
+
+    Tracks string/escape state and bracket depth so braces inside strings are ignored.
+    """
+
+    def __init__(self):
+        self.buf: List[str] = []
+        self.stack: List[str] = []
+        self.started = False
+        self.in_string = False
+        self.escape = False
+        self.done = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        for ch in chunk:
+            if self.done:
+                break
+            if not self.started:
+                if ch in "{[":
+                    self.started = True
+                    self.stack.append("}" if ch == "{" else "]")
+                    self.buf.append(ch)
+                continue
+            self.buf.append(ch)
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == "\\":
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch in "{[":
+                self.stack.append("}" if ch == "{" else "]")
+            elif ch in "}]":
+                if self.stack:
+                    self.stack.pop()
+                if not self.stack:
+                    self.done = True
+        return "".join(self.buf) if self.done else None
+
+    def repaired(self) -> Optional[str]:
+        """Best-effort close of a truncated document"""
+        if not self.started:
+            return None
+        text = "".join(self.buf)
+        if self.in_string:
+            text += '"'
+        if self.stack and self.stack[-1] == "}":
+            # An object key cut off before its value: drop it
+            text = _DANGLING_KEY_RE.sub(r"\1", text)
+        text = re.sub(r"[,:]\s*$", "", text.rstrip())
+        return text + "".join(reversed(self.stack))
+
+
+def _loads(text: str) -> Any:
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        return json.loads(_TRAILING_COMMA_RE.sub(r"\1", text))
+
+
+def extract_json(text: str) -> Tuple[Optional[Any], str]:
+    """Return (parsed, status) where status is "ok", "repaired" or "none"."""
+    if not text:
+        return None, "none"
+    cleaned = _FENCE_RE.sub("", text)
+    scanner = JsonScanner()
+    complete = scanner.feed(cleaned)
+    try:
+        if complete is not None:
+            return _loads(complete), "ok"
+        repaired = scanner.repaired()
+        if repaired:
+            return _loads(repaired), "repaired"
+    except (json.JSONDecodeError, ValueError):
+        pass
+    return None, "none"
+
+
+def _norm(key: str) -> str:
+    return _KEY_RE.sub("_", str(key).lower()).strip("_")
+
+
+def _as_hashtags(value: Any) -> List[str]:
+    if isinstance(value, dict):
+        value = [v for vals in value.values() for v in (vals if isinstance(vals, list) else [vals])]
+    if isinstance(value, str):
+        value = re.split(r"[\s,]+", value)
+    tags = []
+    for v in value if isinstance(value, list) else []:
+        tag = (v.get("tag") or v.get("hashtag")) if isinstance(v, dict) else v
+        if isinstance(tag, str) and tag.strip():
+            t = tag.strip()
+            tags.append(t if t.startswith("#") else f"#{t}")
+    return list(dict.fromkeys(tags))
+
+
+# section -> (key fragments to match after normalisation, coercer or None)
+SCHEMAS: Dict[str, Dict[str, Tuple[Tuple[str, ...], Any]]] = {
+    "strategy": {
+        "market_analysis": (("market", "positioning"), None),
+        "content_strategy": (("content",), None),
+        "channel_mix": (("channel",), None),
+        "budget_allocation": (("budget",), None),
+        "kpis": (("kpi", "metric", "success"), None),
+        "timeline": (("timeline", "milestone"), None),
+        "challenges": (("challenge", "risk", "solution"), None),
+    },
+    "content": {
+        "concepts": (("concept", "idea"), None),
+        "visual_style": (("visual", "style"), None),
+        "messaging": (("messag", "tone"), None),
+        "hashtags": (("hashtag", "tags"), _as_hashtags),
+        "production_costs": (("cost", "production", "budget"), None),
+        "performance": (("performance", "prediction"), None),
+    },
+    "campaign": {
+        "channel_budget": (("budget", "allocation"), None),
+        "timeline": (("timeline",), None),
+        "creative_requirements": (("creative",), None),
+        "targeting": (("targeting",), None),
+        "roi_kpis": (("roi", "kpi"), None),
+        "risks": (("risk", "mitigation"), None),
+        "ab_tests": (("a_b", "ab_test", "testing", "experiment"), None),
+    },
+}
+
+
+def _unwrap(obj: Any) -> Dict[str, Any]:
+    """Descend through single-key wrappers like {"strategy": {...}}"""
+    while isinstance(obj, dict) and len(obj) == 1 and isinstance(next(iter(obj.values())), dict):
+        obj = next(iter(obj.values()))
+    return obj if isinstance(obj, dict) else {}
+
+
+def parse_sections(kind: str, text: str) -> Dict[str, Any]:
+    """Parse an LLM response into schema sections.
+
+    Returns fields to merge into the stored document: ``sections``,
+    ``parse_status`` ("parsed" | "partial" | "unparsed") and ``parse_missing``.
+    """
+    schema = SCHEMAS[kind]
+    parsed, status = extract_json(text)
+    body = _unwrap(parsed)
+    if not body:
+        return {"sections": {}, "parse_status": "unparsed", "parse_missing": list(schema)}
+    sections: Dict[str, Any] = {}
+    keys = {_norm(k): k for k in body}
+    used = set()
+    # Exact section names first, then fragment matches; each response key is used once
+    for exact in (True, False):
+        for section, (fragments, coerce) in schema.items():
+            if section in sections:
+                continue
+            for norm, raw in keys.items():
+                if norm in used:
+                    continue
+                if norm == section if exact else any(f in norm for f in fragments):
+                    sections[section] = coerce(body[raw]) if coerce else body[raw]
+                    used.add(norm)
+                    break
+    missing = [s for s in schema if s not in sections]
+    return {
+        "sections": sections,
+        "parse_status": "parsed" if not missing and status == "ok" else "partial",
+        "parse_missing": missing,
+    }
@@ -0,0 +1,251 @@
+"""
+Prompt assembly for the DMM generators.
+Precompiled templates, local token counting and per-model input budgets with truncation.
+"""
+
+import math
+import os
+import string
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Input token budgets per model (prompt only; completions are bounded by the provider)
+MODEL_INPUT_BUDGETS: Dict[str, int] = {
+    "gpt-5": int(os.environ.get("DMM_PROMPT_BUDGET_GPT5", "6000")),
+    "gpt-5-mini": int(os.environ.get("DMM_PROMPT_BUDGET_GPT5_MINI", "4000")),
+    "gpt-5-nano": int(os.environ.get("DMM_PROMPT_BUDGET_GPT5_NANO", "2500")),
+}
+DEFAULT_INPUT_BUDGET = 4000
+
+TRUNCATION_MARKER = " …[truncated]… "
+_CHARS_PER_TOKEN = 4
+
+_encoder: Any = None
+_encoder_loaded = False
+
+
+def _get_encoder():
+    """tiktoken encoder if available locally, else None (char heuristic)"""
+    global _encoder, _encoder_loaded
+    if not _encoder_loaded:
+        _encoder_loaded = True
+        try:
+            import tiktoken
+
+            _encoder = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _encoder = None
+    return _encoder
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _get_encoder()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    return math.ceil(len(text) / _CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Keep the head (and a short tail) of text so it fits in max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    marker_tokens = count_tokens(TRUNCATION_MARKER)
+    keep = max(max_tokens - marker_tokens, 0)
+    head_n, tail_n = math.ceil(keep * 0.75), keep - math.ceil(keep * 0.75)
+    enc = _get_encoder()
+    if enc is not None:
+        ids = enc.encode(text, disallowed_special=())
+        head = enc.decode(ids[:head_n])
+        tail = enc.decode(ids[len(ids) - tail_n:]) if tail_n else ""
+    else:
+        head = text[:head_n * _CHARS_PER_TOKEN]
+        tail = text[len(text) - tail_n * _CHARS_PER_TOKEN:] if tail_n else ""
+    return head + TRUNCATION_MARKER + tail
+
+
+def input_budget(model: str) -> int:
+    return MODEL_INPUT_BUDGETS.get(model, DEFAULT_INPUT_BUDGET)
+
+
+@dataclass
+class RenderedPrompt:
+    name: str
+    model: str
+    text: str
+    prompt_tokens: int
+    budget: int
+    truncated_fields: List[str] = field(default_factory=list)
+
+    def usage(self, completion: Optional[str]) -> Dict[str, Any]:
+        return {
+            "template": self.name,
+            "model": self.model,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": count_tokens(completion or ""),
+            "input_budget": self.budget,
+            "truncated_fields": self.truncated_fields,
+        }
+
+
+class PromptTemplate:
+    """A str.format template parsed once at registration"""
+
+    def __init__(self, name: str, source: str, truncatable: Iterable[str] = ()):
+        self.name = name
+        self.source = source
+        self.fields = [f for _, f, _, _ in string.Formatter().parse(source) if f]
+        self.truncatable = [f for f in truncatable if f in self.fields]
+        # Token cost of the static text, measured once
+        self.overhead_tokens = count_tokens(source.format_map({f: "" for f in self.fields}))
+
+    def render(self, model: str, values: Dict[str, Any]) -> RenderedPrompt:
+        budget = input_budget(model)
+        vals = {f: str(values.get(f, "")) for f in self.fields}
+        sizes = {f: count_tokens(vals[f]) for f in self.fields}
+        fixed = self.overhead_tokens + sum(n for f, n in sizes.items() if f not in self.truncatable)
+        available = max(budget - fixed, 0)
+        truncated: List[str] = []
+        if sum(sizes[f] for f in self.truncatable) > available:
+            for f, limit in _water_fill([(f, sizes[f]) for f in self.truncatable], available).items():
+                if sizes[f] > limit:
+                    vals[f] = truncate_to_tokens(vals[f], limit)
+                    truncated.append(f)
+        text = self.source.format_map(vals)
+        return RenderedPrompt(self.name, model, text, count_tokens(text), budget, truncated)
+
+
+def _water_fill(sizes: List[Tuple[str, int]], available: int) -> Dict[str, int]:
+    """Split available tokens so short fields keep everything and long ones share the rest"""
+    limits: Dict[str, int] = {}
+    remaining = sorted(sizes, key=lambda x: x[1])
+    while remaining:
+        share = available // len(remaining)
+        name, size = remaining.pop(0)
+        limits[name] = min(size, share)
+        available -= limits[name]
+    return limits
+
+
+class PromptRegistry:
+    def __init__(self):
+        self._templates: Dict[str, PromptTemplate] = {}
+
+    def register(self, name: str, source: str, truncatable: Iterable[str] = ()) -> PromptTemplate:
+        tpl = PromptTemplate(name, source, truncatable)
+        self._templates[name] = tpl
+        return tpl
+
+    def render(self, name: str, model: str, **values: Any) -> RenderedPrompt:
+        return self._templates[name].render(model, values)
+
+
+def _list_or_dash(v: Optional[List[str]]) -> str:
+    return ", ".join(v) if v else "-"
+
+
+def targeting_summary(t: Optional[Dict[str, Any]]) -> str:
+    """Compact one-line summary of a TargetingFilters dict; empty fields are skipped"""
+    if not t:
+        return "None"
+    parts: List[str] = []
+    if t.get("age_min") or t.get("age_max"):
+        parts.append(f"Age: {t.get('age_min') or '-'}-{t.get('age_max') or '-'}")
+    geo = [f"{k}={_list_or_dash(t[k]) if isinstance(t[k], list) else t[k]}"
+           for k in ("country", "states", "cities", "areas") if t.get(k)]
+    if geo:
+        parts.append("Geo: " + ", ".join(geo))
+    for key, label in (("gender", "Gender"), ("interests", "Interests"), ("behaviors", "Behaviors"),
+                       ("devices", "Devices"), ("placements", "Placements")):
+        if t.get(key):
+            parts.append(f"{label}: {_list_or_dash(t[key])}")
+    sched = t.get("schedule") or {}
+    if any(sched.values()):
+        parts.append(
+            f"Schedule: {sched.get('start_date') or '-'} to {sched.get('end_date') or '-'}, "
+            f"Dayparts: {_list_or_dash(sched.get('dayparts'))}"
+        )
+    b2b = [f"{k}={_list_or_dash(t[k])}" for k in ("industries", "job_titles", "company_sizes") if t.get(k)]
+    if b2b:
+        parts.append("B2B: " + ", ".join(b2b))
+    return "; ".join(parts) or "None"
+
+
+registry = PromptRegistry()
+
+registry.register(
+    "strategy",
+    """
+    Create a comprehensive digital marketing strategy for:
+    Company: {company_name}
+    Industry: {industry}
+    Target Audience: {target_audience}
+    Budget: {budget}
+    Goals: {goals}
+    Website: {website_url}
+
+    Please provide:
+    1. Market Analysis & Positioning
+    2. Content Strategy (types, frequency, platforms)
+    3. Channel Mix Recommendations
+    4. Budget Allocation Suggestions
+    5. KPI & Success Metrics
+    6. Timeline & Milestones
+    7. Potential Challenges & Solutions
+
+    Format as detailed JSON with clear sections.
+    """,
+    truncatable=("target_audience", "goals", "industry"),
+)
+
+registry.register(
+    "content",
+    """
+    Generate creative content ideas for:
+    Content Type: {content_type}
+    Brief: {brief}
+    Target Audience: {target_audience}
+    Platform: {platform}
+    Budget: {budget}
+    Festival/Theme: {festival}
+
+    Please provide:
+    1. 5 creative concepts with detailed descriptions
+    2. Visual style recommendations
+    3. Messaging & tone suggestions
+    4. Hashtag recommendations
+    5. Estimated production costs
+    6. Performance predictions
+
+    Format as detailed JSON with clear structure.
+    """,
+    truncatable=("brief", "target_audience"),
+)
+
+registry.register(
+    "campaign",
+    """
+    Optimize this marketing campaign:
+    Campaign: {campaign_name}
+    Objective: {objective}
+    Target Audience: {target_audience}
+    Budget: ${budget}
+    Channels: {channels}
+    Duration: {duration_days} days
+    Targeting: {targeting}
+    Numeric allocation baseline (response-curve optimizer): {allocation}
+
+    Please provide:
+    1. Channel-specific budget allocation (start from the numeric baseline; justify any deviation)
+    2. Timeline optimization
+    3. Creative requirements per channel
+    4. Targeting parameters (confirm/refine provided targeting)
+    5. Expected ROI & KPIs
+    6. Risk assessment & mitigation
+    7. A/B testing recommendations
+
+    Format as detailed JSON with clear sections.
+    """,
+    truncatable=("objective", "target_audience", "targeting"),
+)
@@ -0,0 +1,421 @@
+"""
+Scheduled publishing of approved posts to Meta pages.
+Posts sit in a Mongo outbox; each process keeps a due-time heap, hands due posts
+to a small worker pool, claims them with a lease (safe across workers/processes)
+and paces dispatch with per-page rate limits kept in Mongo.
+"""
+
+import asyncio
+import heapq
+import logging
+import os
+import socket
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from zoneinfo import ZoneInfo
+
+import httpx
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from timestamp_service import now_utc
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_COLLECTION = "publish_outbox"
+LIMITS_COLLECTION = "publish_page_limits"  # one GCRA slot per page, shared across processes
+PUBLISH_TZ = ZoneInfo(os.environ.get("DMM_PUBLISH_TZ", "Asia/Kolkata"))
+WORKERS = int(os.environ.get("DMM_PUBLISH_WORKERS", "4"))
+PAGE_RATE_PER_MINUTE = float(os.environ.get("DMM_PUBLISH_PAGE_RATE_PER_MINUTE", "10"))
+PAGE_BURST = int(os.environ.get("DMM_PUBLISH_PAGE_BURST", "5"))
+LEASE_SECONDS = float(os.environ.get("DMM_PUBLISH_LEASE_SECONDS", "60"))
+PUBLISH_TIMEOUT_SECONDS = 30.0
+MAX_ATTEMPTS = int(os.environ.get("DMM_PUBLISH_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = 30.0
+REFRESH_SECONDS = 15.0
+HORIZON_SECONDS = 300.0  # only posts due within this window are held in memory
+
+# Local-time windows (start hour, end hour) for TargetingSchedule.dayparts
+DAYPARTS: Dict[str, Tuple[int, int]] = {
+    "early_morning": (6, 9),
+    "morning": (9, 12),
+    "business_hours": (9, 18),
+    "afternoon": (12, 17),
+    "evenings": (18, 22),
+    "evening": (18, 22),
+    "night": (21, 24),
+}
+
+
+class GraphRateLimited(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"rate limited, retry after {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# ----------------------
+# Graph API clients
+# ----------------------
+class MockGraphAPI:
+    """Local Graph API stand-in: per-page rate limit, small latency, records every post"""
+
+    def __init__(self, latency: float = 0.02, page_limit_per_minute: float = 60):
+        self.latency = latency
+        self.page_limit = page_limit_per_minute
+        self.posts: List[Dict[str, Any]] = []
+        self._recent: Dict[str, List[float]] = {}
+
+    async def publish(self, page_id: str, message: str, image_url: Optional[str] = None) -> str:
+        now = time.monotonic()
+        recent = [t for t in self._recent.get(page_id, []) if t > now - 60]
+        if len(recent) >= self.page_limit:
+            raise GraphRateLimited(60 - (now - recent[0]))
+        recent.append(now)
+        self._recent[page_id] = recent
+        await asyncio.sleep(self.latency)
+        post_id = f"mock_post_{uuid.uuid4().hex[:8]}"
+        self.posts.append({"id": post_id, "page_id": page_id, "message": message, "image_url": image_url, "ts": time.time()})
+        return post_id
+
+
+def _graph_error_code(r: httpx.Response) -> Optional[int]:
+    """Graph error code from a failed response; None when the body isn't Graph JSON (e.g. a proxy's HTML 502)"""
+    try:
+        body = r.json()
+    except ValueError:
+        return None
+    error = body.get("error") if isinstance(body, dict) else None
+    return error.get("code") if isinstance(error, dict) else None
+
+
+class MetaGraphClient:
+    def __init__(self, access_token: str, base_url: str = "https://graph.facebook.com/v19.0"):
+        self.access_token = access_token
+        self.base_url = base_url
+
+    async def publish(self, page_id: str, message: str, image_url: Optional[str] = None) -> str:
+        if image_url:
+            url, data = f"{self.base_url}/{page_id}/photos", {"caption": message, "url": image_url}
+        else:
+            url, data = f"{self.base_url}/{page_id}/feed", {"message": message}
+        async with httpx.AsyncClient(timeout=PUBLISH_TIMEOUT_SECONDS) as client:
+            r = await client.post(url, data={**data, "access_token": self.access_token})
+        if r.status_code == 429 or (r.status_code >= 400 and _graph_error_code(r) in (4, 17, 32, 613)):
+            raise GraphRateLimited(float(r.headers.get("retry-after", "300")))
+        r.raise_for_status()
+        body = r.json()
+        return body.get("post_id") or body["id"]
+
+
+# ----------------------
+# Scheduling
+# ----------------------
+def _local(value: str) -> datetime:
+    t = datetime.fromisoformat(value)
+    return t.replace(tzinfo=PUBLISH_TZ) if t.tzinfo is None else t.astimezone(PUBLISH_TZ)
+
+
+def schedule_end(schedule: Optional[Dict[str, Any]]) -> Optional[datetime]:
+    """Exclusive end of the schedule: a date-only end_date covers that whole local day"""
+    value = (schedule or {}).get("end_date")
+    if not value:
+        return None
+    end = _local(value)
+    return end + timedelta(days=1) if len(value) == 10 else end
+
+
+def due_time(schedule: Optional[Dict[str, Any]], now: Optional[datetime] = None) -> Optional[datetime]:
+    """Earliest UTC instant >= now, on/after start_date, inside one of the dayparts (if any);
+    None when that slot falls after end_date (the campaign is over)"""
+    schedule = schedule or {}
+    t = (now or now_utc()).astimezone(PUBLISH_TZ)
+    if schedule.get("start_date"):
+        t = max(t, _local(schedule["start_date"]))
+    slot = t
+    windows = sorted(DAYPARTS[d] for d in (schedule.get("dayparts") or []) if d in DAYPARTS)
+    for day in range(8 if windows else 0):
+        base = (t + timedelta(days=day)).replace(hour=0, minute=0, second=0, microsecond=0)
+        begin = next((base + timedelta(hours=lo) for lo, hi in windows if t < base + timedelta(hours=hi)), None)
+        if begin is not None:
+            slot = max(t, begin)
+            break
+    end = schedule_end(schedule)
+    if end is not None and slot >= end:
+        return None
+    return slot.astimezone(timezone.utc)
+
+
+def _epoch_to_date(field: str) -> Dict[str, Any]:
+    return {"$cond": [{"$isNumber": f"${field}"}, {"$toDate": {"$multiply": [f"${field}", 1000]}}, f"${field}"]}
+
+
+class PageRateLimiter:
+    """Per-page GCRA limiter shared by every worker process through Mongo. Every call books
+    the page's next free slot and returns how long until it, so deferred posts are staggered
+    instead of all retrying at once."""
+
+    def __init__(
+        self,
+        get_db: Callable[[], Awaitable[Any]],
+        rate_per_minute: float = PAGE_RATE_PER_MINUTE,
+        burst: int = PAGE_BURST,
+    ):
+        self.get_db = get_db
+        self.interval = 60.0 / rate_per_minute
+        self.tolerance = (max(burst, 1) - 1) * self.interval
+
+    async def reserve(self, page_id: str) -> float:
+        coll = (await self.get_db())[LIMITS_COLLECTION]
+        while True:
+            now = time.time()
+            doc = await coll.find_one({"_id": page_id})
+            seen = doc["tat"] if doc else None  # theoretical arrival time
+            tat = max(seen if seen is not None else now, now)
+            try:
+                # Compare-and-set on the value read: a concurrent booking makes us re-read and retry
+                res = await coll.update_one(
+                    {"_id": page_id, "tat": seen}, {"$set": {"tat": tat + self.interval}}, upsert=seen is None
+                )
+            except DuplicateKeyError:
+                continue  # another worker created the page's row first
+            if seen is None or res.matched_count:
+                return max(tat - self.tolerance - now, 0.0)
+
+    async def pause(self, page_id: str, seconds: float):
+        coll = (await self.get_db())[LIMITS_COLLECTION]
+        await coll.update_one({"_id": page_id}, {"$max": {"tat": time.time() + seconds + self.tolerance}}, upsert=True)
+
+
+class Publisher:
+    def __init__(
+        self,
+        get_db: Callable[[], Awaitable[Any]],
+        graph: Any,
+        default_page_id: str = "",
+        workers: int = WORKERS,
+        limiter: Optional[PageRateLimiter] = None,
+    ):
+        self.get_db = get_db
+        self.graph = graph
+        self.default_page_id = default_page_id
+        self.workers = workers
+        self.limiter = limiter or PageRateLimiter(get_db)
+        self.owner = f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._heap: List[Tuple[float, str]] = []
+        self._tracked: Set[str] = set()
+        self._queue: Optional[asyncio.Queue] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._tasks: List[asyncio.Task] = []
+        self.stats = {"dispatched": 0, "published": 0, "failed": 0, "retried": 0, "rate_deferred": 0, "lag_total": 0.0}
+
+    async def ensure_indexes(self, db):
+        await db[OUTBOX_COLLECTION].create_index("id", unique=True)
+        await db[OUTBOX_COLLECTION].create_index([("item_type", 1), ("item_id", 1), ("page_id", 1)], unique=True)
+        await db[OUTBOX_COLLECTION].create_index([("status", 1), ("due_at", 1)])
+        # Rows queued before the outbox stored datetimes: epoch-second due_ts and stamps
+        await db[OUTBOX_COLLECTION].update_many(
+            {"due_ts": {"$exists": True}},
+            [
+                {"$set": {"due_at": _epoch_to_date("due_ts"),
+                          **{f: _epoch_to_date(f) for f in ("created_at", "updated_at", "published_at", "lease_until")}}},
+                {"$unset": "due_ts"},
+            ],
+        )
+
+    # -- lifecycle --
+    def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._wake = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        self._tasks = [loop.create_task(self._scheduler_loop())]
+        self._tasks += [loop.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    # -- outbox --
+    async def enqueue(self, entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Upsert outbox rows (one per item+page); already published/leased rows are left alone"""
+        coll = (await self.get_db())[OUTBOX_COLLECTION]
+        out = []
+        for e in entries:
+            page_id = e.get("page_id") or self.default_page_id
+            key = {"item_type": e["item_type"], "item_id": e["item_id"], "page_id": page_id}
+            try:
+                doc = await coll.find_one_and_update(
+                    {**key, "status": {"$nin": ["published", "leased"]}},
+                    {
+                        "$set": {
+                            "message": e["message"],
+                            "image_url": e.get("image_url"),
+                            "due_at": e["due_at"],
+                            "status": "scheduled",
+                            "slot_reserved": False,
+                            "error": None,
+                            "updated_at": now_utc(),
+                        },
+                        "$setOnInsert": {"id": str(uuid.uuid4()), "attempts": 0, "created_at": now_utc()},
+                    },
+                    upsert=True,
+                    projection={"_id": 0},
+                    return_document=ReturnDocument.AFTER,
+                )
+            except DuplicateKeyError:
+                # Already published or mid-dispatch: report it unchanged
+                out.append(await coll.find_one(key, {"_id": 0}))
+                continue
+            self.notify(doc["id"], doc["due_at"])
+            out.append(doc)
+        return out
+
+    async def cancel(self, outbox_id: str) -> bool:
+        coll = (await self.get_db())[OUTBOX_COLLECTION]
+        res = await coll.update_one(
+            {"id": outbox_id, "status": {"$in": ["scheduled", "failed"]}},
+            {"$set": {"status": "cancelled", "updated_at": now_utc()}},
+        )
+        return bool(res.modified_count)
+
+    def notify(self, outbox_id: str, due_at: datetime):
+        due_ts = due_at.timestamp()  # the in-memory heap runs on epoch seconds
+        if self._wake is None or outbox_id in self._tracked or due_ts > time.time() + HORIZON_SECONDS:
+            return
+        self._tracked.add(outbox_id)
+        heapq.heappush(self._heap, (due_ts, outbox_id))
+        self._wake.set()
+
+    # -- scheduler --
+    async def _refresh(self):
+        now = now_utc()
+        coll = (await self.get_db())[OUTBOX_COLLECTION]
+        rows = await coll.find(
+            {"$or": [
+                {"status": "scheduled", "due_at": {"$lte": now + timedelta(seconds=HORIZON_SECONDS)}},
+                {"status": "leased", "lease_until": {"$lt": now}},  # owner died mid-dispatch
+            ]},
+            {"_id": 0, "id": 1, "due_at": 1},
+        ).sort("due_at", 1).to_list(length=1000)
+        for r in rows:
+            self.notify(r["id"], min(r["due_at"], now))
+
+    async def _scheduler_loop(self):
+        next_refresh = 0.0
+        while True:
+            now = time.time()
+            if now >= next_refresh:
+                try:
+                    await self._refresh()
+                except Exception as e:
+                    logger.warning(f"Publish outbox refresh failed: {e}")
+                next_refresh = now + REFRESH_SECONDS
+            while self._heap and self._heap[0][0] <= now:
+                _, outbox_id = heapq.heappop(self._heap)
+                self._queue.put_nowait(outbox_id)
+            timeout = next_refresh - now
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - now)
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=max(timeout, 0.01))
+            except asyncio.TimeoutError:
+                pass
+
+    async def _worker(self):
+        while True:
+            outbox_id = await self._queue.get()
+            # The lease, not this set, guards against double dispatch
+            self._tracked.discard(outbox_id)
+            try:
+                await self._dispatch(outbox_id)
+            except Exception as e:
+                logger.warning(f"Publish dispatch failed for {outbox_id}: {e}")
+
+    async def _claim(self, coll, outbox_id: str) -> Optional[Dict[str, Any]]:
+        now = now_utc()
+        lease = {"status": "leased", "lease_owner": self.owner, "lease_until": now + timedelta(seconds=LEASE_SECONDS)}
+        doc = await coll.find_one_and_update(
+            {"id": outbox_id, "$or": [
+                {"status": "scheduled", "due_at": {"$lte": now}},
+                {"status": "leased", "lease_until": {"$lt": now}},
+            ]},
+            {"$set": lease},
+            projection={"_id": 0},
+        )
+        return {**doc, **lease} if doc else None
+
+    async def _reschedule(self, coll, doc: Dict[str, Any], delay: float, **fields):
+        due_at = now_utc() + timedelta(seconds=delay)
+        await coll.update_one(
+            {"id": doc["id"], "lease_owner": self.owner},
+            {"$set": {"status": "scheduled", "due_at": due_at, "lease_owner": None, "lease_until": None,
+                      "slot_reserved": False, "updated_at": now_utc(), **fields}},
+        )
+        self.notify(doc["id"], due_at)
+
+    async def _dispatch(self, outbox_id: str):
+        coll = (await self.get_db())[OUTBOX_COLLECTION]
+        doc = await self._claim(coll, outbox_id)
+        if doc is None:
+            return  # published, cancelled, moved later, or another worker holds the lease
+        if not doc.get("slot_reserved"):
+            wait = await self.limiter.reserve(doc["page_id"])
+            if wait > 0:
+                self.stats["rate_deferred"] += 1
+                return await self._reschedule(coll, doc, wait, slot_reserved=True)
+
+        self.stats["dispatched"] += 1
+        attempts = doc.get("attempts", 0) + 1
+        try:
+            post_id = await asyncio.wait_for(
+                self.graph.publish(doc["page_id"], doc["message"], doc.get("image_url")), timeout=PUBLISH_TIMEOUT_SECONDS
+            )
+        except GraphRateLimited as e:
+            await self.limiter.pause(doc["page_id"], e.retry_after)
+            self.stats["rate_deferred"] += 1
+            return await self._reschedule(coll, doc, e.retry_after, error=str(e))
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"[:300]
+            if attempts >= MAX_ATTEMPTS:
+                self.stats["failed"] += 1
+                await coll.update_one(
+                    {"id": doc["id"], "lease_owner": self.owner},
+                    {"$set": {"status": "failed", "attempts": attempts, "error": error, "lease_owner": None,
+                              "lease_until": None, "updated_at": now_utc()}},
+                )
+                return
+            self.stats["retried"] += 1
+            return await self._reschedule(
+                coll, doc, RETRY_BASE_SECONDS * 2 ** (attempts - 1), attempts=attempts, error=error
+            )
+
+        published_at = now_utc()
+        self.stats["published"] += 1
+        self.stats["lag_total"] += max((published_at - doc["due_at"]).total_seconds(), 0.0)
+        await coll.update_one(
+            {"id": doc["id"], "lease_owner": self.owner},
+            {"$set": {"status": "published", "post_id": post_id, "attempts": attempts, "published_at": published_at,
+                      "error": None, "lease_owner": None, "lease_until": None, "updated_at": published_at}},
+        )
+
+    async def snapshot(self) -> Dict[str, Any]:
+        coll = (await self.get_db())[OUTBOX_COLLECTION]
+        counts = await coll.aggregate([{"$group": {"_id": "$status", "n": {"$sum": 1}}}]).to_list(length=20)
+        stats = dict(self.stats)
+        lag_total = stats.pop("lag_total")
+        return {
+            "running": bool(self._tasks),
+            "owner": self.owner,
+            "workers": self.workers,
+            "in_memory": len(self._heap),
+            "queued": self._queue.qsize() if self._queue else 0,
+            "outbox": {c["_id"]: c["n"] for c in counts},
+            **stats,
+            "avg_lag_ms": round(lag_total / stats["published"] * 1000, 1) if stats["published"] else None,
+        }
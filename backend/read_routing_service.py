@@ -0,0 +1,134 @@
+"""
+Read-preference routing.
+Read-heavy routes (lists, search, stats) go to secondaries with bounded staleness;
+writes and read-your-writes paths stay on the primary. A background probe watches
+replication lag and pulls every route back to the primary when secondaries fall behind.
+"""
+
+import asyncio
+import contextvars
+import os
+import time
+from typing import Any, Callable, Dict, Optional
+
+from pymongo.read_preferences import Primary, SecondaryPreferred
+
+PRIMARY, SECONDARY = "primary", "secondary"
+# Mongo rejects maxStalenessSeconds below 90
+MAX_STALENESS_SECONDS = max(int(os.environ.get("DMM_READ_MAX_STALENESS_SECONDS", "90")), 90)
+# Application-level bound: above this observed lag, secondary routes fall back to the primary
+MAX_LAG_SECONDS = float(os.environ.get("DMM_READ_MAX_LAG_SECONDS", "10"))
+LAG_CHECK_SECONDS = float(os.environ.get("DMM_READ_LAG_CHECK_SECONDS", "10"))
+CONSISTENCY_HEADER = "x-read-consistency"  # "strong" forces the primary
+
+DEFAULT_ROUTES: Dict[str, str] = {
+    "marketing_list": SECONDARY,
+    "marketing_hashtags": SECONDARY,
+    "marketing_history": SECONDARY,
+    "list_strategies": SECONDARY,
+    "ai_tier_stats": SECONDARY,
+    "publish_outbox": SECONDARY,
+    "marketing_activity": SECONDARY,
+    "experiments_dashboard": SECONDARY,
+    "campaign_overlap": SECONDARY,
+}
+
+
+def _routes_from_env() -> Dict[str, str]:
+    # DMM_READ_ROUTES="marketing_list=primary,list_strategies=secondary"
+    routes = dict(DEFAULT_ROUTES)
+    for pair in os.environ.get("DMM_READ_ROUTES", "").split(","):
+        if "=" in pair:
+            name, mode = (p.strip() for p in pair.split("=", 1))
+            if mode in (PRIMARY, SECONDARY):
+                routes[name] = mode
+    return routes
+
+
+class ReadRouter:
+    def __init__(
+        self,
+        get_client: Callable[[], Any],
+        db_name: str,
+        last_write: Optional[Callable[[str], Optional[float]]] = None,
+        routes: Optional[Dict[str, str]] = None,
+    ):
+        self.get_client = get_client
+        self.db_name = db_name
+        self.last_write = last_write or (lambda name: None)
+        self.routes = routes if routes is not None else _routes_from_env()
+        self._handles: Dict[str, Any] = {}
+        self.lag_seconds: Optional[float] = None  # None = unknown / no replica set
+        self.lag_checked = 0.0
+        self.lag_error = ""
+        self._probe: Optional[asyncio.Task] = None
+        self.counts: Dict[str, int] = {PRIMARY: 0, SECONDARY: 0, "fallback": 0}
+
+    def _db(self, mode: str):
+        if mode not in self._handles:
+            pref = Primary() if mode == PRIMARY else SecondaryPreferred(max_staleness=MAX_STALENESS_SECONDS)
+            self._handles[mode] = self.get_client().get_database(self.db_name, read_preference=pref)
+        return self._handles[mode]
+
+    def _maybe_probe(self):
+        if time.monotonic() - self.lag_checked < LAG_CHECK_SECONDS or (self._probe and not self._probe.done()):
+            return
+        self.lag_checked = time.monotonic()
+        # Fresh context: the probe is spawned by a request and must not inherit its deadline/pymongo timeout
+        self._probe = asyncio.get_running_loop().create_task(self._check_lag(), context=contextvars.Context())
+
+    async def _check_lag(self):
+        try:
+            status = await self.get_client().admin.command("replSetGetStatus")
+        except Exception as e:
+            # Standalone server or no clusterMonitor role: secondaries can't be vetted
+            self.lag_seconds, self.lag_error = None, f"{type(e).__name__}: {e}"[:200]
+            return
+        members = status.get("members", [])
+        primary = next((m for m in members if m.get("stateStr") == "PRIMARY"), None)
+        secondaries = [m for m in members if m.get("stateStr") == "SECONDARY"]
+        if primary is None or not secondaries:
+            self.lag_seconds, self.lag_error = None, "no primary/secondary members"
+            return
+        lags = [(primary["optimeDate"] - m["optimeDate"]).total_seconds() for m in secondaries]
+        # Any eligible secondary may serve a read, so the slowest one bounds staleness
+        self.lag_seconds, self.lag_error = max(max(lags), 0.0), ""
+
+    def mode_for(self, route: str, collections: tuple = (), consistency: Optional[str] = None) -> str:
+        if self.routes.get(route, PRIMARY) != SECONDARY or (consistency or "").lower() == "strong":
+            return PRIMARY
+        self._maybe_probe()
+        if self.lag_seconds is None or self.lag_seconds > MAX_LAG_SECONDS:
+            self.counts["fallback"] += 1
+            return PRIMARY
+        # Read-your-writes: a collection written within the lag window may not have replicated yet
+        if self._recent_write(collections):
+            self.counts["fallback"] += 1
+            return PRIMARY
+        return SECONDARY
+
+    def _recent_write(self, collections: tuple) -> bool:
+        window = (self.lag_seconds or 0.0) + 1.0
+        return any((since := self.last_write(name)) is not None and since < window for name in collections)
+
+    def has_writes(self, db, collections: tuple) -> bool:
+        """Whether a handle returned by db() has every write the collections' stamps record, i.e. whether
+        a body read from it may be served under an ETag derived from those stamps"""
+        if db is self._handles.get(PRIMARY):
+            return True
+        return self.lag_seconds is not None and not self._recent_write(collections)
+
+    def db(self, route: str, collections: tuple = (), consistency: Optional[str] = None):
+        mode = self.mode_for(route, collections, consistency)
+        self.counts[mode] += 1
+        return self._db(mode)
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "routes": self.routes,
+            "max_staleness_s": MAX_STALENESS_SECONDS,
+            "max_lag_s": MAX_LAG_SECONDS,
+            "lag_s": self.lag_seconds,
+            "lag_error": self.lag_error or None,
+            "reads": dict(self.counts),
+        }
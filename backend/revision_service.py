@@ -0,0 +1,159 @@
+"""
+Revision history for marketing items.
+Every change is stored as a JSON-patch (RFC 6902 add/remove/replace) against the
+previous version, with a full checkpoint every few versions so "state as of N"
+replays at most CHECKPOINT_EVERY - 1 patches.
+"""
+
+import copy
+import os
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+from timestamp_service import now_utc
+
+COLLECTION = "marketing_revisions"
+CHECKPOINT_EVERY = int(os.environ.get("DMM_REVISION_CHECKPOINT_EVERY", "10"))
+# Bookkeeping fields that never enter a diff
+IGNORED_FIELDS = ("_id", "version")
+
+
+async def ensure_indexes(db):
+    await db[COLLECTION].create_index([("item_type", 1), ("item_id", 1), ("version", -1)], unique=True)
+
+
+# ----------------------
+# JSON patch
+# ----------------------
+def _escape(token: str) -> str:
+    return token.replace("~", "~0").replace("/", "~1")
+
+
+def _tokens(path: str) -> List[str]:
+    return [t.replace("~1", "/").replace("~0", "~") for t in path.split("/")[1:]] if path else []
+
+
+def make_patch(old: Any, new: Any, path: str = "") -> List[Dict[str, Any]]:
+    """Minimal add/remove/replace ops turning old into new (dicts recurse, lists are replaced whole)"""
+    if isinstance(old, dict) and isinstance(new, dict):
+        ops: List[Dict[str, Any]] = []
+        for key in old:
+            if key not in new:
+                ops.append({"op": "remove", "path": f"{path}/{_escape(str(key))}"})
+        for key, value in new.items():
+            child = f"{path}/{_escape(str(key))}"
+            if key not in old:
+                ops.append({"op": "add", "path": child, "value": value})
+            elif old[key] != value:
+                ops.extend(make_patch(old[key], value, child))
+        return ops
+    if old != new:
+        return [{"op": "replace", "path": path, "value": new}]
+    return []
+
+
+def apply_patch(doc: Any, ops: List[Dict[str, Any]]) -> Any:
+    doc = copy.deepcopy(doc)
+    for op in ops:
+        tokens = _tokens(op["path"])
+        if not tokens:
+            doc = copy.deepcopy(op.get("value"))
+            continue
+        parent = doc
+        for t in tokens[:-1]:
+            parent = parent[int(t)] if isinstance(parent, list) else parent[t]
+        last = tokens[-1]
+        if isinstance(parent, list):
+            idx = len(parent) if last == "-" else int(last)
+            if op["op"] == "remove":
+                parent.pop(idx)
+            elif op["op"] == "add":
+                parent.insert(idx, copy.deepcopy(op["value"]))
+            else:
+                parent[idx] = copy.deepcopy(op["value"])
+        elif op["op"] == "remove":
+            parent.pop(last, None)
+        else:
+            parent[last] = copy.deepcopy(op["value"])
+    return doc
+
+
+def _clean(doc: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    return {k: v for k, v in (doc or {}).items() if k not in IGNORED_FIELDS}
+
+
+# ----------------------
+# Revisions
+# ----------------------
+async def state_as_of(db, item_type: str, item_id: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """Item state at `version` (latest when None): nearest checkpoint + the patches after it"""
+    coll = db[COLLECTION]
+    key = {"item_type": item_type, "item_id": item_id}
+    cp_query: Dict[str, Any] = {**key, "checkpoint": {"$exists": True}}
+    if version is not None:
+        cp_query["version"] = {"$lte": version}
+    cp = await coll.find_one(cp_query, {"_id": 0, "version": 1, "checkpoint": 1}, sort=[("version", -1)])
+    if cp is None:
+        return None
+    patch_query: Dict[str, Any] = {**key, "version": {"$gt": cp["version"]}}
+    if version is not None:
+        patch_query["version"]["$lte"] = version
+    rows = await coll.find(patch_query, {"_id": 0, "version": 1, "patch": 1}).sort("version", 1).to_list(length=None)
+    state = cp["checkpoint"]
+    for r in rows:
+        state = apply_patch(state, r["patch"])
+    state["version"] = rows[-1]["version"] if rows else cp["version"]
+    return state
+
+
+async def record(
+    db,
+    item_type: str,
+    item_id: str,
+    before: Optional[Dict[str, Any]],
+    after: Dict[str, Any],
+    actor: str = "system",
+    reason: str = "",
+) -> int:
+    """Append a revision for before -> after; returns the item's current version"""
+    coll = db[COLLECTION]
+    key = {"item_type": item_type, "item_id": item_id}
+    target = _clean(after)
+    for _ in range(5):
+        last = await coll.find_one(key, {"_id": 0, "version": 1}, sort=[("version", -1)])
+        if last is None:
+            # First tracked change: anchor the history with the pre-change state
+            baseline = _clean(before) if before is not None else target
+            row = {**key, "version": 1, "patch": [], "checkpoint": baseline, "actor": actor,
+                   "reason": "created" if before is None else "baseline", "created_at": now_utc()}
+            try:
+                await coll.insert_one(row)
+            except DuplicateKeyError:
+                continue
+            if before is None:
+                return 1
+            continue
+        version = last["version"] + 1
+        base = _clean(await state_as_of(db, item_type, item_id, last["version"]))
+        patch = make_patch(base, target)
+        if not patch:
+            return last["version"]
+        row = {**key, "version": version, "patch": patch, "actor": actor, "reason": reason, "created_at": now_utc()}
+        if version % CHECKPOINT_EVERY == 0:
+            row["checkpoint"] = target
+        try:
+            await coll.insert_one(row)
+            return version
+        except DuplicateKeyError:
+            continue  # concurrent writer took this version; diff against theirs
+    raise RuntimeError(f"could not record revision for {item_type}/{item_id}")
+
+
+async def history(db, item_type: str, item_id: str, limit: int = 50) -> List[Dict[str, Any]]:
+    rows = await db[COLLECTION].find(
+        {"item_type": item_type, "item_id": item_id}, {"_id": 0, "checkpoint": 0}
+    ).sort("version", -1).to_list(length=limit)
+    for r in rows:
+        r["changed_paths"] = [op["path"] for op in r["patch"]]
+    return rows
@@ -1,17 +1,72 @@
+import asyncio
+import base64
+import json
 import os
+import re
+import time
 import uuid
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any, List
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, List, Tuple
 from dotenv import load_dotenv
 
-from fastapi import FastAPI, HTTPException, Depends
+from fastapi import FastAPI, HTTPException, Depends, File, Header, Request, Response, UploadFile
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import FileResponse, StreamingResponse
 from pydantic import BaseModel, Field
 from jose import jwt, JWTError
 from motor.motor_asyncio import AsyncIOMotorClient
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import httpx
 
+from audience_service import get_index as get_audience_index
+from budget_service import allocate as allocate_budget, allocation_summary
+from canva_service import MAX_BATCH as CANVA_MAX_BATCH, CanvaBatchRenderer, MockCanvaBackend
+from circuit_breaker_service import breakers
+from deadline_service import DeadlineExceeded, DeadlineMiddleware, budget as deadline_budget
+from dedup_service import ContentDeduplicator, DEDUP_ITEM_TYPES, brief_text, fingerprint
+from embedding_service import EmbeddingIndex, item_text
+from etag_service import VersionStamps, etag_matches
+from experiment_service import (
+    EXPERIMENTS_COLLECTION,
+    MAX_VARIANTS as EXPERIMENT_MAX_VARIANTS,
+    METRICS as EXPERIMENT_METRICS,
+    ResultCache as ExperimentResultCache,
+    ensure_indexes as ensure_experiment_indexes,
+    ingest as ingest_experiment_rows,
+    new_experiment,
+    normalize_row as normalize_experiment_row,
+    parse_csv as parse_experiment_csv,
+)
+from festival_service import FestivalPregenerator, load_calendar, local_today, upcoming as upcoming_festivals
+from fanout_service import pairs as fanout_pairs, stream_fanout
+from hedging_service import hedger
+from idempotency_service import IdempotencyMiddleware, ensure_indexes as ensure_idempotency_indexes
+from image_service import VARIANTS as IMAGE_VARIANTS, etag as image_etag, image_derivatives, variant_path
+from llm_pool_service import pools as llm_pools
+from media_cache_service import KINDS as VIDEO_KINDS, RangeFileResponse, video_cache
+from overlap_service import ALERT_SHARE as OVERLAP_ALERT_SHARE, OverlapEngine
+from parsing_service import parse_sections
+from prompt_service import RenderedPrompt, registry as prompts, targeting_summary
+from publishing_service import MetaGraphClient, MockGraphAPI, Publisher, due_time as publish_due_time
+from read_routing_service import CONSISTENCY_HEADER, ReadRouter
+from revision_service import (
+    ensure_indexes as ensure_revision_indexes,
+    history as revision_history,
+    record as record_revision,
+    state_as_of,
+)
+from simulation_service import DEFAULT_TRIALS, campaign_spend, simulate as simulate_campaign
+from tiering_service import (
+    TIERS,
+    TierRoute,
+    ensure_tier_log_indexes,
+    record as record_tier,
+    route as route_tier,
+    score as score_complexity,
+    tier_stats,
+)
+from timestamp_service import BUCKET_FORMATS, bucket_counts, ensure_ttl, now_utc
+
 # Load environment variables
 load_dotenv()
 
@@ -30,15 +85,10 @@ LUMA_API_KEY = os.environ.get("LUMA_API_KEY")
 LUMA_API_URL = os.environ.get("LUMA_API_URL", "https://api.aimlapi.com/v2")
 SERP_API_KEY = os.environ.get("SERP_API_KEY")
 YT_API_KEY = os.environ.get("YOUTUBE_DATA_API_KEY") or os.environ.get("YT_API_KEY")
+# Approval log archival: Mongo's TTL monitor drops entries older than this (0 keeps them forever)
+APPROVALS_TTL_DAYS = float(os.environ.get("DMM_APPROVALS_TTL_DAYS", "0"))
 
 app = FastAPI(title="DMM Backend", version="0.2.0")
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=CORS_ORIGINS,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
 
 mongo_client: Optional[AsyncIOMotorClient] = None
 
@@ -46,12 +96,78 @@ mongo_client: Optional[AsyncIOMotorClient] = None
 def now_iso() -> str:
     return datetime.now(timezone.utc).isoformat()
 
+
+def json_default(value: Any) -> Any:
+    # created_at/updated_at are BSON datetimes; emit the same ISO form FastAPI responses use
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
 # Mongo helpers
-async def get_db():
+def get_mongo_client() -> AsyncIOMotorClient:
     global mongo_client
     if mongo_client is None:
-        mongo_client = AsyncIOMotorClient(MONGO_URL)
-    return mongo_client[DB_NAME]
+        # tz_aware: stored UTC datetimes come back with an offset, so clients never read them as local time
+        mongo_client = AsyncIOMotorClient(MONGO_URL, tz_aware=True)
+    return mongo_client
+
+
+async def get_db():
+    return get_mongo_client()[DB_NAME]
+
+
+# Per-collection version stamps behind the ETags on list/detail GETs; bump after every write
+stamps = VersionStamps(get_db)
+
+# Read-heavy routes may read from secondaries (bounded staleness, lag-aware); everything else uses get_db
+read_router = ReadRouter(get_mongo_client, DB_NAME, last_write=stamps.since_write)
+
+MARKETING_COLLECTIONS = {
+    "campaign": "marketing_campaigns",
+    "reel": "marketing_reels",
+    "ugc": "marketing_ugc",
+    "brand": "marketing_brand_assets",
+    "influencer": "marketing_influencers",
+    "approvals": "marketing_approvals",
+    "strategy": "marketing_strategies",
+}
+
+# Network-free semantic index for "closest past strategy/content" lookups and LLM-free reuse
+embedding_index = EmbeddingIndex(
+    get_db, {t: MARKETING_COLLECTIONS[t] for t in ("strategy", "reel", "ugc", "brand", "influencer")}
+)
+
+
+# Pairwise audience overlap between campaigns; compiled bitmaps and pair counts cached by targeting hash
+overlap_engine = OverlapEngine(get_audience_index)
+# Campaigns that can still spend: the overlap report ignores anything rejected or finished
+ACTIVE_CAMPAIGN_STATUSES = ("Optimized", "Pending Approval", "Approved")
+
+
+def read_db(route: str, *collections: str):
+    """Dependency: DB handle routed per DMM_READ_ROUTES; ?type= adds that marketing collection to the
+    read-your-writes check and X-Read-Consistency: strong pins the primary"""
+    async def dependency(request: Request):
+        names = collections
+        item_type = request.query_params.get("type")
+        if item_type in MARKETING_COLLECTIONS:
+            names = names + (MARKETING_COLLECTIONS[item_type],)
+        return read_router.db(route, names, request.headers.get(CONSISTENCY_HEADER))
+    return dependency
+
+
+# Honour Idempotency-Key on every POST (responses replayed from Mongo on retry)
+app.add_middleware(IdempotencyMiddleware, get_db=get_db)
+# Every request gets a deadline that bounds Mongo, LLM and httpx calls (504 when exhausted)
+app.add_middleware(DeadlineMiddleware)
+# Outermost (added last), so the 504/409/422 answers built by the middlewares above carry CORS headers too
+app.add_middleware(
+    CORSMiddleware,
+    allow_origins=CORS_ORIGINS,
+    allow_credentials=True,
+    allow_methods=["*"],
+    allow_headers=["*"],
+)
 
 # Create helpful indexes for performance
 async def ensure_indexes():
@@ -65,6 +181,19 @@ async def ensure_indexes():
         await db["marketing_strategies"].create_index([("created_at", -1)])
         await db["marketing_approvals"].create_index([("item_id", 1)])
         await db["marketing_approvals"].create_index([("created_at", -1)])
+        if APPROVALS_TTL_DAYS > 0:
+            await ensure_ttl(db["marketing_approvals"], "created_at", int(APPROVALS_TTL_DAYS * 86400))
+        await ContentDeduplicator(db).ensure_indexes()
+        await ensure_idempotency_indexes(db)
+        await ensure_revision_indexes(db)
+        await publisher.ensure_indexes(db)
+        await canva_renderer.ensure_indexes(db)
+        await festival_pregenerator.ensure_indexes(db)
+        await ensure_experiment_indexes(db)
+        await ensure_tier_log_indexes(db)
+        await db["marketing_strategies"].create_index([("parse_status", 1)])
+        for name in ("marketing_reels", "marketing_ugc"):
+            await db[name].create_index([("sections.hashtags", 1)])
     except Exception:
         # Index creation problems should not block app start
         pass
@@ -73,6 +202,27 @@ async def ensure_indexes():
 @app.on_event("startup")
 async def on_startup():
     await ensure_indexes()
+    # Build the audience bitmap index off the event loop
+    await asyncio.get_running_loop().run_in_executor(None, get_audience_index)
+    warm_llm_pools()
+    try:
+        # Batches left "running" by a previous process would otherwise never finish
+        await canva_renderer.fail_stale(await get_db())
+    except Exception:
+        pass
+    await embedding_index.start()
+    if PUBLISHER_ENABLED:
+        publisher.start()
+    if FESTIVAL_PREGEN_ENABLED:
+        festival_pregenerator.start()
+
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    image_derivatives.shutdown()
+    await publisher.stop()
+    await festival_pregenerator.stop()
+    await embedding_index.flush()
 
 
 # ----------------------
@@ -145,6 +295,7 @@ class StrategyRequest(BaseModel):
     budget: Optional[str] = None
     goals: List[str] = Field(default_factory=list)
     website_url: Optional[str] = None
+    reuse_similar: bool = False  # serve a close past strategy of this company and industry instead of calling the LLM
 
 
 class ContentRequest(BaseModel):
@@ -154,6 +305,17 @@ class ContentRequest(BaseModel):
     platform: str
     budget: Optional[str] = None
     festival: Optional[str] = None
+    industry: Optional[str] = None  # picks the pre-generated festival ideas for this industry
+    reuse_similar: bool = False  # return a near-identical past generation instead of calling the LLM
+    # Opt-in: pre-generated festival ideas are generic for the industry and ignore brief/target_audience
+    use_festival_cache: bool = False
+
+
+class ChannelCurve(BaseModel):
+    cpc: Optional[float] = None
+    cpm: Optional[float] = None
+    max_daily_clicks: Optional[float] = None  # saturation level
+    cvr: Optional[float] = None
 
 
 class CampaignRequest(BaseModel):
@@ -164,6 +326,12 @@ class CampaignRequest(BaseModel):
     channels: List[str]
     duration_days: int
     targeting: Optional[TargetingFilters] = None
+    response_curves: Optional[Dict[str, ChannelCurve]] = None  # per-channel overrides
+
+
+def campaign_budget_plan(request: CampaignRequest) -> Dict[str, Any]:
+    overrides = {k: v.dict(exclude_none=True) for k, v in (request.response_curves or {}).items()}
+    return allocate_budget(request.channels, request.budget, request.duration_days, overrides)
 
 
 # JWT SSO consume
@@ -171,146 +339,223 @@ class SSOConsumeRequest(BaseModel):
     token: str
 
 
+FIELD_NAME_RE = re.compile(r"^[A-Za-z0-9_]+(\.[A-Za-z0-9_]+)*$")
+
+
+def not_modified(tag: str) -> Response:
+    return Response(status_code=304, headers={"ETag": tag, "Cache-Control": "no-cache"})
+
+
+def set_etag(response: Response, tag: str):
+    # no-cache: browsers keep the body but revalidate (If-None-Match) on every load
+    response.headers["ETag"] = tag
+    response.headers["Cache-Control"] = "no-cache"
+
+
+def set_read_etag(response: Response, tag: str, db, collections: List[str]):
+    # The tag comes from stamps bumped on the primary; a secondary body that predates them must not carry it,
+    # or clients would revalidate against stale data until the next write
+    if read_router.has_writes(db, tuple(collections)):
+        set_etag(response, tag)
+
+
+def fields_projection(fields: Optional[str]) -> Dict[str, int]:
+    """Mongo projection for a comma-separated ?fields= list (e.g. "company_name,sections.kpis")"""
+    if not fields:
+        return {"_id": 0}
+    names = [f.strip() for f in fields.split(",") if f.strip()]
+    bad = [f for f in names if not FIELD_NAME_RE.match(f)]
+    if bad:
+        raise HTTPException(status_code=400, detail=f"Invalid fields: {', '.join(bad)}")
+    return {"_id": 0, "id": 1, **{f: 1 for f in names}}
+
+
 async def collections_map(db):
-    return {
-        "campaign": db["marketing_campaigns"],
-        "reel": db["marketing_reels"],
-        "ugc": db["marketing_ugc"],
-        "brand": db["marketing_brand_assets"],
-        "influencer": db["marketing_influencers"],
-        "approvals": db["marketing_approvals"],
-        "strategy": db["marketing_strategies"],
-    }
+    return {key: db[name] for key, name in MARKETING_COLLECTIONS.items()}
 
 
 # ----------------------
 # AI Orchestration Helpers (Text)
 # ----------------------
-async def get_ai_chat():
-    """Initialize AI chat with GPT-5 beta"""
+DMM_MODEL = "gpt-5"
+LLM_PROVIDER = "openai"
+LLM_TIMEOUT_SECONDS = float(os.environ.get("DMM_LLM_TIMEOUT_SECONDS", "60"))
+
+
+DMM_SYSTEM_MESSAGE = (
+    "You are an expert Digital Marketing Manager AI. You specialize in creating comprehensive "
+    "marketing strategies, content creation, and campaign optimization. Always provide detailed, "
+    "actionable insights."
+)
+
+
+def new_ai_chat(model: str = DMM_MODEL, system_message: str = DMM_SYSTEM_MESSAGE):
+    """Initialize AI chat with GPT-5 beta (pool factory; use llm_pools.checkout per request)"""
     chat = LlmChat(
         api_key=EMERGENT_LLM_KEY,
         session_id=f"dmm-{str(uuid.uuid4())[:8]}",
-        system_message=(
-            "You are an expert Digital Marketing Manager AI. You specialize in creating comprehensive "
-            "marketing strategies, content creation, and campaign optimization. Always provide detailed, "
-            "actionable insights."
-        ),
-    ).with_model("openai", "gpt-5")
+        system_message=system_message,
+    ).with_model(LLM_PROVIDER, model)
     return chat
 
 
-async def generate_marketing_strategy(request: StrategyRequest):
-    """Generate comprehensive marketing strategy using GPT-5 beta"""
-    chat = await get_ai_chat()
-
-    prompt = f"""
-    Create a comprehensive digital marketing strategy for:
-    Company: {request.company_name}
-    Industry: {request.industry}
-    Target Audience: {request.target_audience}
-    Budget: {request.budget or 'Not specified'}
-    Goals: {', '.join(request.goals) if request.goals else 'General growth'}
-    Website: {request.website_url or 'Not provided'}
-
-    Please provide:
-    1. Market Analysis & Positioning
-    2. Content Strategy (types, frequency, platforms)
-    3. Channel Mix Recommendations
-    4. Budget Allocation Suggestions
-    5. KPI & Success Metrics
-    6. Timeline & Milestones
-    7. Potential Challenges & Solutions
-
-    Format as detailed JSON with clear sections.
-    """
+def warm_llm_pools():
+    models = {DMM_MODEL} | {cfg["model"] for cfg in TIERS.values()}
+    llm_pools.warmup([(m, DMM_SYSTEM_MESSAGE, lambda m=m: new_ai_chat(m)) for m in sorted(models)])
 
-    user_message = UserMessage(text=prompt)
-    response = await chat.send_message(user_message)
-    return response
 
+async def call_llm(rendered: RenderedPrompt, timeout: float = LLM_TIMEOUT_SECONDS) -> str:
+    """Single LLM attempt through the provider/model circuit breaker.
 
-async def generate_content_ideas(request: ContentRequest):
-    """Generate content ideas using GPT-5 beta"""
-    chat = await get_ai_chat()
-
-    prompt = f"""
-    Generate creative content ideas for:
-    Content Type: {request.content_type}
-    Brief: {request.brief}
-    Target Audience: {request.target_audience}
-    Platform: {request.platform}
-    Budget: {request.budget or 'Flexible'}
-    Festival/Theme: {request.festival or 'None'}
-
-    Please provide:
-    1. 5 creative concepts with detailed descriptions
-    2. Visual style recommendations
-    3. Messaging & tone suggestions
-    4. Hashtag recommendations
-    5. Estimated production costs
-    6. Performance predictions
-
-    Format as detailed JSON with clear structure.
+    While the breaker is open this raises CircuitOpenError immediately and
+    callers take their fallback path. The chat client is checked out of the
+    warm pool for this model and returned afterwards. The attempt is also cut
+    short by the request deadline, which the breaker does not count as a failure.
     """
+    limit = deadline_budget(timeout)
+
+    async def call():
+        async with llm_pools.checkout(rendered.model, DMM_SYSTEM_MESSAGE, lambda: new_ai_chat(rendered.model)) as chat:
+            return await asyncio.wait_for(chat.send_message(UserMessage(text=rendered.text)), timeout=timeout)
+
+    try:
+        return await asyncio.wait_for(breakers.get(LLM_PROVIDER, rendered.model).call(call), timeout=limit)
+    except asyncio.TimeoutError:
+        if limit < timeout:
+            raise DeadlineExceeded()
+        raise
 
-    user_message = UserMessage(text=prompt)
-    response = await chat.send_message(user_message)
-    return response
 
+async def send_prompt(template: str, values: Dict[str, Any], route: TierRoute) -> Tuple[str, Dict[str, Any]]:
+    """Render and send a registered prompt on the routed tier; returns (response, token usage).
 
-async def optimize_campaign(request: CampaignRequest):
-    """Optimize campaign strategy using GPT-5 beta"""
-    chat = await get_ai_chat()
-
-    # Build targeting summary for the prompt
-    t = request.targeting
-
-    def list_or_none(v):
-        return ", ".join(v) if v else "None"
-
-    targeting_summary = (
-        f"Age: {t.age_min or '-'}-{t.age_max or '-'}, "
-        f"Gender: {list_or_none(t.gender) if t else 'None'}, "
-        f"Geo: country={getattr(t, 'country', None) or '-'}, states={list_or_none(getattr(t, 'states', None) or [])}, "
-        f"cities={list_or_none(getattr(t, 'cities', None) or [])}, areas={list_or_none(getattr(t, 'areas', None) or [])}, "
-        f"Interests: {list_or_none(getattr(t, 'interests', None) or [])}, Behaviors: {list_or_none(getattr(t, 'behaviors', None) or [])}, "
-        f"Devices: {list_or_none(getattr(t, 'devices', None) or [])}, Placements: {list_or_none(getattr(t, 'placements', None) or [])}, "
-        f"Schedule: {getattr(getattr(t, 'schedule', None) or TargetingSchedule(), 'start_date', None) or '-'} to "
-        f"{getattr(getattr(t, 'schedule', None) or TargetingSchedule(), 'end_date', None) or '-'}, Dayparts: {list_or_none(getattr(getattr(t, 'schedule', None) or TargetingSchedule(), 'dayparts', None) or [])}, "
-        f"B2B: industries={list_or_none(getattr(t, 'industries', None) or [])}, job_titles={list_or_none(getattr(t, 'job_titles', None) or [])}, company_sizes={list_or_none(getattr(t, 'company_sizes', None) or [])}"
-    ) if t else "None"
-
-    prompt = f"""
-    Optimize this marketing campaign:
-    Campaign: {request.campaign_name}
-    Objective: {request.objective}
-    Target Audience: {request.target_audience}
-    Budget: ${request.budget}
-    Channels: {', '.join(request.channels)}
-    Duration: {request.duration_days} days
-    Targeting: {targeting_summary}
-
-    Please provide:
-    1. Channel-specific budget allocation
-    2. Timeline optimization
-    3. Creative requirements per channel
-    4. Targeting parameters (confirm/refine provided targeting)
-    5. Expected ROI & KPIs
-    6. Risk assessment & mitigation
-    7. A/B testing recommendations
-
-    Format as detailed JSON with clear sections.
+    Endpoints with a hedge policy fire a second request (optionally to a cheaper
+    model) once the primary outlives the endpoint's observed p90. Every call's
+    tier outcome is logged for threshold tuning.
     """
+    rendered = prompts.render(template, route.model, **values)
+    policy = hedger.policy(template)
+    started = time.monotonic()
+    try:
+        if policy is None:
+            response = await call_llm(rendered, route.timeout)
+            hedger.record(template, time.monotonic() - started)
+            usage = rendered.usage(response)
+        else:
+            hedge_rendered = prompts.render(template, policy.model or route.model, **values)
+            response, winner = await hedger.run(
+                template, lambda: call_llm(rendered, route.timeout), lambda: call_llm(hedge_rendered, route.timeout)
+            )
+            used = hedge_rendered if winner == "hedge" else rendered
+            usage = {**used.usage(response), "hedge_winner": winner}
+    except Exception as e:
+        await log_tier_outcome(route, time.monotonic() - started, False, error=f"{type(e).__name__}: {e}")
+        raise
+    usage.update({"tier": route.tier, "complexity_score": route.score})
+    await log_tier_outcome(route, time.monotonic() - started, True, usage)
+    return response, usage
+
+
+async def log_tier_outcome(route: TierRoute, latency: float, ok: bool, usage: Optional[Dict[str, Any]] = None, error: str = ""):
+    try:
+        await record_tier(await get_db(), route, latency, ok, usage, error)
+    except Exception:
+        # Metrics must never break generation
+        pass
 
-    user_message = UserMessage(text=prompt)
-    response = await chat.send_message(user_message)
-    return response
+
+def tier_for(template: str, text_parts: List[str], list_items: int, targeting: Optional[Dict[str, Any]] = None) -> TierRoute:
+    return route_tier(template, score_complexity(text_parts, list_items, targeting), DMM_MODEL, LLM_TIMEOUT_SECONDS)
+
+
+async def generate_marketing_strategy(request: StrategyRequest):
+    """Generate comprehensive marketing strategy using GPT-5 beta"""
+    route = tier_for("strategy", [request.target_audience, request.industry, *request.goals], len(request.goals))
+    return await send_prompt("strategy", {
+        "company_name": request.company_name,
+        "industry": request.industry,
+        "target_audience": request.target_audience,
+        "budget": request.budget or "Not specified",
+        "goals": ", ".join(request.goals) if request.goals else "General growth",
+        "website_url": request.website_url or "Not provided",
+    }, route)
+
+
+async def generate_content_ideas(request: ContentRequest):
+    """Generate content ideas using GPT-5 beta"""
+    route = tier_for("content", [request.brief, request.target_audience], 1 if request.festival else 0)
+    return await send_prompt("content", {
+        "content_type": request.content_type,
+        "brief": request.brief,
+        "target_audience": request.target_audience,
+        "platform": request.platform,
+        "budget": request.budget or "Flexible",
+        "festival": request.festival or "None",
+    }, route)
+
+
+async def optimize_campaign(request: CampaignRequest, budget_plan: Dict[str, Any]):
+    """Optimize campaign strategy using GPT-5 beta"""
+    targeting = request.targeting.dict(exclude_none=True) if request.targeting else None
+    route = tier_for("campaign", [request.objective, request.target_audience], len(request.channels), targeting)
+    return await send_prompt("campaign", {
+        "campaign_name": request.campaign_name,
+        "objective": request.objective,
+        "target_audience": request.target_audience,
+        "budget": request.budget,
+        "channels": ", ".join(request.channels),
+        "duration_days": request.duration_days,
+        "targeting": targeting_summary(targeting),
+        "allocation": allocation_summary(budget_plan),
+    }, route)
 
 
 @app.get("/api/health")
 async def health():
-    return {"status": "ok", "service": "dmm-backend", "time": now_iso()}
+    return {
+        "status": "ok",
+        "service": "dmm-backend",
+        "time": now_iso(),
+        "llm_breakers": breakers.snapshot(),
+        "llm_pool": llm_pools.snapshot(),
+        "read_routing": read_router.snapshot(),
+        "embedding_index": embedding_index.snapshot(),
+    }
+
+
+@app.get("/api/ai/similar")
+async def ai_similar(
+    type: str,
+    q: Optional[str] = None,
+    industry: Optional[str] = None,
+    target_audience: Optional[str] = None,
+    platform: Optional[str] = None,
+    k: int = 5,
+    min_score: float = 0.0,
+):
+    """Closest past strategies/content by local embedding (industry/platform narrow the scope)"""
+    if type not in embedding_index.collections:
+        raise HTTPException(status_code=400, detail=f"type must be one of {', '.join(embedding_index.collections)}")
+    fields = {"industry": industry, "target_audience": target_audience, "platform": platform, "brief": q}
+    text = " ".join(filter(None, [item_text(type, fields), q if type == "strategy" else None]))
+    if not text:
+        raise HTTPException(status_code=400, detail="Provide q, industry, target_audience or platform")
+    started = time.perf_counter()
+    scope = industry if type == "strategy" else platform
+    results = embedding_index.search(type, text, max(1, min(k, 50)), scope=scope, min_score=min_score)
+    return {"success": True, "results": results, "took_ms": round((time.perf_counter() - started) * 1000, 3)}
+
+
+@app.get("/api/ai/hedging")
+async def ai_hedging_stats():
+    """Hedge policy, per-endpoint p90 and hedge win rates"""
+    return {"success": True, **hedger.snapshot()}
+
+
+@app.get("/api/ai/tiers")
+async def ai_tier_stats(since_hours: float = 168, db=Depends(read_db("ai_tier_stats", "llm_tier_log"))):
+    """Per-template, per-tier call counts, success rate and latency (for tuning DMM_TIER_THRESHOLDS)"""
+    return {"success": True, "tiers": await tier_stats(db, since_hours * 3600)}
 
 
 @app.get("/api/debug/env")
@@ -344,24 +589,93 @@ async def marketing_save(body: SaveRequest, db=Depends(get_db)):
     doc.setdefault("status", "Pending Approval")
     if body.default_filters:
         doc["approval_filters"] = body.default_filters.dict(exclude_none=True)
-    doc["created_at"], doc["updated_at"] = now_iso(), now_iso()
+    doc["created_at"] = doc["updated_at"] = now_utc()
+    dedup_fp = None
+    if body.item_type in DEDUP_ITEM_TYPES:
+        fields, dedup_fp = await ContentDeduplicator(db).check(doc, body.item_type)
+        doc.update(fields)
     await cmap[body.item_type].insert_one(doc)
     doc.pop("_id", None)
+    if dedup_fp is not None:
+        await ContentDeduplicator(db).index(doc["id"], body.item_type, dedup_fp)
+    doc["version"] = await record_revision(db, body.item_type, doc["id"], None, doc, reason="created")
+    await cmap[body.item_type].update_one({"id": doc["id"]}, {"$set": {"version": doc["version"]}})
+    await stamps.bump(cmap[body.item_type].name, "marketing_revisions")
+    embedding_index.add(body.item_type, doc)
     return {"success": True, "item": doc}
 
 
 @app.get("/api/marketing/list")
-async def marketing_list(type: str, status: Optional[str] = None, db=Depends(get_db)):
+async def marketing_list(
+    type: str,
+    response: Response,
+    status: Optional[str] = None,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(read_db("marketing_list")),
+):
     cmap = await collections_map(db)
     if type not in cmap:
         raise HTTPException(status_code=400, detail="Invalid type")
+    tag = await stamps.etag([cmap[type].name], "list", type, status, fields)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
     q: Dict[str, Any] = {}
     if status:
         q["status"] = status
-    items = await cmap[type].find(q, {"_id": 0}).to_list(length=500)
+    items = await cmap[type].find(q, fields_projection(fields)).to_list(length=500)
+    set_read_etag(response, tag, db, [cmap[type].name])
     return items
 
 
+@app.get("/api/marketing/item")
+async def marketing_item(type: str, id: str, response: Response, if_none_match: Optional[str] = Header(None), db=Depends(get_db)):
+    cmap = await collections_map(db)
+    if type not in cmap:
+        raise HTTPException(status_code=400, detail="Invalid type")
+    tag = await stamps.etag([cmap[type].name], "item", type, id)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+    item = await cmap[type].find_one({"id": id}, {"_id": 0})
+    if not item:
+        raise HTTPException(status_code=404, detail="Item not found")
+    set_etag(response, tag)
+    return item
+
+
+@app.get("/api/marketing/hashtags")
+async def marketing_hashtags(type: str, limit: int = 30, db=Depends(read_db("marketing_hashtags"))):
+    """Most used hashtags across parsed content docs"""
+    cmap = await collections_map(db)
+    if type not in CONTENT_COLLECTIONS:
+        raise HTTPException(status_code=400, detail="Invalid type")
+    pipeline = [
+        {"$match": {"sections.hashtags.0": {"$exists": True}}},
+        {"$unwind": "$sections.hashtags"},
+        {"$group": {"_id": {"$toLower": "$sections.hashtags"}, "count": {"$sum": 1}}},
+        {"$sort": {"count": -1}},
+        {"$limit": limit},
+    ]
+    rows = await cmap[type].aggregate(pipeline).to_list(length=limit)
+    return {"success": True, "hashtags": [{"tag": r["_id"], "count": r["count"]} for r in rows]}
+
+
+@app.get("/api/marketing/activity")
+async def marketing_activity(
+    type: str, days: int = 30, bucket: str = "day", db=Depends(read_db("marketing_activity"))
+):
+    """Items created per hour/day/week/month over the last `days` (UTC buckets)"""
+    cmap = await collections_map(db)
+    if type not in cmap:
+        raise HTTPException(status_code=400, detail="Invalid type")
+    if bucket not in BUCKET_FORMATS:
+        raise HTTPException(status_code=400, detail=f"bucket must be one of {', '.join(BUCKET_FORMATS)}")
+    end = now_utc()
+    start = end - timedelta(days=max(1, min(days, 366)))
+    rows = await bucket_counts(cmap[type], "created_at", start, end, bucket)
+    return {"success": True, "bucket": bucket, "since": start, "buckets": rows}
+
+
 @app.post("/api/marketing/approve")
 async def marketing_approve(body: ApproveRequest, db=Depends(get_db)):
     cmap = await collections_map(db)
@@ -369,27 +683,77 @@ async def marketing_approve(body: ApproveRequest, db=Depends(get_db)):
         raise HTTPException(status_code=400, detail="Invalid item_type")
     updates: Dict[str, Any] = {
         "status": body.status,
-        "updated_at": now_iso(),
+        "updated_at": now_utc(),
     }
     if body.filters:
         updates["approval_filters"] = body.filters.dict(exclude_none=True)
-    await cmap[body.item_type].update_one({"id": body.item_id}, {"$set": updates})
-    updated = await cmap[body.item_type].find_one({"id": body.item_id}, {"_id": 0})
-    if not updated:
+    before = await cmap[body.item_type].find_one_and_update(
+        {"id": body.item_id}, {"$set": updates}, projection={"_id": 0}
+    )
+    if not before:
         raise HTTPException(status_code=404, detail="Item not found")
+    updated = {**before, **updates}
+    updated["version"] = await record_revision(
+        db, body.item_type, body.item_id, before, updated, actor=body.approved_by, reason=f"status: {body.status}"
+    )
+    await cmap[body.item_type].update_one({"id": body.item_id}, {"$set": {"version": updated["version"]}})
     approval_log = {
         "id": str(uuid.uuid4()),
         "item_type": body.item_type,
         "item_id": body.item_id,
+        "version": updated["version"],
         "status": body.status,
         "filters": updates.get("approval_filters"),
         "approved_by": body.approved_by,
-        "created_at": now_iso(),
+        "created_at": now_utc(),
     }
     await (await collections_map(db))["approvals"].insert_one(approval_log)
+    await stamps.bump(cmap[body.item_type].name, cmap["approvals"].name, "marketing_revisions")
     return {"success": True, "item": updated}
 
 
+@app.get("/api/marketing/history")
+async def marketing_history(
+    type: str,
+    id: str,
+    response: Response,
+    limit: int = 50,
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(read_db("marketing_history", "marketing_revisions")),
+):
+    """Revisions of one item, newest first (JSON-patch per version)"""
+    if type not in await collections_map(db):
+        raise HTTPException(status_code=400, detail="Invalid type")
+    tag = await stamps.etag(["marketing_revisions"], "history", type, id, limit)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+    revisions = await revision_history(db, type, id, min(limit, 500))
+    set_read_etag(response, tag, db, ["marketing_revisions"])
+    return {"success": True, "revisions": revisions}
+
+
+@app.get("/api/marketing/as-of")
+async def marketing_as_of(type: str, id: str, version: Optional[int] = None, db=Depends(get_db)):
+    """Item state at a given version (latest tracked version when omitted)"""
+    if type not in await collections_map(db):
+        raise HTTPException(status_code=400, detail="Invalid type")
+    state = await state_as_of(db, type, id, version)
+    if state is None:
+        raise HTTPException(status_code=404, detail="No history for this item/version")
+    return {"success": True, "item": state}
+
+
+@app.post("/api/marketing/dedup/backfill")
+async def marketing_dedup_backfill(type: str, db=Depends(get_db)):
+    """Fingerprint existing content docs and flag near-duplicates"""
+    if type not in DEDUP_ITEM_TYPES:
+        raise HTTPException(status_code=400, detail=f"Dedup supports: {', '.join(DEDUP_ITEM_TYPES)}")
+    cmap = await collections_map(db)
+    result = await ContentDeduplicator(db).backfill(type, cmap[type])
+    await stamps.bump(cmap[type].name)
+    return {"success": True, "type": type, **result}
+
+
 # ----------------------
 # AI Orchestration Endpoints (Text)
 # ----------------------
@@ -409,10 +773,20 @@ async def ai_generate_strategy(request: StrategyRequest, db=Depends(get_db)):
         )
 
     try:
+        if request.reuse_similar:
+            match = embedding_index.best("strategy", request.dict())
+            cmap = await collections_map(db)
+            existing = await cmap["strategy"].find_one({"id": match["id"]}, {"_id": 0}) if match else None
+            if existing:
+                return {"success": True, "strategy": existing, "reused": True, "similarity": match["score"]}
+
         strategy_content: str
+        usage: Optional[Dict[str, Any]] = None
         if EMERGENT_LLM_KEY:
             try:
-                strategy_content = await generate_marketing_strategy(request)
+                strategy_content, usage = await generate_marketing_strategy(request)
+            except DeadlineExceeded:
+                raise
             except Exception:
                 strategy_content = fallback_strategy(request)
         else:
@@ -426,86 +800,268 @@ async def ai_generate_strategy(request: StrategyRequest, db=Depends(get_db)):
             "goals": request.goals,
             "website_url": request.website_url,
             "strategy_content": strategy_content,
+            **parse_sections("strategy", strategy_content),
+            "llm_usage": usage,
             "status": "Generated",
-            "created_at": now_iso(),
-            "updated_at": now_iso(),
+            "created_at": now_utc(),
+            "updated_at": now_utc(),
         }
         cmap = await collections_map(db)
         await cmap["strategy"].insert_one(strategy_doc)
+        await stamps.bump(cmap["strategy"].name)
         strategy_doc.pop("_id", None)
+        embedding_index.add("strategy", strategy_doc)
         return {"success": True, "strategy": strategy_doc}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Strategy generation failed: {str(e)}")
 
 
-@app.post("/api/ai/generate-content")
-async def ai_generate_content(request: ContentRequest, db=Depends(get_db)):
-    """Generate content ideas; gracefully fallback if AI unavailable"""
+# Map content type to collection
+CONTENT_COLLECTIONS = {
+    "reel": "reel",
+    "ugc": "ugc",
+    "brand": "brand",
+    "influencer": "influencer",
+}
 
-    def fallback_content(req: ContentRequest) -> str:
-        return (
-            f"Content ideas (fallback) for {req.content_type} on {req.platform}.\n"
-            f"Brief: {req.brief}\nTarget: {req.target_audience}\nBudget: {req.budget or 'Flexible'}\n"
-            "Ideas: 1) Hook, 2) Value, 3) CTA, 4) Hashtags, 5) Visual style."
+
+def fallback_content(req: ContentRequest) -> str:
+    return (
+        f"Content ideas (fallback) for {req.content_type} on {req.platform}.\n"
+        f"Brief: {req.brief}\nTarget: {req.target_audience}\nBudget: {req.budget or 'Flexible'}\n"
+        "Ideas: 1) Hook, 2) Value, 3) CTA, 4) Hashtags, 5) Visual style."
+    )
+
+
+def content_collection_key(content_type: str) -> str:
+    return CONTENT_COLLECTIONS.get(content_type, "reel")
+
+
+async def build_content_doc(request: ContentRequest) -> Dict[str, Any]:
+    """Generate content ideas (or the fallback) and wrap them in a content document"""
+    content_ideas: str
+    usage: Optional[Dict[str, Any]] = None
+    cached = None
+    if request.festival and request.industry and request.use_festival_cache:
+        cached = await festival_pregenerator.lookup(
+            request.festival, request.platform, request.content_type, request.industry
         )
+    if cached:
+        content_ideas = cached["ai_content"]
+    elif EMERGENT_LLM_KEY:
+        try:
+            content_ideas, usage = await generate_content_ideas(request)
+        except DeadlineExceeded:
+            # Out of time: a fallback document would be stored and answered as a success
+            raise
+        except Exception:
+            content_ideas = fallback_content(request)
+    else:
+        content_ideas = fallback_content(request)
+    return {
+        "id": str(uuid.uuid4()),
+        "content_type": request.content_type,
+        "brief": request.brief,
+        "target_audience": request.target_audience,
+        "platform": request.platform,
+        "budget": request.budget,
+        "festival": request.festival,
+        "ai_content": content_ideas,
+        **parse_sections("content", content_ideas),
+        "llm_usage": usage,
+        "pregenerated_from": cached["_id"] if cached else None,
+        "status": "Generated",
+        "created_at": now_utc(),
+        "updated_at": now_utc(),
+    }
+
+
+def request_fingerprint(request: ContentRequest) -> Dict[str, Any]:
+    return fingerprint(brief_text(
+        request.content_type, request.platform, request.brief, request.target_audience, request.festival
+    ))
+
+
+async def check_content_doc(db, collection_key: str, doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Attach dedup flags before insert; returns the content fingerprint for index_content_doc"""
+    if collection_key not in DEDUP_ITEM_TYPES:
+        return None
+    fields, fp = await ContentDeduplicator(db).check(doc, collection_key)
+    doc.update(fields)
+    return fp
+
+
+async def index_content_doc(
+    db, collection_key: str, doc: Dict[str, Any], fp: Optional[Dict[str, Any]], request: ContentRequest
+):
+    """Index content/brief fingerprints once the doc is stored, so a failed insert leaves no orphans"""
+    if collection_key not in DEDUP_ITEM_TYPES:
+        return
+    dedup = ContentDeduplicator(db)
+    if fp is not None:
+        await dedup.index(doc["id"], collection_key, fp)
+    await dedup.index(doc["id"], collection_key, request_fingerprint(request), kind="brief")
+
 
+@app.post("/api/ai/generate-content")
+async def ai_generate_content(request: ContentRequest, db=Depends(get_db)):
+    """Generate content ideas; gracefully fallback if AI unavailable"""
     try:
-        content_ideas: str
-        if EMERGENT_LLM_KEY:
-            try:
-                content_ideas = await generate_content_ideas(request)
-            except Exception:
-                content_ideas = fallback_content(request)
-        else:
-            content_ideas = fallback_content(request)
-        # Save content ideas to appropriate collection
-        content_doc = {
-            "id": str(uuid.uuid4()),
-            "content_type": request.content_type,
-            "brief": request.brief,
-            "target_audience": request.target_audience,
-            "platform": request.platform,
-            "budget": request.budget,
-            "festival": request.festival,
-            "ai_content": content_ideas,
-            "status": "Generated",
-            "created_at": now_iso(),
-            "updated_at": now_iso(),
-        }
         cmap = await collections_map(db)
-        # Map content type to collection
-        collection_map = {
-            "reel": "reel",
-            "ugc": "ugc",
-            "brand": "brand",
-            "influencer": "influencer",
-        }
-        collection_key = collection_map.get(request.content_type, "reel")
+        collection_key = content_collection_key(request.content_type)
+        if request.reuse_similar and collection_key in DEDUP_ITEM_TYPES:
+            match = await ContentDeduplicator(db).find_similar(request_fingerprint(request), collection_key, kind="brief")
+            existing = await cmap[collection_key].find_one({"id": match[0]}, {"_id": 0}) if match else None
+            if existing:
+                return {"success": True, "content": existing, "reused": True}
+        if request.reuse_similar:
+            match = embedding_index.best(collection_key, request.dict())
+            existing = await cmap[collection_key].find_one({"id": match["id"]}, {"_id": 0}) if match else None
+            if existing:
+                return {"success": True, "content": existing, "reused": True, "similarity": match["score"]}
+
+        # Save content ideas to appropriate collection
+        content_doc = await build_content_doc(request)
+        fp = await check_content_doc(db, collection_key, content_doc)
         await cmap[collection_key].insert_one(content_doc)
+        await index_content_doc(db, collection_key, content_doc, fp, request)
+        await stamps.bump(cmap[collection_key].name)
         content_doc.pop("_id", None)
+        embedding_index.add(collection_key, content_doc)
         return {"success": True, "content": content_doc}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Content generation failed: {str(e)}")
 
 
+class ContentFanoutRequest(BaseModel):
+    content_types: List[str]
+    platforms: List[str]
+    brief: str
+    target_audience: str
+    budget: Optional[str] = None
+    festival: Optional[str] = None
+    industry: Optional[str] = None  # with a festival, pairs are served from the pre-generated cache when available
+
+
+@app.post("/api/ai/generate-content/fanout")
+async def ai_generate_content_fanout(request: ContentFanoutRequest, db=Depends(get_db)):
+    """Generate content for every (content_type, platform) pair concurrently.
+
+    Streams one NDJSON line per result as it completes (pending until stored), then
+    a final "done" line listing the ids written (one insert_many per target collection).
+    """
+    if not request.content_types or not request.platforms:
+        raise HTTPException(status_code=400, detail="content_types and platforms are required")
+    sub_requests = [
+        ContentRequest(
+            content_type=ct,
+            platform=p,
+            brief=request.brief,
+            target_audience=request.target_audience,
+            budget=request.budget,
+            festival=request.festival,
+            industry=request.industry,
+            # A fan-out asks for a festival's content across the board: that is what the cache pre-builds
+            use_festival_cache=True,
+        )
+        for ct, p in fanout_pairs(request.content_types, request.platforms)
+    ]
+    cmap = await collections_map(db)
+
+    async def after_insert(key: str, entries: List[Tuple[Dict[str, Any], Optional[Dict[str, Any]], ContentRequest]]):
+        for d, fp, sub in entries:
+            await index_content_doc(db, key, d, fp, sub)
+        await stamps.bump(cmap[key].name)
+        for d, _, _ in entries:
+            embedding_index.add(key, d)
+
+    async def prepare(key: str, doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return await check_content_doc(db, key, doc)
+
+    stream = stream_fanout(
+        sub_requests, build_content_doc, lambda sub: content_collection_key(sub.content_type), prepare,
+        cmap, after_insert, json_default=json_default,
+    )
+    return StreamingResponse(stream, media_type="application/x-ndjson")
+
+
+# ----------------------
+# Festival pre-generation
+# ----------------------
+FESTIVAL_PREGEN_ENABLED = os.environ.get("DMM_FESTIVAL_PREGEN", "1").lower() not in ("0", "false", "off")
+
+
+async def pregenerate_festival_content(params: Dict[str, Any]) -> Tuple[str, Optional[Dict[str, Any]]]:
+    # No fallback text here: only real LLM output is worth caching
+    if not EMERGENT_LLM_KEY:
+        raise RuntimeError("EMERGENT_LLM_KEY not configured")
+    return await generate_content_ideas(ContentRequest(**params))
+
+
+festival_pregenerator = FestivalPregenerator(get_db, pregenerate_festival_content)
+
+
+class FestivalPregenerateRequest(BaseModel):
+    token_budget: Optional[int] = None  # cap for this run (the daily DMM_FESTIVAL_TOKEN_BUDGET still applies)
+
+
+@app.get("/api/festivals/upcoming")
+async def festivals_upcoming(days: int = 60):
+    today = local_today()
+    return {
+        "success": True,
+        "festivals": [{"festival": n, "date": d.isoformat(), "days_left": (d - today).days}
+                      for n, d in upcoming_festivals(load_calendar(), today, max(1, min(days, 366)))],
+    }
+
+
+@app.get("/api/festivals/content")
+async def festivals_content(festival: str, platform: str, content_type: str, industry: str):
+    """Pre-generated ideas for a festival/platform/content type (no LLM call)"""
+    cached = await festival_pregenerator.lookup(festival, platform, content_type, industry)
+    if not cached:
+        raise HTTPException(status_code=404, detail="Not pre-generated")
+    return {"success": True, "key": cached.pop("_id"), **cached, **parse_sections("content", cached["ai_content"])}
+
+
+@app.post("/api/festivals/pregenerate")
+async def festivals_pregenerate(body: FestivalPregenerateRequest):
+    """Start a pre-generation run now instead of waiting for the off-peak window"""
+    started = festival_pregenerator.trigger(body.token_budget)
+    return {"success": True, "started": started}
+
+
+@app.get("/api/festivals/pregenerate")
+async def festivals_pregenerate_status():
+    return {"success": True, **await festival_pregenerator.snapshot()}
+
+
 @app.post("/api/ai/optimize-campaign")
 async def ai_optimize_campaign(request: CampaignRequest, db=Depends(get_db)):
     """Optimize campaign; gracefully fallback if AI unavailable"""
 
-    def fallback_opt(request: CampaignRequest) -> str:
+    def fallback_opt(request: CampaignRequest, budget_plan: Dict[str, Any]) -> str:
         return (
-            "Optimization (fallback): Distribute budget across selected channels with 60/30/10 rule, "
-            "set upper frequency caps, add creative sizes, and start with broad targeting then narrow."
+            f"Optimization (fallback): Budget allocation by channel response curves: {allocation_summary(budget_plan)}. "
+            "Set upper frequency caps, add creative sizes, and start with broad targeting then narrow."
         )
 
     try:
+        budget_plan = campaign_budget_plan(request)
+        usage: Optional[Dict[str, Any]] = None
         if EMERGENT_LLM_KEY:
             try:
-                optimization = await optimize_campaign(request)
+                optimization, usage = await optimize_campaign(request, budget_plan)
+            except DeadlineExceeded:
+                raise
             except Exception:
-                optimization = fallback_opt(request)
+                optimization = fallback_opt(request, budget_plan)
         else:
-            optimization = fallback_opt(request)
+            optimization = fallback_opt(request, budget_plan)
         # Save optimized campaign
         campaign_doc = {
             "id": str(uuid.uuid4()),
@@ -517,18 +1073,267 @@ async def ai_optimize_campaign(request: CampaignRequest, db=Depends(get_db)):
             "duration_days": request.duration_days,
             "targeting": request.targeting.dict(exclude_none=True) if request.targeting else None,
             "ai_optimization": optimization,
+            **parse_sections("campaign", optimization),
+            "budget_plan": budget_plan,
+            "response_curves": {k: v.dict(exclude_none=True) for k, v in request.response_curves.items()}
+            if request.response_curves else None,
+            "llm_usage": usage,
             "status": "Optimized",
-            "created_at": now_iso(),
-            "updated_at": now_iso(),
+            "created_at": now_utc(),
+            "updated_at": now_utc(),
         }
         cmap = await collections_map(db)
         await cmap["campaign"].insert_one(campaign_doc)
+        await stamps.bump(cmap["campaign"].name)
         campaign_doc.pop("_id", None)
         return {"success": True, "campaign": campaign_doc}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Campaign optimization failed: {str(e)}")
 
 
+@app.post("/api/campaigns/allocate")
+async def campaigns_allocate(request: CampaignRequest):
+    """Numeric channel budget split + daily plan (no LLM)"""
+    return {"success": True, "budget_plan": campaign_budget_plan(request)}
+
+
+class SimulationRequest(BaseModel):
+    campaign_id: Optional[str] = None  # saved campaign to simulate
+    campaign: Optional[CampaignRequest] = None  # or an unsaved variant
+    trials: int = DEFAULT_TRIALS
+    seed: Optional[int] = None
+    assumptions: Optional[Dict[str, float]] = None  # see simulation_service.DEFAULT_ASSUMPTIONS
+
+
+class SimulationBatchRequest(BaseModel):
+    variants: List[SimulationRequest]
+
+
+async def run_simulation(req: SimulationRequest, db) -> Dict[str, Any]:
+    if req.campaign is not None:
+        campaign = req.campaign.dict(exclude_none=True)
+        campaign["budget_plan"] = campaign_budget_plan(req.campaign)
+    elif req.campaign_id:
+        cmap = await collections_map(db)
+        campaign = await cmap["campaign"].find_one({"id": req.campaign_id}, {"_id": 0})
+        if not campaign:
+            raise HTTPException(status_code=404, detail="Campaign not found")
+    else:
+        raise HTTPException(status_code=400, detail="Provide campaign_id or campaign")
+    curves = campaign.get("response_curves") or None
+    targeting = campaign.get("targeting")
+    reach = get_audience_index().estimate(targeting)["estimated_reach"] if targeting else None
+    duration = int(campaign.get("duration_days") or 30)
+    # Offload the NumPy work so large trial counts do not stall the event loop
+    result = await asyncio.get_running_loop().run_in_executor(
+        None,
+        lambda: simulate_campaign(campaign_spend(campaign), duration, curves, req.assumptions, reach, req.trials, req.seed),
+    )
+    return {"campaign_id": campaign.get("id"), "campaign_name": campaign.get("campaign_name"), **result}
+
+
+@app.post("/api/campaigns/simulate")
+async def campaigns_simulate(req: SimulationRequest, db=Depends(get_db)):
+    """Monte Carlo percentile bands for leads, conversions and ROI"""
+    return {"success": True, "simulation": await run_simulation(req, db)}
+
+
+@app.post("/api/campaigns/simulate/batch")
+async def campaigns_simulate_batch(req: SimulationBatchRequest, db=Depends(get_db)):
+    """Simulate several campaign variants side by side"""
+    results = await asyncio.gather(*[run_simulation(v, db) for v in req.variants])
+    return {"success": True, "simulations": list(results)}
+
+
+# ----------------------
+# Experiments: A/B analysis of campaign variants
+# ----------------------
+experiment_results = ExperimentResultCache()
+EXPERIMENT_CSV_MAX_BYTES = 10 * 1024 * 1024
+
+
+class ExperimentCreateRequest(BaseModel):
+    name: str
+    variants: List[str]
+    metric: str = "conversion_rate"  # ctr | cvr | conversion_rate
+    control: Optional[str] = None  # defaults to the first variant
+    campaign_id: Optional[str] = None
+
+
+class ExperimentResultRow(BaseModel):
+    variant: str
+    impressions: int = 0
+    clicks: int = 0
+    conversions: int = 0
+    date: Optional[str] = None  # YYYY-MM-DD (UTC today when omitted); re-sending a day replaces it
+
+
+class ExperimentResultsRequest(BaseModel):
+    rows: List[ExperimentResultRow]
+
+
+async def experiment_ingest(db, rows: List[Dict[str, Any]], errors: List[str]) -> Dict[str, Any]:
+    report = await ingest_experiment_rows(db, rows)
+    if report["accepted"]:
+        await stamps.bump(EXPERIMENTS_COLLECTION)
+    return {"success": True, **report, "errors": errors[:50], "error_count": len(errors)}
+
+
+@app.post("/api/experiments")
+async def experiments_create(body: ExperimentCreateRequest, db=Depends(get_db)):
+    variants = list(dict.fromkeys(v.strip() for v in body.variants if v.strip()))
+    if not 2 <= len(variants) <= EXPERIMENT_MAX_VARIANTS:
+        raise HTTPException(status_code=400, detail=f"An experiment needs 2-{EXPERIMENT_MAX_VARIANTS} distinct variants")
+    if body.metric not in EXPERIMENT_METRICS:
+        raise HTTPException(status_code=400, detail=f"metric must be one of {', '.join(EXPERIMENT_METRICS)}")
+    if body.control and body.control not in variants:
+        raise HTTPException(status_code=400, detail="control must be one of the variants")
+    doc = new_experiment(body.name, variants, body.metric, body.control, body.campaign_id)
+    await db[EXPERIMENTS_COLLECTION].insert_one(doc)
+    await stamps.bump(EXPERIMENTS_COLLECTION)
+    doc.pop("_id", None)
+    return {"success": True, "experiment": doc}
+
+
+@app.post("/api/experiments/{experiment_id}/results")
+async def experiments_results(experiment_id: str, body: ExperimentResultsRequest, db=Depends(get_db)):
+    """Per-variant daily counts for one experiment"""
+    rows, errors = [], []
+    for i, r in enumerate(body.rows):
+        try:
+            rows.append(normalize_experiment_row({"experiment_id": experiment_id, **r.dict()}))
+        except ValueError as e:
+            errors.append(f"row {i}: {e}")
+    report = await experiment_ingest(db, rows, errors)
+    if report["rejected_unknown_experiment"]:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    if report["rejected_concluded_experiment"]:
+        raise HTTPException(status_code=409, detail="Experiment is concluded")
+    return report
+
+
+@app.post("/api/experiments/results/csv")
+async def experiments_results_csv(file: UploadFile = File(...), db=Depends(get_db)):
+    """Bulk upload: experiment_id,variant,impressions,clicks,conversions[,date] (any number of experiments)"""
+    raw = await file.read(EXPERIMENT_CSV_MAX_BYTES + 1)
+    if len(raw) > EXPERIMENT_CSV_MAX_BYTES:
+        raise HTTPException(status_code=413, detail="CSV too large (max 10 MB)")
+    rows, errors = parse_experiment_csv(raw.decode("utf-8", errors="replace"))
+    if not rows and errors:
+        raise HTTPException(status_code=400, detail=errors[0])
+    return await experiment_ingest(db, rows, errors)
+
+
+@app.get("/api/experiments/dashboard")
+async def experiments_dashboard(
+    response: Response,
+    status: Optional[str] = "running",
+    campaign_id: Optional[str] = None,
+    limit: int = 500,
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(read_db("experiments_dashboard", EXPERIMENTS_COLLECTION)),
+):
+    """Posterior win probabilities and stop/continue decisions for every matching experiment"""
+    tag = await stamps.etag([EXPERIMENTS_COLLECTION], "dashboard", status, campaign_id, limit)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+    q: Dict[str, Any] = {}
+    if status:
+        q["status"] = status
+    if campaign_id:
+        q["campaign_id"] = campaign_id
+    experiments = await db[EXPERIMENTS_COLLECTION].find(q, {"_id": 0}).sort("created_at", -1).to_list(
+        length=max(1, min(limit, 2000))
+    )
+    results = await experiment_results.results(experiments)
+    set_read_etag(response, tag, db, [EXPERIMENTS_COLLECTION])
+    return {
+        "success": True,
+        "experiments": [
+            {**{k: x.get(k) for k in ("id", "name", "campaign_id", "status", "control", "updated_at")},
+             "analysis": results.get(x["id"])}
+            for x in experiments
+        ],
+    }
+
+
+@app.get("/api/experiments/{experiment_id}")
+async def experiments_get(experiment_id: str, db=Depends(get_db)):
+    experiment = await db[EXPERIMENTS_COLLECTION].find_one({"id": experiment_id}, {"_id": 0})
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    results = await experiment_results.results([experiment])
+    return {"success": True, "experiment": experiment, "analysis": results.get(experiment_id)}
+
+
+@app.post("/api/experiments/{experiment_id}/conclude")
+async def experiments_conclude(experiment_id: str, winner: Optional[str] = None, db=Depends(get_db)):
+    """Stop an experiment (winner defaults to the current leader)"""
+    experiment = await db[EXPERIMENTS_COLLECTION].find_one({"id": experiment_id}, {"_id": 0})
+    if not experiment:
+        raise HTTPException(status_code=404, detail="Experiment not found")
+    if winner and winner not in experiment["variants"]:
+        raise HTTPException(status_code=400, detail="winner must be one of the variants")
+    analysis = (await experiment_results.results([experiment]))[experiment_id]
+    updates = {"status": "concluded", "winner": winner or analysis["leader"], "decision": analysis["decision"],
+               "updated_at": now_utc()}
+    await db[EXPERIMENTS_COLLECTION].update_one({"id": experiment_id}, {"$set": updates})
+    await stamps.bump(EXPERIMENTS_COLLECTION)
+    return {"success": True, "experiment": {**experiment, **updates}, "analysis": analysis}
+
+
+# ----------------------
+# Targeting: local audience estimation
+# ----------------------
+@app.post("/api/targeting/estimate")
+async def targeting_estimate(filters: TargetingFilters):
+    """Reach estimate for a targeting combination from the local bitmap index"""
+    index = get_audience_index()
+    return {"success": True, **index.estimate(filters.dict(exclude_none=True))}
+
+
+@app.get("/api/targeting/dimensions")
+async def targeting_dimensions():
+    """Known values per targeting dimension (for pickers/sliders)"""
+    index = get_audience_index()
+    return {"success": True, "dimensions": index.vocabulary()}
+
+
+@app.get("/api/campaigns/overlap")
+async def campaigns_overlap(
+    response: Response,
+    status: Optional[str] = None,
+    min_share: float = OVERLAP_ALERT_SHARE,
+    include_matrix: bool = True,
+    limit: int = 1000,
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(read_db("campaign_overlap", MARKETING_COLLECTIONS["campaign"])),
+):
+    """Audience overlap between active campaigns (share of the smaller audience, Jaccard, shared reach);
+    pairs at or above min_share are returned as cannibalization alerts"""
+    statuses = [s.strip() for s in status.split(",") if s.strip()] if status else list(ACTIVE_CAMPAIGN_STATUSES)
+    limit = max(1, min(limit, 2000))
+    tag = await stamps.etag(
+        [MARKETING_COLLECTIONS["campaign"]], "overlap", get_audience_index().version, statuses, min_share,
+        include_matrix, limit,
+    )
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+    campaigns = await db[MARKETING_COLLECTIONS["campaign"]].find(
+        {"status": {"$in": statuses}, "targeting": {"$type": "object"}},
+        {"_id": 0, "id": 1, "campaign_name": 1, "status": 1, "targeting": 1},
+    ).sort("created_at", -1).limit(limit).to_list(length=limit)
+    report = await asyncio.to_thread(overlap_engine.matrix, campaigns, min_share)
+    cache = await asyncio.to_thread(overlap_engine.snapshot)  # may wait for another request's matrix
+    if not include_matrix:
+        for key in ("overlap_share", "jaccard", "shared_reach"):
+            report.pop(key)
+    set_read_etag(response, tag, db, [MARKETING_COLLECTIONS["campaign"]])
+    return {"success": True, **report, "cache": cache}
+
+
 # ----------------------
 # New Advanced AI: Images (OpenAI gpt-image-1)
 # ----------------------
@@ -537,6 +1342,25 @@ class ImageGenRequest(BaseModel):
     size: str = Field(default="1024x1024", description="1024x1024 | 1024x1536 | 1536x1024")
     quality: str = Field(default="medium", description="low|medium|high")
     response_format: str = Field(default="b64_json", description="url|b64_json")
+    include_data: bool = False  # true = also return the full base64 payload alongside the derivative URLs
+
+
+class ImageDeriveRequest(BaseModel):
+    image_data: str  # base64 (optionally a data: URL)
+
+
+IMAGE_HASH_RE = re.compile(r"^[0-9a-f]{32}$")
+
+
+async def image_bytes(b64: Optional[str], url: Optional[str]) -> Optional[bytes]:
+    if b64:
+        return base64.b64decode(b64.split(",", 1)[-1])
+    if url:
+        async with httpx.AsyncClient(timeout=deadline_budget(30.0)) as client:
+            r = await client.get(url)
+            r.raise_for_status()
+            return r.content
+    return None
 
 
 @app.post("/api/ai/images/generate")
@@ -557,15 +1381,53 @@ async def generate_image(req: ImageGenRequest):
             response_format=req.response_format,
         )
         data = resp.data[0]
-        return {
-            "success": True,
-            "image_url": getattr(data, "url", None),
-            "image_data": getattr(data, "b64_json", None),
-            "size": req.size,
-            "quality": req.quality,
-        }
+        image_url = getattr(data, "url", None)
+        image_data = getattr(data, "b64_json", None)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Image generation failed: {str(e)}")
+    derivatives = None
+    try:
+        raw = await image_bytes(image_data, image_url)
+        if raw:
+            derivatives = await image_derivatives.ingest(raw)
+    except Exception:
+        # Previews are an optimisation; the generated image is still returned
+        derivatives = None
+    return {
+        "success": True,
+        "image_url": image_url,
+        # Without derivatives the payload is the only copy of a b64 image, so it is sent regardless
+        "image_data": image_data if req.include_data or derivatives is None else None,
+        "derivatives": derivatives,
+        "size": req.size,
+        "quality": req.quality,
+    }
+
+
+@app.post("/api/media/images")
+async def media_images_derive(req: ImageDeriveRequest):
+    try:
+        raw = base64.b64decode(req.image_data.split(",", 1)[-1], validate=True)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="image_data must be base64")
+    try:
+        return {"success": True, **(await image_derivatives.ingest(raw))}
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Could not process image: {str(e)}")
+
+
+@app.get("/api/media/images/{digest}/{variant}")
+async def media_image(digest: str, variant: str, if_none_match: Optional[str] = Header(None)):
+    if not IMAGE_HASH_RE.match(digest) or variant not in IMAGE_VARIANTS:
+        raise HTTPException(status_code=404, detail="Not found")
+    tag = image_etag(digest, variant)
+    headers = {"ETag": tag, "Cache-Control": "public, max-age=31536000, immutable"}
+    if if_none_match and tag in [t.strip() for t in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    path = variant_path(digest, variant)
+    if not os.path.exists(path):
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(path, media_type="image/webp", headers=headers)
 
 
 # ----------------------
@@ -587,7 +1449,7 @@ async def videos_generate(req: VideoGenRequest):
         async with httpx.AsyncClient(headers={
             "Authorization": f"Bearer {LUMA_API_KEY}",
             "Content-Type": "application/json",
-        }, timeout=30.0) as client:
+        }, timeout=deadline_budget(30.0)) as client:
             payload = {
                 "prompt": req.prompt,
                 "aspect_ratio": req.aspect_ratio,
@@ -615,17 +1477,30 @@ async def videos_status(generation_id: str):
         async with httpx.AsyncClient(headers={
             "Authorization": f"Bearer {LUMA_API_KEY}",
             "Content-Type": "application/json",
-        }, timeout=30.0) as client:
+        }, timeout=deadline_budget(30.0)) as client:
             r = await client.get(f"{LUMA_API_URL}/video/generations", params={"generation_id": generation_id})
             if r.status_code >= 400:
                 raise HTTPException(status_code=r.status_code, detail=r.text)
             data = r.json()
+            video_url = (data.get("video") or {}).get("url")
+            thumbnail_url = (data.get("video") or {}).get("thumbnail")
+            # Finished assets are pulled into the local cache once; reviewers then play them from here
+            cached: Dict[str, Optional[str]] = {}
+            for kind, url in (("video", video_url), ("thumbnail", thumbnail_url)):
+                if url and video_cache.path(generation_id, kind):
+                    cached[kind] = f"/api/media/videos/{generation_id}/{kind}"
+                else:
+                    cached[kind] = None
+                    if url:
+                        video_cache.ensure(generation_id, kind, url)
             return {
                 "success": True,
                 "generation_id": generation_id,
                 "status": data.get("status", "processing"),
-                "video_url": (data.get("video") or {}).get("url"),
-                "thumbnail_url": (data.get("video") or {}).get("thumbnail"),
+                "video_url": video_url,
+                "thumbnail_url": thumbnail_url,
+                "cached_video_url": cached["video"],
+                "cached_thumbnail_url": cached["thumbnail"],
                 "error": data.get("error"),
             }
     except HTTPException:
@@ -634,6 +1509,23 @@ async def videos_status(generation_id: str):
         raise HTTPException(status_code=500, detail=f"Status fetch failed: {str(e)}")
 
 
+@app.get("/api/media/videos/{generation_id}/{kind}")
+async def media_video(generation_id: str, kind: str, range: Optional[str] = Header(None), if_range: Optional[str] = Header(None)):
+    if kind not in VIDEO_KINDS:
+        raise HTTPException(status_code=404, detail="Not found")
+    path = video_cache.path(generation_id, kind)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Not cached yet")
+    return RangeFileResponse(
+        path, VIDEO_KINDS[kind][1], range, if_range, headers={"Cache-Control": "private, max-age=86400"}
+    )
+
+
+@app.get("/api/media/videos/cache")
+async def media_video_cache():
+    return {"success": True, **video_cache.snapshot()}
+
+
 # ----------------------
 # New: Competition Analysis (SERP API)
 # ----------------------
@@ -642,7 +1534,7 @@ async def compete_serp(query: str, location: str = "India"):
     if not SERP_API_KEY:
         raise HTTPException(status_code=501, detail="SERP API not configured. Please set SERP_API_KEY.")
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
+        async with httpx.AsyncClient(timeout=deadline_budget(20.0)) as client:
             params = {
                 "engine": "google",
                 "q": query,
@@ -671,7 +1563,7 @@ async def youtube_search(q: str, max_results: int = 10):
     if not YT_API_KEY:
         raise HTTPException(status_code=501, detail="YouTube API not configured. Please set YOUTUBE_DATA_API_KEY.")
     try:
-        async with httpx.AsyncClient(timeout=20.0) as client:
+        async with httpx.AsyncClient(timeout=deadline_budget(20.0)) as client:
             params = {
                 "part": "snippet",
                 "q": q,
@@ -732,6 +1624,83 @@ async def meta_publish(req: MetaPublishRequest):
     raise HTTPException(status_code=501, detail="Meta publish not configured")
 
 
+# Scheduled publishing: approved items go into a Mongo outbox and are dispatched at their slot
+META_PAGE_ID = os.environ.get("META_PAGE_ID", "1234567890")
+META_PAGE_ACCESS_TOKEN = os.environ.get("META_PAGE_ACCESS_TOKEN")
+PUBLISHER_ENABLED = os.environ.get("DMM_PUBLISHER", "1").lower() not in ("0", "false", "off")
+publisher = Publisher(
+    get_db,
+    MockGraphAPI() if MOCK_MODE or not META_PAGE_ACCESS_TOKEN else MetaGraphClient(META_PAGE_ACCESS_TOKEN),
+    default_page_id=META_PAGE_ID,
+)
+
+
+class PublishScheduleRequest(BaseModel):
+    item_type: str
+    item_ids: List[str]
+    page_id: Optional[str] = None
+    schedule: Optional[TargetingSchedule] = None  # defaults to the item's targeting.schedule, else ASAP
+
+
+def publish_message(item: Dict[str, Any]) -> str:
+    title = item.get("campaign_name") or item.get("name") or item.get("brief") or item.get("company_name") or "Aavana Greens"
+    hashtags = (item.get("sections") or {}).get("hashtags") or []
+    return f"{title}\n\n{' '.join(hashtags[:10])}".strip()
+
+
+@app.post("/api/publish/schedule")
+async def publish_schedule(req: PublishScheduleRequest, db=Depends(get_db)):
+    cmap = await collections_map(db)
+    if req.item_type not in cmap:
+        raise HTTPException(status_code=400, detail="Invalid item_type")
+    items = await cmap[req.item_type].find({"id": {"$in": req.item_ids}}, {"_id": 0}).to_list(length=len(req.item_ids))
+    entries, skipped = [], []
+    for item in items:
+        if item.get("status") != "Approved":
+            skipped.append({"id": item["id"], "reason": f"status is {item.get('status')}"})
+            continue
+        schedule = req.schedule.dict(exclude_none=True) if req.schedule else ((item.get("targeting") or {}).get("schedule"))
+        try:
+            due_at = publish_due_time(schedule)
+        except ValueError:
+            skipped.append({"id": item["id"], "reason": "invalid schedule.start_date or end_date"})
+            continue
+        if due_at is None:
+            skipped.append({"id": item["id"], "reason": f"schedule ended {schedule['end_date']}"})
+            continue
+        entries.append({
+            "item_type": req.item_type,
+            "item_id": item["id"],
+            "page_id": req.page_id,
+            "message": publish_message(item),
+            "image_url": item.get("image_url"),
+            "due_at": due_at,
+        })
+    found = {i["id"] for i in items}
+    skipped += [{"id": i, "reason": "not found"} for i in req.item_ids if i not in found]
+    scheduled = await publisher.enqueue(entries)
+    return {"success": True, "scheduled": scheduled, "skipped": skipped}
+
+
+@app.get("/api/publish/outbox")
+async def publish_outbox(status: Optional[str] = None, limit: int = 200, db=Depends(read_db("publish_outbox"))):
+    q = {"status": status} if status else {}
+    rows = await db["publish_outbox"].find(q, {"_id": 0}).sort("due_at", 1).to_list(length=min(limit, 1000))
+    return {"success": True, "items": rows}
+
+
+@app.post("/api/publish/outbox/{outbox_id}/cancel")
+async def publish_cancel(outbox_id: str):
+    if not await publisher.cancel(outbox_id):
+        raise HTTPException(status_code=409, detail="Only scheduled or failed posts can be cancelled")
+    return {"success": True}
+
+
+@app.get("/api/publish/stats")
+async def publish_stats():
+    return {"success": True, **(await publisher.snapshot())}
+
+
 class CanvaDesignRequest(BaseModel):
     template_id: str
     variables: Dict[str, Any] = Field(default_factory=dict)
@@ -758,9 +1727,45 @@ async def canva_generate(req: CanvaDesignRequest):
     raise HTTPException(status_code=501, detail="Canva generate not configured")
 
 
+# Batch rendering: many variable sets for one template, deduped and cached by (template, variables hash)
+canva_renderer = CanvaBatchRenderer(get_db, MockCanvaBackend())
+
+
+class CanvaBatchRequest(BaseModel):
+    template_id: str
+    variable_sets: List[Dict[str, Any]]
+
+
+@app.post("/api/canva/designs/batch")
+async def canva_batch(req: CanvaBatchRequest):
+    if not MOCK_MODE:
+        raise HTTPException(status_code=501, detail="Canva generate not configured")
+    if not req.variable_sets or len(req.variable_sets) > CANVA_MAX_BATCH:
+        raise HTTPException(status_code=400, detail=f"variable_sets must hold 1-{CANVA_MAX_BATCH} entries")
+    batch = await canva_renderer.submit(req.template_id, req.variable_sets)
+    return {"success": True, "batch": batch}
+
+
+@app.get("/api/canva/batches/{batch_id}")
+async def canva_batch_status(batch_id: str, include_results: bool = True):
+    batch = await canva_renderer.get(batch_id, include_results)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    return {"success": True, "batch": batch}
+
+
 @app.get("/api/ai/strategies")
-async def list_strategies(db=Depends(get_db)):
-    """List all generated strategies"""
+async def list_strategies(
+    response: Response,
+    fields: Optional[str] = None,
+    if_none_match: Optional[str] = Header(None),
+    db=Depends(read_db("list_strategies", "marketing_strategies")),
+):
+    """List all generated strategies (?fields= projects just the needed sections)"""
     cmap = await collections_map(db)
-    strategies = await cmap["strategy"].find({}, {"_id": 0}).to_list(length=100)
+    tag = await stamps.etag([cmap["strategy"].name], "strategies", fields)
+    if etag_matches(if_none_match, tag):
+        return not_modified(tag)
+    strategies = await cmap["strategy"].find({}, fields_projection(fields)).to_list(length=100)
+    set_read_etag(response, tag, db, [cmap["strategy"].name])
     return strategies
@@ -0,0 +1,134 @@
+"""
+Monte Carlo ROI simulation for campaigns.
+Vectorized NumPy trials over CPM/CTR/CVR distributions per channel.
+"""
+
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from budget_service import allocate, channel_curves
+
+DEFAULT_TRIALS = 10000
+MAX_TRIALS = 200000
+PERCENTILES = (5, 25, 50, 75, 95)
+
+# Distribution shape defaults (means come from the channel curves)
+DEFAULT_ASSUMPTIONS: Dict[str, float] = {
+    "cpm_sigma": 0.25,  # lognormal sigma around the channel CPM
+    "ctr_concentration": 200.0,  # beta(mean*k, (1-mean)*k); higher = tighter
+    "cvr_concentration": 150.0,  # click -> lead
+    "close_rate": 0.12,  # lead -> conversion (sale)
+    "close_concentration": 60.0,
+    "value_per_conversion": 25000.0,  # revenue per conversion, budget currency
+    "max_weekly_frequency": 3.0,  # impression cap per reached person per week
+}
+
+
+def _beta(rng: np.random.Generator, mean: np.ndarray, k: float, size) -> np.ndarray:
+    mean = np.clip(mean, 1e-6, 1 - 1e-6)
+    return rng.beta(mean * k, (1 - mean) * k, size=size)
+
+
+def _bands(values: np.ndarray) -> Dict[str, float]:
+    pct = np.percentile(values, PERCENTILES)
+    out = {f"p{p}": round(float(v), 4) for p, v in zip(PERCENTILES, pct)}
+    out["mean"] = round(float(values.mean()), 4)
+    return out
+
+
+def simulate(
+    spend: Dict[str, float],
+    duration_days: int,
+    curve_overrides: Optional[Dict[str, Dict[str, float]]] = None,
+    assumptions: Optional[Dict[str, float]] = None,
+    reach: Optional[int] = None,
+    trials: int = DEFAULT_TRIALS,
+    seed: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Simulate total campaign outcomes for a per-channel total spend.
+
+    Clicks follow the channel's saturating response curve (see budget_service),
+    so spend far past max_daily_clicks buys impressions but few extra clicks.
+    ``reach`` (e.g. from the audience estimator) caps impressions at
+    reach * max_weekly_frequency * weeks across all channels.
+    """
+    started = time.perf_counter()
+    a = {**DEFAULT_ASSUMPTIONS, **{k: v for k, v in (assumptions or {}).items() if v is not None}}
+    trials = int(min(max(trials, 100), MAX_TRIALS))
+    channels = [c for c, s in spend.items() if s and s > 0]
+    budget = float(sum(spend[c] for c in channels))
+    if not channels:
+        return {"trials": 0, "budget": 0.0, "channels": [], "elapsed_ms": 0.0}
+    curves = channel_curves(channels, curve_overrides)
+    rng = np.random.default_rng(seed)
+    shape = (trials, len(channels))
+
+    spend_v = np.array([spend[c] for c in channels], dtype=float)
+    cpm_mean = np.array([curves[c]["cpm"] for c in channels], dtype=float)
+    # CTR implied by the curve: cpc = cpm / (1000 * ctr)
+    ctr_mean = cpm_mean / (1000 * np.array([curves[c]["cpc"] for c in channels], dtype=float))
+    cvr_mean = np.array([curves[c]["cvr"] for c in channels], dtype=float)
+    # Click ceiling over the run (budget_service's max_daily_clicks)
+    max_clicks = np.array([curves[c]["max_daily_clicks"] for c in channels], dtype=float) * max(duration_days, 1)
+
+    sigma = a["cpm_sigma"]
+    cpm = cpm_mean * rng.lognormal(-sigma ** 2 / 2, sigma, size=shape)
+    impressions = spend_v / cpm * 1000
+    if reach:
+        cap = reach * a["max_weekly_frequency"] * max(duration_days, 1) / 7
+        total = impressions.sum(axis=1, keepdims=True)
+        impressions *= np.minimum(1.0, cap / np.maximum(total, 1.0))
+    # Same saturating response as budget_service, cap * (1 - exp(-x / cap)), applied to the
+    # clicks each trial's CPM and CTR would buy at low spend
+    clicks = -max_clicks * np.expm1(-impressions * _beta(rng, ctr_mean, a["ctr_concentration"], shape) / max_clicks)
+    leads = clicks * _beta(rng, cvr_mean, a["cvr_concentration"], shape)
+    close = _beta(rng, np.full(trials, a["close_rate"]), a["close_concentration"], trials)
+
+    total_leads = leads.sum(axis=1)
+    conversions = total_leads * close
+    revenue = conversions * a["value_per_conversion"]
+    roi = (revenue - budget) / budget
+
+    per_channel = [
+        {
+            "channel": c,
+            "spend": round(float(spend_v[i]), 2),
+            "impressions": _bands(impressions[:, i]),
+            "clicks": _bands(clicks[:, i]),
+            "leads": _bands(leads[:, i]),
+            "saturation": round(float(clicks[:, i].mean() / max_clicks[i]), 3),
+        }
+        for i, c in enumerate(channels)
+    ]
+    return {
+        "trials": trials,
+        "budget": round(budget, 2),
+        "duration_days": duration_days,
+        "reach_cap": reach,
+        "assumptions": a,
+        "impressions": _bands(impressions.sum(axis=1)),
+        "clicks": _bands(clicks.sum(axis=1)),
+        "leads": _bands(total_leads),
+        "conversions": _bands(conversions),
+        "cost_per_lead": _bands(budget / np.maximum(total_leads, 1e-9)),
+        "revenue": _bands(revenue),
+        "roi": _bands(roi),
+        "prob_positive_roi": round(float((roi > 0).mean()), 4),
+        "channels": per_channel,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 3),
+    }
+
+
+def campaign_spend(campaign: Dict[str, Any]) -> Dict[str, float]:
+    """Per-channel total spend for a campaign doc: manual splits, then the saved plan, then the optimizer"""
+    splits = campaign.get("budget_splits") or {}
+    if any(float(v or 0) > 0 for v in splits.values()):
+        return {k: float(v or 0) for k, v in splits.items()}
+    plan = campaign.get("budget_plan") or {}
+    if plan.get("channels"):
+        return {c["channel"]: float(c["total_budget"]) for c in plan["channels"]}
+    channels: List[str] = campaign.get("channels") or []
+    plan = allocate(channels, float(campaign.get("budget") or 0), int(campaign.get("duration_days") or 30))
+    return {c["channel"]: float(c["total_budget"]) for c in plan["channels"]}
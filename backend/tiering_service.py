@@ -0,0 +1,138 @@
+"""
+Complexity-based model tiering for the DMM generators.
+Scores each request (text length, list sizes, targeting richness), picks a
+nano/mini/main tier with its own timeout, and records per-tier outcomes for tuning.
+"""
+
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from prompt_service import count_tokens
+from timestamp_service import ensure_ttl, now_utc
+
+TIERING_ENABLED = os.environ.get("DMM_TIERING", "1").lower() not in ("0", "false", "off")
+# score < first -> nano, < second -> mini, else main
+_thresholds = [float(x) for x in os.environ.get("DMM_TIER_THRESHOLDS", "0.25,0.55").split(",")]
+NANO_MAX, MINI_MAX = _thresholds[0], _thresholds[1]
+
+TIERS: Dict[str, Dict[str, Any]] = {
+    "nano": {"model": "gpt-5-nano", "timeout": float(os.environ.get("DMM_TIER_NANO_TIMEOUT", "15"))},
+    "mini": {"model": "gpt-5-mini", "timeout": float(os.environ.get("DMM_TIER_MINI_TIMEOUT", "30"))},
+    "main": {"model": "gpt-5", "timeout": float(os.environ.get("DMM_TIER_MAIN_TIMEOUT", "60"))},
+}
+TIER_ORDER = ["nano", "mini", "main"]
+# Templates whose output is long and structured never drop below this tier
+TEMPLATE_FLOOR = {"strategy": "mini", "campaign": "mini", "content": "nano"}
+
+TIER_LOG_COLLECTION = "llm_tier_log"
+# Outcome rows only feed recent stats; the TTL index drops them after this many days
+TIER_LOG_TTL_DAYS = float(os.environ.get("DMM_TIER_LOG_TTL_DAYS", "30"))
+
+
+@dataclass
+class TierRoute:
+    template: str
+    tier: str
+    model: str
+    timeout: float
+    score: float
+    features: Dict[str, float]
+
+
+def _count_filled(d: Optional[Dict[str, Any]]) -> int:
+    if not d:
+        return 0
+    n = 0
+    for v in d.values():
+        if isinstance(v, dict):
+            n += _count_filled(v)
+        elif v not in (None, "", [], {}):
+            n += 1
+    return n
+
+
+def score(text_parts: List[str], list_items: int, targeting: Optional[Dict[str, Any]] = None) -> Dict[str, float]:
+    """Feature vector + blended complexity score in [0, 1]"""
+    text_tokens = sum(count_tokens(t or "") for t in text_parts)
+    targeting_fields = _count_filled(targeting)
+    features = {
+        "text_tokens": float(text_tokens),
+        "list_items": float(list_items),
+        "targeting_fields": float(targeting_fields),
+    }
+    features["score"] = round(
+        0.5 * min(text_tokens / 400, 1.0) + 0.25 * min(list_items / 6, 1.0) + 0.25 * min(targeting_fields / 10, 1.0),
+        4,
+    )
+    return features
+
+
+def route(template: str, features: Dict[str, float], default_model: str, default_timeout: float) -> TierRoute:
+    s = features["score"]
+    if not TIERING_ENABLED:
+        return TierRoute(template, "main", default_model, default_timeout, s, features)
+    tier = "nano" if s < NANO_MAX else "mini" if s < MINI_MAX else "main"
+    floor = TEMPLATE_FLOOR.get(template, "nano")
+    if TIER_ORDER.index(tier) < TIER_ORDER.index(floor):
+        tier = floor
+    cfg = TIERS[tier]
+    return TierRoute(template, tier, cfg["model"], cfg["timeout"], s, features)
+
+
+async def ensure_tier_log_indexes(db):
+    coll = db[TIER_LOG_COLLECTION]
+    # Rows logged before ts became a date hold epoch seconds, which TTL never expires
+    await coll.update_many(
+        {"ts": {"$type": "number"}},
+        [{"$set": {"ts": {"$toDate": {"$multiply": ["$ts", 1000]}}}}],
+    )
+    await ensure_ttl(coll, "ts", int(TIER_LOG_TTL_DAYS * 86400))
+
+
+async def record(db, r: TierRoute, latency: float, ok: bool, usage: Optional[Dict[str, Any]] = None, error: str = ""):
+    """Append one outcome row; aggregated by tier_stats() to tune thresholds"""
+    await db[TIER_LOG_COLLECTION].insert_one({
+        "template": r.template,
+        "tier": r.tier,
+        "model": r.model,
+        "score": r.score,
+        "features": r.features,
+        "latency_ms": round(latency * 1000, 1),
+        "ok": ok,
+        "error": error[:200] or None,
+        "prompt_tokens": (usage or {}).get("prompt_tokens"),
+        "completion_tokens": (usage or {}).get("completion_tokens"),
+        "ts": now_utc(),
+    })
+
+
+async def tier_stats(db, since_seconds: float = 7 * 24 * 3600) -> List[Dict[str, Any]]:
+    pipeline = [
+        {"$match": {"ts": {"$gte": now_utc() - timedelta(seconds=since_seconds)}}},
+        {"$group": {
+            "_id": {"template": "$template", "tier": "$tier"},
+            "calls": {"$sum": 1},
+            "ok": {"$sum": {"$cond": ["$ok", 1, 0]}},
+            "avg_latency_ms": {"$avg": "$latency_ms"},
+            "max_latency_ms": {"$max": "$latency_ms"},
+            "avg_score": {"$avg": "$score"},
+            "avg_completion_tokens": {"$avg": "$completion_tokens"},
+        }},
+        {"$sort": {"_id.template": 1, "_id.tier": 1}},
+    ]
+    rows = await db[TIER_LOG_COLLECTION].aggregate(pipeline).to_list(length=100)
+    return [
+        {
+            "template": r["_id"]["template"],
+            "tier": r["_id"]["tier"],
+            "calls": r["calls"],
+            "success_rate": round(r["ok"] / r["calls"], 3) if r["calls"] else None,
+            "avg_latency_ms": round(r["avg_latency_ms"] or 0, 1),
+            "max_latency_ms": r["max_latency_ms"],
+            "avg_score": round(r["avg_score"] or 0, 3),
+            "avg_completion_tokens": round(r["avg_completion_tokens"] or 0, 1),
+        }
+        for r in rows
+    ]
@@ -0,0 +1,145 @@
+"""
+Native BSON datetimes for marketing documents.
+New writes store timezone-aware UTC datetimes; readers accept legacy ISO strings
+until the resumable, batched migration below has converted a collection.
+"""
+
+import asyncio
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+logger = logging.getLogger(__name__)
+
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+# Pre-datetime storage: ISO strings, and epoch seconds (marketing_revisions)
+LEGACY_TYPES = ("string", "double", "int", "long")
+MIGRATIONS_COLLECTION = "migrations"
+BUCKET_FORMATS = {"hour": "%Y-%m-%dT%H:00", "day": "%Y-%m-%d", "week": "%G-W%V", "month": "%Y-%m"}
+
+
+def now_utc() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+def as_datetime(value: Any) -> Optional[datetime]:
+    """Dual read: native datetime (naive = UTC), a legacy ISO string or legacy epoch seconds"""
+    if value is None or isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        try:
+            return datetime.fromtimestamp(value, timezone.utc)
+        except (OverflowError, OSError, ValueError):
+            return None
+    if isinstance(value, datetime):
+        return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return None
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+    return None
+
+
+def range_filter(field: str, start: Optional[datetime] = None, end: Optional[datetime] = None) -> Dict[str, Any]:
+    """Match [start, end) on either storage format while a migration is in flight"""
+    native: Dict[str, Any] = {"$type": "date"}
+    legacy: Dict[str, Any] = {"$type": "string"}
+    if start is not None:
+        native["$gte"], legacy["$gte"] = start, start.astimezone(timezone.utc).isoformat()
+    if end is not None:
+        native["$lt"], legacy["$lt"] = end, end.astimezone(timezone.utc).isoformat()
+    return {"$or": [{field: native}, {field: legacy}]}
+
+
+def date_expr(field: str) -> Dict[str, Any]:
+    """Aggregation expression yielding a date for native or ISO-string values"""
+    return {"$convert": {"input": f"${field}", "to": "date", "onError": None, "onNull": None}}
+
+
+async def bucket_counts(collection, field: str, start: datetime, end: datetime, unit: str = "day") -> List[Dict[str, Any]]:
+    pipeline = [
+        {"$match": range_filter(field, start, end)},
+        {"$group": {"_id": {"$dateToString": {"format": BUCKET_FORMATS[unit], "date": date_expr(field)}}, "count": {"$sum": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    rows = await collection.aggregate(pipeline).to_list(length=None)
+    return [{"bucket": r["_id"], "count": r["count"]} for r in rows if r["_id"] is not None]
+
+
+async def ensure_ttl(collection, field: str, seconds: int):
+    # TTL monitors only expire documents whose field is a BSON date
+    await collection.create_index([(field, 1)], expireAfterSeconds=seconds, name=f"{field}_ttl")
+
+
+async def migrate_collection(
+    db,
+    name: str,
+    batch_size: int = 500,
+    dry_run: bool = False,
+    pause_seconds: float = 0.0,
+    on_batch=None,
+) -> Dict[str, Any]:
+    """Convert string (or epoch-number) timestamps to datetimes in _id order, checkpointing after every batch.
+
+    Safe to interrupt and re-run: it resumes after the last checkpointed _id, and
+    each update is conditional on the field still holding the value it read.
+    """
+    state_id = f"timestamps:{name}"
+    state = await db[MIGRATIONS_COLLECTION].find_one({"_id": state_id}) or {"last_id": None, "converted": 0, "skipped": 0}
+    if state.get("done"):
+        return {"collection": name, "converted": state["converted"], "skipped": state["skipped"], "resumed": True, "done": True}
+    coll = db[name]
+    last_id = state.get("last_id")
+    converted, skipped = state.get("converted", 0), state.get("skipped", 0)
+    resumed = last_id is not None
+    while True:
+        q: Dict[str, Any] = {"$or": [{f: {"$type": t}} for f in TIMESTAMP_FIELDS for t in LEGACY_TYPES]}
+        if last_id is not None:
+            q["_id"] = {"$gt": last_id}
+        cursor = coll.find(q, {f: 1 for f in TIMESTAMP_FIELDS}).sort("_id", 1).limit(batch_size)
+        batch = await cursor.to_list(length=batch_size)
+        if not batch:
+            break
+        ops = []
+        for doc in batch:
+            for f in TIMESTAMP_FIELDS:
+                value = doc.get(f)
+                if not isinstance(value, (str, int, float)) or isinstance(value, bool):
+                    continue
+                parsed = as_datetime(value)
+                if parsed is None:
+                    skipped += 1
+                    continue
+                ops.append(UpdateOne({"_id": doc["_id"], f: value}, {"$set": {f: parsed}}))
+        if ops and not dry_run:
+            await coll.bulk_write(ops, ordered=False)
+        converted += len(ops)
+        last_id = batch[-1]["_id"]
+        if not dry_run:
+            await db[MIGRATIONS_COLLECTION].update_one(
+                {"_id": state_id},
+                {"$set": {"last_id": last_id, "converted": converted, "skipped": skipped, "updated_at": now_utc()}},
+                upsert=True,
+            )
+        if on_batch is not None:
+            await on_batch(name, len(batch), converted)
+        if pause_seconds:
+            await asyncio.sleep(pause_seconds)  # leave headroom for live traffic on the primary
+    if not dry_run:
+        await db[MIGRATIONS_COLLECTION].update_one(
+            {"_id": state_id}, {"$set": {"done": True, "finished_at": now_utc()}}, upsert=True
+        )
+    return {"collection": name, "converted": converted, "skipped": skipped, "resumed": resumed, "done": not dry_run}
+
+
+async def migrate(db, names: Iterable[str], **kwargs) -> List[Dict[str, Any]]:
+    reports = []
+    for name in names:
+        report = await migrate_collection(db, name, **kwargs)
+        logger.info(f"timestamp migration {report}")
+        reports.append(report)
+    return reports
@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Content Fan-out Smoke Test
+POST /api/ai/generate-content/fanout → one NDJSON result per (content_type, platform) pair, then "done"
+"""
+
+import requests
+import json
+import sys
+from datetime import datetime
+
+# Test configuration
+BASE_URL = "http://localhost:8002"
+HEADERS = {"Content-Type": "application/json"}
+
+def log_result(step, status, details=""):
+    """Log test results with timestamp"""
+    timestamp = datetime.now().strftime("%H:%M:%S")
+    status_symbol = "✅" if status == "PASS" else "❌"
+    print(f"[{timestamp}] {status_symbol} {step}")
+    if details:
+        print(f"    {details}")
+
+def smoke_test_content_fanout():
+    """
+    SMOKE TEST: Content fan-out
+    1) Reject an empty fan-out with 400
+    2) Stream results for 2 content types x 2 platforms (duplicates in the request are ignored)
+    3) Final "done" line reports every doc inserted
+    """
+    print("=" * 60)
+    print("SMOKE TEST: Content Fan-out")
+    print("=" * 60)
+
+    # Step 1: Empty fan-out is rejected
+    print("\n1️⃣ Sending an empty fan-out...")
+    try:
+        payload = {"content_types": [], "platforms": ["Instagram"], "brief": "x", "target_audience": "y"}
+        response = requests.post(f"{BASE_URL}/api/ai/generate-content/fanout",
+                               json=payload, headers=HEADERS, timeout=10)
+        if response.status_code == 400:
+            log_result("Reject Empty Fan-out", "PASS", "HTTP 400")
+        else:
+            log_result("Reject Empty Fan-out", "FAIL",
+                     f"HTTP {response.status_code}: {response.text}")
+            return False
+    except Exception as e:
+        log_result("Reject Empty Fan-out", "FAIL", f"Error: {str(e)}")
+        return False
+
+    # Step 2: Stream one result per pair
+    print("\n2️⃣ Streaming fan-out results...")
+    try:
+        payload = {
+            "content_types": ["reel", "ugc", "reel"],
+            "platforms": ["Instagram", "YouTube"],
+            "brief": "Vertical garden launch for Diwali",
+            "target_audience": "Urban homeowners 28-45",
+            "budget": "50000",
+            "festival": "Diwali",
+        }
+        response = requests.post(f"{BASE_URL}/api/ai/generate-content/fanout",
+                               json=payload, headers=HEADERS, timeout=300, stream=True)
+        if response.status_code != 200:
+            log_result("Stream Fan-out", "FAIL",
+                     f"HTTP {response.status_code}: {response.text}")
+            return False
+        events = [json.loads(line) for line in response.iter_lines() if line]
+        results = [e["content"] for e in events if e.get("event") == "result"]
+        pairs = {(c["content_type"], c["platform"]) for c in results}
+        expected = {(ct, p) for ct in ("reel", "ugc") for p in ("Instagram", "YouTube")}
+        if pairs == expected and len(results) == 4 and len({c["id"] for c in results}) == 4:
+            log_result("Stream Fan-out", "PASS", f"{len(results)} results: {sorted(pairs)}")
+        else:
+            log_result("Stream Fan-out", "FAIL", f"Unexpected results: {sorted(pairs)} ({len(results)} lines)")
+            return False
+    except Exception as e:
+        log_result("Stream Fan-out", "FAIL", f"Error: {str(e)}")
+        return False
+
+    # Step 3: The last line reports the inserts
+    print("\n3️⃣ Checking the done event...")
+    done = events[-1]
+    if done.get("event") == "done" and done.get("success") and sorted(done.get("inserted_ids", [])) == sorted(c["id"] for c in results):
+        log_result("Done Event", "PASS", f"Inserted {done['inserted']} docs")
+    else:
+        log_result("Done Event", "FAIL", f"Unexpected final line: {done}")
+        return False
+
+    # Success!
+    print("\n" + "=" * 60)
+    print("🎉 SMOKE TEST COMPLETED SUCCESSFULLY!")
+    print("✅ Empty fan-out rejected")
+    print("✅ One streamed result per content type / platform pair")
+    print("✅ All docs inserted")
+    print("=" * 60)
+    return True
+
+def main():
+    """Run the smoke test"""
+    success = smoke_test_content_fanout()
+
+    if success:
+        print("\n✅ Content fan-out working correctly!")
+        return 0
+    else:
+        print("\n❌ Content fan-out has issues!")
+        return 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -18,12 +18,16 @@ const STATUS_COLORS = {
   'Optimized': '#8b5cf6'
 }
 
+// Stop polling a Canva batch that makes no progress for this long
+const CANVA_STALL_MS = 120000
+
 export default function Approvals() {
   const [activeTab, setActiveTab] = useState('campaign')
   const [items, setItems] = useState([])
   const [isLoading, setIsLoading] = useState(false)
   const [error, setError] = useState('')
   const [selectedItem, setSelectedItem] = useState(null)
+  const [canvaProgress, setCanvaProgress] = useState('')
   const [approvalFilters, setApprovalFilters] = useState({
     geo: '',
     language: [],
@@ -71,6 +75,40 @@ export default function Approvals() {
     }
   }
 
+  // One batch call for every approved item in the tab; progress is polled until done
+  const generateCanvaBatch = async () => {
+    const approved = items.filter(item => item.status === 'Approved')
+    if (approved.length === 0) return
+    try {
+      const variable_sets = approved.map(item => ({ title: item.campaign_name || item.name || 'Aavana', budget: item.budget || '' }))
+      const res = await api.post('/api/canva/designs/batch', { template_id: 'demo_template', variable_sets })
+      let batch = res.data.batch
+      let processed = batch.done + batch.failed
+      let lastProgressAt = Date.now()
+      while (batch.status === 'running') {
+        // The server fails orphaned batches; this only guards against a batch that stops moving anyway
+        if (Date.now() - lastProgressAt > CANVA_STALL_MS) {
+          setCanvaProgress(`Canva batch stalled at ${processed}/${batch.unique}; try again`)
+          return
+        }
+        setCanvaProgress(`Canva: ${processed}/${batch.unique} rendered`)
+        await new Promise(r => setTimeout(r, 1000))
+        batch = (await api.get(`/api/canva/batches/${batch.id}?include_results=false`)).data.batch
+        if (batch.done + batch.failed !== processed) {
+          processed = batch.done + batch.failed
+          lastProgressAt = Date.now()
+        }
+      }
+      if (batch.status === 'failed') {
+        setCanvaProgress(`Canva batch failed after ${batch.done} designs: ${batch.error || 'unknown error'}`)
+        return
+      }
+      setCanvaProgress(`Canva: ${batch.done} designs ready${batch.failed ? `, ${batch.failed} failed` : ''}`)
+    } catch (err) {
+      setCanvaProgress('Failed to generate Canva designs')
+    }
+  }
+
   const handleLanguageToggle = (lang) => {
     setApprovalFilters(prev => ({
       ...prev,
@@ -150,15 +188,19 @@ export default function Approvals() {
                 onClick={async (e) => {
                   e.stopPropagation()
                   try {
-                    const payload = { message: `Publishing: ${item.campaign_name || item.name || 'Approved Item'}`, image_url: undefined, page_id: undefined }
-                    const res = await api.post('/api/meta/posts/publish', payload)
-                    alert(`Meta mock published: ${res.data.id}`)
+                    const res = await api.post('/api/publish/schedule', { item_type: activeTab, item_ids: [item.id] })
+                    const post = res.data.scheduled[0]
+                    if (post) {
+                      alert(`Scheduled for Meta at ${new Date(post.due_at).toLocaleString()} (${post.status})`)
+                    } else {
+                      alert(`Not scheduled: ${res.data.skipped[0]?.reason || 'unknown reason'}`)
+                    }
                   } catch (err) {
-                    alert('Failed to mock publish to Meta')
+                    alert('Failed to schedule Meta post')
                   }
                 }}
               >
-                Publish to Meta (mock)
+                Schedule on Meta
               </button>
               <button
                 className="preview-btn"
@@ -203,6 +245,13 @@ export default function Approvals() {
 
       {error && <div className="error-message">{error}</div>}
 
+      {items.some(item => item.status === 'Approved') && (
+        <div style={{display:'flex', gap:8, alignItems:'center', margin:'8px 0'}}>
+          <button className="preview-btn" onClick={generateCanvaBatch}>Generate Canva Designs for Approved</button>
+          {canvaProgress && <span>{canvaProgress}</span>}
+        </div>
+      )}
+
       <div className="items-container">
         {isLoading ? (
           <div className="loading">Loading items...</div>
@@ -1,4 +1,4 @@
-import React, { useState } from 'react'
+import React, { useState, useEffect, useRef } from 'react'
 import { api, AI_ENABLED } from '../api'
 
 const CHANNELS = [
@@ -51,6 +51,33 @@ export default function Campaigns() {
     }
   })
   const [budgetSplits, setBudgetSplits] = useState({})
+  const [reach, setReach] = useState(null)
+  // One Idempotency-Key per submission; retries of the same form reuse it so the server replays instead of duplicating
+  const idemKey = useRef(null)
+  const idemHeaders = () => {
+    if (!idemKey.current) idemKey.current = (crypto.randomUUID ? crypto.randomUUID() : `${Date.now()}-${Math.random()}`)
+    return { headers: { 'Idempotency-Key': idemKey.current } }
+  }
+  useEffect(() => { idemKey.current = null }, [formData, budgetSplits])
+
+  // Live audience estimate (local bitmap index, debounced while tuning filters)
+  useEffect(() => {
+    const t = formData.targeting
+    const payload = {}
+    Object.entries(t).forEach(([k, v]) => {
+      if (k === 'schedule') return
+      if (Array.isArray(v) ? v.length : v !== '') payload[k] = (k === 'age_min' || k === 'age_max') ? parseInt(v, 10) : v
+    })
+    const timer = setTimeout(async () => {
+      try {
+        const res = await api.post('/api/targeting/estimate', payload)
+        setReach(res.data)
+      } catch (err) {
+        setReach(null)
+      }
+    }, 250)
+    return () => clearTimeout(timer)
+  }, [formData.targeting])
 
   const computeTrackingUrl = () => {
     const { base_url, source, medium, campaign, term, content } = formData.utm || {}
@@ -117,7 +144,7 @@ export default function Campaigns() {
         budget: totalBudget,
         budget_splits: budgetSplits
       }
-      const response = await api.post('/api/ai/optimize-campaign', campaignData)
+      const response = await api.post('/api/ai/optimize-campaign', campaignData, idemHeaders())
       setCampaign(response.data.campaign)
     } catch (err) {
       setError(err.response?.data?.detail || 'Failed to optimize campaign')
@@ -156,7 +183,7 @@ export default function Campaigns() {
           ai_optimization: '(AI pending — created manually)'
         }
       }
-      const res = await api.post('/api/marketing/save', payload)
+      const res = await api.post('/api/marketing/save', payload, idemHeaders())
       setSuccess('Campaign saved for approval successfully.')
       setCampaign(res.data.item)
     } catch (err) {
@@ -268,6 +295,12 @@ export default function Campaigns() {
           </div>
 
           {/* Targeting Filters */}
+        {reach && (
+          <div className="form-group">
+            <label>Estimated Reach: {reach.estimated_reach.toLocaleString()} ({reach.reach_low.toLocaleString()}–{reach.reach_high.toLocaleString()})</label>
+            {reach.unknown_values?.length > 0 && <small>Unknown values: {reach.unknown_values.join(', ')}</small>}
+          </div>
+        )}
         <div className="form-group">
           <label>Demographics</label>
           <div className="form-grid">
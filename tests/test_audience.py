@@ -0,0 +1,51 @@
+import numpy as np
+import pytest
+
+from audience_service import build_synthetic, load_table
+
+AGES = np.array([18, 25, 25, 40, 64, 30, 70, 13] * 10)
+STATE = np.array([0, 0, 1, 1, 2, -1, 0, 1] * 10)
+TRAVEL = np.array([1, 0, 1, 1, 0, 0, 1, 0] * 10, dtype=bool)
+FOOD = np.array([0, 1, 1, 0, 0, 1, 0, 0] * 10, dtype=bool)
+
+
+@pytest.fixture(scope="module")
+def index(tmp_path_factory):
+    path = tmp_path_factory.mktemp("aud") / "table.npz"
+    np.savez(path, age=AGES, population=np.array(800),
+             states__values=np.array(["Goa", "Kerala", "Delhi"]), states__codes=STATE,
+             interests__values=np.array(["Travel", "Food"]), interests__0=TRAVEL, interests__1=FOOD)
+    return load_table(str(path))
+
+
+def reach(index, **filters):
+    return index.estimate(filters)["estimated_reach"]
+
+
+def test_estimates_match_row_counts(index):
+    scale = 800 / len(AGES)
+    assert reach(index) == 800
+    assert reach(index, age_min=25, age_max=40) == int(((AGES >= 25) & (AGES <= 40)).sum() * scale)
+    assert reach(index, states=["goa", "Delhi"]) == int(np.isin(STATE, [0, 2]).sum() * scale)
+    both = (STATE == 1) & (TRAVEL | FOOD) & (AGES >= 20)
+    assert reach(index, states=["Kerala"], interests=["Travel", "Food"], age_min="20") == int(both.sum() * scale)
+
+
+def test_ages_are_clamped_and_empty_ranges_match_nothing(index):
+    assert reach(index, age_min=5, age_max=99) == 800
+    assert reach(index, age_min=50, age_max=30) == 0
+
+
+def test_unknown_values_are_reported_and_funnel_narrows(index):
+    out = index.estimate({"states": ["Goa", "Atlantis"], "interests": ["Travel"]})
+    assert out["unknown_values"] == ["states:Atlantis"]
+    assert [f["filter"] for f in out["funnel"]] == ["states", "interests"]
+    assert out["funnel"][0]["estimated_reach"] >= out["funnel"][1]["estimated_reach"] == out["estimated_reach"]
+    assert out["reach_low"] <= out["estimated_reach"] <= out["reach_high"]
+
+
+def test_most_specific_geo_level_wins():
+    idx = build_synthetic(n_rows=4096, population=4096)
+    assert reach(idx, states=["Delhi"], cities=["Mumbai"]) == reach(idx, cities=["Mumbai"])
+    assert reach(idx, cities=["Mumbai"]) <= reach(idx, states=["Maharashtra"])
+    assert "Mumbai" in idx.vocabulary()["cities"]
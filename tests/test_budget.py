@@ -0,0 +1,47 @@
+import numpy as np
+import pytest
+
+from budget_service import GENERIC_CURVE, _solve, allocate, allocation_summary, channel_curves
+
+
+def test_solve_spends_the_budget_and_equalizes_marginal_value():
+    cap = np.array([4000.0, 800.0, 1200.0])
+    scale = cap * np.array([18.0, 65.0, 2.5])
+    value = np.array([0.045, 0.05, 0.035])
+    x = _solve(60_000, cap, scale, value)
+    assert x.sum() == pytest.approx(60_000)
+    assert (x >= 0).all()
+    marginal = value * cap / scale * np.exp(-x / scale)
+    funded = x > 1
+    assert np.ptp(marginal[funded]) / marginal[funded].max() < 1e-3
+    # Unfunded channels are not worth their first rupee
+    assert (marginal[~funded] <= marginal[funded].min() * (1 + 1e-3)).all()
+
+
+def test_solve_zero_budget():
+    assert _solve(0, np.ones(2), np.ones(2), np.ones(2)).tolist() == [0.0, 0.0]
+
+
+def test_allocate_plan_is_consistent():
+    plan = allocate(["google_ads", "facebook_ads", "google_ads", "custom"], 300_000, 30)
+    assert [c["channel"] for c in plan["channels"]] == ["google_ads", "facebook_ads", "custom"]
+    assert sum(c["total_budget"] for c in plan["channels"]) == pytest.approx(300_000, abs=1)
+    assert sum(c["share"] for c in plan["channels"]) == pytest.approx(1, abs=1e-3)
+    assert len(plan["daily_plan"]) == 30
+    assert plan["channels"][2]["curve"] == GENERIC_CURVE
+    assert all(0 <= c["saturation"] < 1 for c in plan["channels"])
+    assert "google_ads" in allocation_summary(plan)
+
+
+def test_more_budget_means_diminishing_clicks():
+    small = allocate(["google_ads"], 30_000, 30, optimize_for="clicks")
+    large = allocate(["google_ads"], 3_000_000, 30, optimize_for="clicks")
+    assert large["expected_clicks"] < 100 * small["expected_clicks"]
+    assert large["blended_cpc"] > small["blended_cpc"]
+
+
+def test_overrides_and_empty_plan():
+    curves = channel_curves(["google_ads"], {"google_ads": {"cpc": 30.0, "cvr": None}})
+    assert curves["google_ads"]["cpc"] == 30.0 and curves["google_ads"]["cvr"] == 0.045
+    assert allocate([], 1000, 0) == {"channels": [], "daily_plan": [], "total_budget": 1000, "duration_days": 1,
+                                     "optimize_for": "conversions"}
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+import canva_service
+from canva_service import ABANDONED_ERROR, CanvaBatchRenderer, MockCanvaBackend, variables_hash
+
+
+class FakeBatches:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def find_one(self, q, projection=None):
+        return next((dict(d) for d in self.docs if d["id"] == q["id"]), None)
+
+    async def update_one(self, q, update):
+        for d in self.docs:
+            if all(d.get(k) == v for k, v in q.items()):
+                d.update(update["$set"])
+
+                class Result:
+                    modified_count = 1
+
+                return Result()
+
+        class Missed:
+            modified_count = 0
+
+        return Missed()
+
+
+class FakeDesigns:
+    def find(self, q):
+        class Cursor:
+            async def to_list(self, length=None):
+                return []
+
+        return Cursor()
+
+
+def make(batch):
+    db = {canva_service.BATCHES_COLLECTION: FakeBatches([batch]), canva_service.DESIGNS_COLLECTION: FakeDesigns()}
+
+    async def get_db():
+        return db
+
+    return CanvaBatchRenderer(get_db, MockCanvaBackend()), db
+
+
+def batch_doc(heartbeat_age: float):
+    now = time.time()
+    return {"id": "b1", "template_id": "t", "keys": ["k1", "k2"], "total": 2, "unique": 2, "cached": 0, "done": 1,
+            "failed": 0, "status": "running", "created_at": now - 600, "heartbeat_at": now - heartbeat_age}
+
+
+def test_orphaned_batch_is_reported_failed():
+    renderer, db = make(batch_doc(heartbeat_age=canva_service.STALE_SECONDS + 5))
+    batch = asyncio.run(renderer.get("b1"))
+    assert batch["status"] == "failed" and batch["error"] == ABANDONED_ERROR
+    assert db[canva_service.BATCHES_COLLECTION].docs[0]["status"] == "failed"
+    assert [r["status"] for r in batch["results"]] == ["pending", "pending"]
+
+
+def test_slow_but_alive_batch_keeps_running():
+    renderer, _ = make(batch_doc(heartbeat_age=1))
+    batch = asyncio.run(renderer.get("b1", include_results=False))
+    assert batch["status"] == "running" and batch["progress"] == 0.5
+
+
+def test_variables_hash_ignores_key_order():
+    assert variables_hash("t", {"a": 1, "b": 2}) == variables_hash("t", {"b": 2, "a": 1})
+    assert variables_hash("t", {"a": 1}) != variables_hash("u", {"a": 1})
@@ -0,0 +1,170 @@
+import asyncio
+
+import pytest
+
+import circuit_breaker_service as cb
+from circuit_breaker_service import CLOSED, HALF_OPEN, OPEN, BreakerRegistry, CircuitBreaker, CircuitOpenError
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    c = Clock()
+    monkeypatch.setattr(cb.time, "monotonic", c.monotonic)
+    return c
+
+
+async def ok():
+    return "ok"
+
+
+async def boom():
+    raise RuntimeError("provider down")
+
+
+def run(breaker, fn):
+    return asyncio.run(breaker.call(fn))
+
+
+def fail(breaker, n):
+    for _ in range(n):
+        with pytest.raises(RuntimeError):
+            run(breaker, boom)
+
+
+def test_opens_on_error_rate_and_rejects(clock):
+    breaker = CircuitBreaker("openai:gpt-5")
+    fail(breaker, cb.MIN_CALLS - 1)
+    assert breaker.state == CLOSED  # too few calls to judge
+    fail(breaker, 1)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        run(breaker, ok)
+    snap = breaker.snapshot()
+    assert snap["rejected"] == 1 and snap["last_error"] == "RuntimeError: provider down"
+
+
+def test_half_open_probe_closes_or_reopens(clock):
+    breaker = CircuitBreaker("b")
+    fail(breaker, cb.MIN_CALLS)
+    clock.now += cb.OPEN_SECONDS
+    fail(breaker, 1)  # failed probe
+    assert breaker.state == OPEN and breaker.opened_at == clock.now
+    clock.now += cb.OPEN_SECONDS
+    assert run(breaker, ok) == "ok"
+    assert breaker.state == CLOSED and breaker.snapshot()["window_calls"] == 0
+
+
+def test_only_one_probe_in_flight(clock):
+    breaker = CircuitBreaker("b")
+    fail(breaker, cb.MIN_CALLS)
+    clock.now += cb.OPEN_SECONDS
+    gate = asyncio.Event()
+
+    async def slow():
+        await gate.wait()
+        return "probe"
+
+    async def scenario():
+        probe = asyncio.create_task(breaker.call(slow))
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(ok)
+        gate.set()
+        return await probe
+
+    assert asyncio.run(scenario()) == "probe" and breaker.state == CLOSED
+
+
+def test_call_admitted_while_closed_is_not_taken_as_the_probe(clock):
+    breaker = CircuitBreaker("b")
+    straggler_gate, probe_gate = asyncio.Event(), asyncio.Event()
+
+    async def straggler():
+        await straggler_gate.wait()
+        return "late"
+
+    async def probe():
+        await probe_gate.wait()
+        raise RuntimeError("still down")
+
+    async def scenario():
+        late = asyncio.create_task(breaker.call(straggler))
+        await asyncio.sleep(0)
+        for _ in range(cb.MIN_CALLS):
+            with pytest.raises(RuntimeError):
+                await breaker.call(boom)
+        assert breaker.state == OPEN
+        clock.now += cb.OPEN_SECONDS
+        probing = asyncio.create_task(breaker.call(probe))
+        await asyncio.sleep(0)
+        assert breaker.state == HALF_OPEN
+        straggler_gate.set()
+        assert await late == "late"
+        # The old success neither closed the breaker nor freed the probe slot
+        assert breaker.state == HALF_OPEN
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(ok)
+        probe_gate.set()
+        with pytest.raises(RuntimeError):
+            await probing
+
+    asyncio.run(scenario())
+    assert breaker.state == OPEN
+
+
+def test_slow_calls_open_the_breaker(clock):
+    breaker = CircuitBreaker("b")
+    gate = asyncio.Event()
+
+    async def slow():
+        await gate.wait()
+        return "late"
+
+    async def scenario():
+        calls = [asyncio.create_task(breaker.call(slow)) for _ in range(cb.MIN_CALLS)]
+        await asyncio.sleep(0)
+        clock.now += cb.SLOW_CALL_SECONDS
+        gate.set()
+        return await asyncio.gather(*calls)
+
+    assert asyncio.run(scenario()) == ["late"] * cb.MIN_CALLS
+    assert breaker.state == OPEN
+
+
+def test_cancellation_is_not_a_failure(clock):
+    breaker = CircuitBreaker("b")
+
+    async def scenario():
+        for _ in range(cb.MIN_CALLS):
+            task = asyncio.create_task(breaker.call(lambda: asyncio.sleep(10)))
+            await asyncio.sleep(0)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+
+    asyncio.run(scenario())
+    assert breaker.state == CLOSED and breaker.snapshot()["window_calls"] == 0
+
+
+def test_old_calls_leave_the_window(clock):
+    breaker = CircuitBreaker("b")
+    fail(breaker, cb.MIN_CALLS - 1)
+    clock.now += cb.WINDOW_SECONDS + 1
+    fail(breaker, 1)
+    assert breaker.state == CLOSED
+
+
+def test_registry_keys_by_provider_and_model():
+    registry = BreakerRegistry()
+    assert registry.get("openai", "gpt-5") is registry.get("openai", "gpt-5")
+    assert registry.get("openai", "gpt-5-mini") is not registry.get("openai", "gpt-5")
+    assert set(registry.snapshot()) == {"openai:gpt-5", "openai:gpt-5-mini"}
@@ -0,0 +1,141 @@
+import asyncio
+import time
+
+import pytest
+from pymongo import _csot
+
+import deadline_service
+from deadline_service import DeadlineExceeded, DeadlineMiddleware, budget, remaining, route_default
+
+
+async def call(app, path="/api/x", headers=()):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": path, "headers": list(headers)}
+    await DeadlineMiddleware(app)(scope, receive, send)
+    return sent
+
+
+def recording_app(seen):
+    async def app(scope, receive, send):
+        seen.append((remaining(), _csot.remaining()))
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    return app
+
+
+@pytest.mark.parametrize("path,expected", [
+    ("/api/campaigns", deadline_service.DEFAULT_SECONDS),
+    ("/api/ai/generate-strategy", deadline_service.ROUTE_DEFAULTS["/api/ai/"]),
+    ("/api/ai/generate-content/fanout", deadline_service.ROUTE_DEFAULTS["/api/ai/generate-content/fanout"]),
+])
+def test_route_defaults_longest_prefix_wins(path, expected):
+    assert route_default(path) == expected
+    seen = []
+    asyncio.run(call(recording_app(seen), path))
+    left, mongo_left = seen[0]
+    assert expected - 1 < left <= expected
+    assert expected - 1 < mongo_left <= expected  # pymongo derives maxTimeMS from the same budget
+
+
+@pytest.mark.parametrize("header,expected", [
+    (b"2.5", 2.5),
+    (b"100000", deadline_service.MAX_SECONDS),  # clamped
+    (b"0", deadline_service.DEFAULT_SECONDS),  # invalid values fall back to the route default
+    (b"-3", deadline_service.DEFAULT_SECONDS),
+    (b"soon", deadline_service.DEFAULT_SECONDS),
+])
+def test_header_overrides_and_is_clamped(header, expected):
+    seen = []
+    asyncio.run(call(recording_app(seen), headers=[(b"x-request-timeout", header)]))
+    assert expected - 1 < seen[0][0] <= expected
+
+
+def test_outside_a_request_there_is_no_budget():
+    assert remaining() is None
+    assert budget(12.0) == 12.0
+
+
+def test_budget_in_nested_calls():
+    seen = {}
+
+    async def llm_call():
+        await asyncio.sleep(0.2)
+        seen["inner"] = (remaining(), budget(60.0), budget(0.1))
+
+    async def app(scope, receive, send):
+        seen["outer"] = budget(60.0)
+        await asyncio.gather(llm_call())  # child tasks inherit the deadline
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    asyncio.run(call(app, headers=[(b"x-request-timeout", b"1")]))
+    left, capped, small = seen["inner"]
+    assert seen["outer"] <= 1 and left < seen["outer"] - 0.15
+    assert capped == pytest.approx(left, abs=0.01) and small == 0.1
+    assert remaining() is None  # reset after the request
+
+
+def test_exhausted_budget_raises():
+    async def app(scope, receive, send):
+        deadline_service._deadline.set(time.monotonic() - 0.01)
+        with pytest.raises(DeadlineExceeded) as e:
+            budget(5.0)
+        assert e.value.status_code == 504
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+
+    asyncio.run(call(app))
+
+
+def test_slow_app_gets_504():
+    async def app(scope, receive, send):
+        await asyncio.sleep(5)
+
+    sent = asyncio.run(call(app, headers=[(b"x-request-timeout", b"0.05")]))
+    assert sent[0]["status"] == 504 and b"deadline" in sent[1]["body"]
+
+
+def test_5xx_after_the_budget_ran_out_becomes_504():
+    def app_failing(after):
+        async def app(scope, receive, send):
+            await asyncio.sleep(after)
+            await send({"type": "http.response.start", "status": 500, "headers": []})
+            await send({"type": "http.response.body", "body": b"boom"})
+
+        return app
+
+    # The dependency gave up because the budget was spent: 504
+    sent = asyncio.run(call(_late(app_failing(0)), headers=[(b"x-request-timeout", b"0.05")]))
+    assert sent[0]["status"] == 504
+    # A genuine failure with time left stays a 500
+    sent = asyncio.run(call(app_failing(0), headers=[(b"x-request-timeout", b"5")]))
+    assert sent[0]["status"] == 500
+
+
+def _late(app):
+    """Busy-waits past the deadline without yielding, so wait_for cannot cancel before the 500 is sent"""
+    async def wrapped(scope, receive, send):
+        end = time.monotonic() + 0.1
+        while time.monotonic() < end:
+            pass
+        await app(scope, receive, send)
+
+    return wrapped
+
+
+def test_streaming_response_is_cut_without_a_second_start():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"part", "more_body": True})
+        await asyncio.sleep(5)
+
+    sent = asyncio.run(call(app, headers=[(b"x-request-timeout", b"0.05")]))
+    assert [m["type"] for m in sent] == ["http.response.start", "http.response.body"]
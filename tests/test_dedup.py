@@ -0,0 +1,77 @@
+import asyncio
+
+from dedup_service import ContentDeduplicator, content_text, fingerprint, hamming64, jaccard_estimate
+
+
+class FakeFingerprints:
+    """Just enough of a Motor collection for find_similar/index"""
+
+    def __init__(self):
+        self.docs = []
+
+    async def create_index(self, *args, **kwargs):
+        pass
+
+    def find(self, q, projection=None):
+        docs = [
+            d for d in self.docs
+            if d["item_type"] == q["item_type"] and d["kind"] == q["kind"]
+            and set(d["bands"]) & set(q["bands"]["$in"])
+            and d["item_id"] != (q.get("item_id") or {}).get("$ne")
+        ]
+
+        class Cursor:
+            async def to_list(self, length=None):
+                return docs
+
+        return Cursor()
+
+    async def update_one(self, q, update, upsert=False):
+        self.docs = [d for d in self.docs if any(d[k] != v for k, v in q.items())]
+        self.docs.append({**q, **update["$set"]})
+
+
+def make_dedup():
+    coll = FakeFingerprints()
+    return ContentDeduplicator({"marketing_fingerprints": coll}), coll
+
+
+TEXT = "Monsoon garden makeover: five balcony plants that thrive in Mumbai humidity, with a quick care routine"
+
+
+def test_fingerprint_similarity():
+    a, b = fingerprint(TEXT), fingerprint(TEXT + " today")
+    c = fingerprint("Completely different copy about diwali lighting offers for office lobbies and reception areas")
+    assert jaccard_estimate(a["minhash"], b["minhash"]) > 0.6
+    assert jaccard_estimate(a["minhash"], c["minhash"]) < 0.2
+    assert hamming64(int(a["simhash"], 16), int(a["simhash"], 16)) == 0
+
+
+def test_docs_without_text_are_neither_flagged_nor_indexed():
+    dedup, coll = make_dedup()
+
+    async def run():
+        first = await dedup.check_and_index({"id": "a", "platform": "Instagram"}, "reel")
+        second = await dedup.check_and_index({"id": "b", "ai_content": "   "}, "reel")
+        return first, second
+
+    assert asyncio.run(run()) == ({}, {})
+    assert coll.docs == []
+
+
+def test_content_text_falls_back_to_brief_fields():
+    assert content_text({"ai_content": "", "brief": "Terrace garden", "budget": 500}) == "Terrace garden"
+
+
+def test_check_does_not_index_until_stored():
+    dedup, coll = make_dedup()
+
+    async def run():
+        fields, fp = await dedup.check({"id": "a", "ai_content": TEXT}, "reel")
+        assert coll.docs == [] and "near_duplicate_of" not in fields
+        await dedup.index("a", "reel", fp)
+        return await dedup.check({"id": "b", "ai_content": TEXT}, "reel")
+
+    fields, _ = asyncio.run(run())
+    assert fields["near_duplicate_of"] == "a"
+    assert fields["duplicate_similarity"] == 1.0
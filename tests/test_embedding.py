@@ -0,0 +1,63 @@
+import asyncio
+import time
+
+import numpy as np
+
+import embedding_service
+from deadline_service import _deadline, remaining
+from embedding_service import EmbeddingIndex, embed
+
+
+def make_index(tmp_path, get_db=None):
+    async def no_db():
+        raise RuntimeError("no db")
+
+    return EmbeddingIndex(get_db or no_db, {"strategy": "marketing_strategies", "reel": "marketing_reels"},
+                          path=str(tmp_path / "e.npz"))
+
+
+STRATEGY = {"industry": "Landscaping", "target_audience": "villa owners in Pune", "goals": ["leads", "awareness"],
+            "budget": "50000"}
+
+
+def test_embed_is_normalised_and_deterministic():
+    a, b = embed("terrace garden ideas"), embed("terrace garden ideas")
+    assert np.allclose(a, b) and abs(float(np.linalg.norm(a)) - 1) < 1e-5
+    assert not embed("").any()
+
+
+def test_strategy_reuse_stays_within_company(tmp_path):
+    index = make_index(tmp_path)
+    index.synced_at = time.monotonic()  # no Mongo catch-up during the test
+
+    async def run():
+        index.add("strategy", {"id": "s1", "company_name": "Other Co", **STRATEGY})
+        miss = index.best("strategy", {"company_name": "Aavana", **STRATEGY})
+        index.add("strategy", {"id": "s2", "company_name": "Aavana", **STRATEGY})
+        hit = index.best("strategy", {"company_name": "aavana ", **STRATEGY})
+        content = index.best("reel", {"platform": "Instagram", "brief": "x"})
+        return miss, hit, content
+
+    miss, hit, content = asyncio.run(run())
+    assert miss is None
+    assert hit["id"] == "s2" and hit["score"] > 0.99
+    assert content is None
+
+
+def test_background_sync_escapes_request_deadline(tmp_path, monkeypatch):
+    seen = []
+
+    async def get_db():
+        seen.append(remaining())
+        return {"marketing_strategies": [], "marketing_reels": []}
+
+    index = make_index(tmp_path, get_db)
+    monkeypatch.setattr(embedding_service, "SYNC_SECONDS", 0)
+
+    async def request():
+        _deadline.set(time.monotonic() - 1)  # this request's budget is already spent
+        index.search("strategy", "garden")
+        await index._sync_task
+
+    asyncio.run(request())
+    assert seen == [None]
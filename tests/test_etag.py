@@ -0,0 +1,101 @@
+import asyncio
+import itertools
+
+import pytest
+
+from etag_service import COLLECTION, VersionStamps, etag_matches
+
+
+@pytest.mark.parametrize("header,tag,expected", [
+    (None, 'W/"abc"', False),
+    ("", 'W/"abc"', False),
+    ("*", 'W/"abc"', True),
+    ('W/"abc"', 'W/"abc"', True),
+    ('"abc"', 'W/"abc"', True),  # weak comparison ignores the W/ prefix
+    ('W/"x", W/"abc"', 'W/"abc"', True),
+    ('W/"abcd"', 'W/"abc"', False),
+])
+def test_etag_matches(header, tag, expected):
+    assert etag_matches(header, tag) is expected
+
+
+class FakeStamps:
+    """collection_versions with upsert/$inc semantics; counts reads"""
+
+    epochs = itertools.count()
+
+    def __init__(self):
+        self.docs = {}
+        self.finds = 0
+
+    async def find_one_and_update(self, q, update, upsert, return_document):
+        doc = self.docs.setdefault(q["_id"], {"_id": q["_id"], "v": 0, "epoch": f"e{next(self.epochs)}"})
+        doc["v"] += update["$inc"]["v"]
+        doc.update(update["$set"])
+        return dict(doc)
+
+    def find(self, q):
+        self.finds += 1
+        rows = [dict(d) for k, d in self.docs.items() if k in q["_id"]["$in"]]
+
+        class Cursor:
+            async def to_list(self, length=None):
+                return rows
+
+        return Cursor()
+
+
+def make(ttl=60.0):
+    coll = FakeStamps()
+
+    async def get_db():
+        return {COLLECTION: coll}
+
+    return VersionStamps(get_db, ttl=ttl), coll
+
+
+def test_etag_changes_on_write_and_with_the_query():
+    stamps, _ = make()
+
+    async def run():
+        before = await stamps.etag(["campaigns"], "list", 1)
+        same = await stamps.etag(["campaigns"], "list", 1)
+        other_query = await stamps.etag(["campaigns"], "list", 2)
+        await stamps.bump("campaigns")
+        after = await stamps.etag(["campaigns"], "list", 1)
+        unrelated = await stamps.etag(["campaigns", "content"], "list", 1)
+        await stamps.bump("content")
+        return before, same, other_query, after, unrelated, await stamps.etag(["campaigns"], "list", 1)
+
+    before, same, other_query, after, unrelated, untouched = asyncio.run(run())
+    assert before == same and before.startswith('W/"')
+    assert len({before, other_query, after}) == 3
+    assert unrelated != after and untouched == after
+
+
+def test_stamps_are_cached_within_the_ttl():
+    stamps, coll = make(ttl=60.0)
+
+    async def run():
+        for _ in range(5):
+            await stamps.stamps(["campaigns", "content"])
+
+    asyncio.run(run())
+    assert coll.finds == 1
+
+
+def test_other_workers_writes_show_up_after_the_ttl():
+    mine, coll = make(ttl=0.0)
+
+    async def get_db():
+        return {COLLECTION: coll}
+
+    other = VersionStamps(get_db, ttl=0.0)
+
+    async def run():
+        before = await mine.etag(["campaigns"])
+        await other.bump("campaigns")
+        return before, await mine.etag(["campaigns"])
+
+    before, after = asyncio.run(run())
+    assert before != after
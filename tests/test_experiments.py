@@ -0,0 +1,131 @@
+import asyncio
+
+import pytest
+
+from experiment_service import COUNTERS, analyze, ingest, new_experiment, normalize_row, parse_csv
+
+
+class FakeCursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    async def to_list(self, length=None):
+        return list(self.docs)
+
+
+class FakeExperiments:
+    def __init__(self, docs):
+        self.docs = {x["id"]: x for x in docs}
+
+    def find(self, q, projection=None):
+        return FakeCursor([x for i, x in self.docs.items() if i in q["id"]["$in"]])
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            doc = self.docs[op._filter["id"]]
+            doc.update(op._doc["$set"])
+            doc["revision"] = doc.get("revision", 0) + op._doc["$inc"]["revision"]
+
+
+class FakeDaily:
+    def __init__(self):
+        self.docs = {}
+
+    async def bulk_write(self, ops, ordered=True):
+        for op in ops:
+            f = op._filter
+            self.docs[(f["experiment_id"], f["variant"], f["date"])] = {**f, **op._doc["$set"]}
+
+    def aggregate(self, pipeline):
+        ids = pipeline[0]["$match"]["experiment_id"]["$in"]
+        sums = {}
+        for d in self.docs.values():
+            if d["experiment_id"] in ids:
+                s = sums.setdefault((d["experiment_id"], d["variant"]), dict.fromkeys(COUNTERS, 0))
+                for c in COUNTERS:
+                    s[c] += d[c]
+        return FakeCursor([{"_id": {"e": e, "v": v}, **s} for (e, v), s in sums.items()])
+
+
+def make_db(*experiments):
+    return {"experiments": FakeExperiments(experiments), "experiment_daily": FakeDaily()}
+
+
+def row(variant, exp="e1", **counts):
+    return normalize_row({"experiment_id": exp, "variant": variant, "date": "2026-10-01", **counts})
+
+
+@pytest.mark.parametrize("value", ["inf", "-inf", "nan", "1e400", "-1", "-0.5"])
+def test_normalize_rejects_non_finite_and_negative_counts(value):
+    with pytest.raises(ValueError):
+        row("A", clicks=value)
+
+
+def test_parse_csv_reports_bad_lines_and_keeps_good_ones():
+    rows, errors = parse_csv(
+        "\ufeffExperiment_ID,variant,impressions,clicks,conversions,date\n"
+        "e1,A,100,10,1,2026-10-01\n"
+        "e1,B,inf,1,0,2026-10-01\n"
+        "e1,B,100,-3,0,2026-10-01\n"
+        ",B,1,1,1,\n"
+    )
+    assert [r["variant"] for r in rows] == ["A"]
+    assert [e.split(":")[0] for e in errors] == ["line 3", "line 4", "line 5"]
+    assert parse_csv("variant,clicks\nA,1\n") == ([], ["missing column(s): experiment_id"])
+
+
+def test_ingest_rejects_unknown_variants_and_concluded_experiments():
+    running = new_experiment("hero", ["A", "B"], "ctr", None, None) | {"id": "e1"}
+    concluded = new_experiment("old", ["A", "B"], "ctr", None, None) | {"id": "e2", "status": "concluded"}
+    db = make_db(running, concluded)
+    report = asyncio.run(ingest(db, [
+        row("A", impressions=100, clicks=5),
+        row("a", impressions=100, clicks=50),  # typo: must not become a third arm
+        row("A", exp="e2", impressions=100, clicks=50),
+        row("A", exp="missing"),
+    ]))
+    assert report["accepted"] == 1 and report["experiments"] == ["e1"]
+    assert report["rejected_unknown_variant"] == 1
+    assert report["rejected_concluded_experiment"] == 1
+    assert report["rejected_unknown_experiment"] == 1
+    assert running["variants"] == ["A", "B"]
+    assert running["totals"] == {"A": {"impressions": 100, "clicks": 5, "conversions": 0}}
+    assert running["revision"] == 1 and concluded["totals"] == {}
+
+
+def test_resending_a_day_replaces_it():
+    exp = new_experiment("hero", ["A", "B"], "ctr", None, None) | {"id": "e1"}
+    db = make_db(exp)
+    asyncio.run(ingest(db, [row("A", impressions=100, clicks=5)]))
+    asyncio.run(ingest(db, [row("A", impressions=200, clicks=7)]))
+    assert exp["totals"]["A"]["clicks"] == 7 and exp["revision"] == 2
+
+
+def _experiment(id_, totals, metric="ctr"):
+    variants = list(totals)
+    return {"id": id_, "metric": metric, "variants": variants, "control": variants[0],
+            "totals": {v: {"impressions": n, "clicks": c} for v, (c, n) in totals.items()}}
+
+
+def test_analyze_calls_a_clear_winner_and_waits_on_small_samples():
+    clear = _experiment("clear", {"A": (500, 10000), "B": (800, 10000)})
+    small = _experiment("small", {"A": (5, 100), "B": (9, 100), "C": (7, 100)})
+    out = {r["experiment_id"]: r for r in analyze([clear, small], draws=4000, seed=1)}
+    assert out["clear"]["decision"] == "stop_winner" and out["clear"]["leader"] == "B"
+    b = out["clear"]["variants"][1]
+    assert b["prob_best"] > 0.99 and 0.4 < b["lift_vs_control"]["p50"] < 0.8
+    assert out["clear"]["variants"][0]["lift_vs_control"] is None
+    assert out["small"]["decision"] == "continue" and not out["small"]["min_sample_met"]
+    # Padded slots of the two-arm experiment never leak into its statistics
+    assert len(out["clear"]["variants"]) == 2
+    assert sum(v["prob_best"] for v in out["clear"]["variants"]) == pytest.approx(1, abs=1e-3)
+
+
+def test_analyze_is_independent_of_chunking(monkeypatch):
+    import experiment_service
+    experiments = [_experiment(f"e{i}", {"A": (50 + i, 1000), "B": (60, 1000)}) for i in range(5)]
+    whole = analyze(experiments, draws=500, seed=3)
+    monkeypatch.setattr(experiment_service, "CHUNK_ELEMENTS", 1000)
+    chunked = analyze(experiments, draws=500, seed=3)
+    assert [r["leader"] for r in whole] == [r["leader"] for r in chunked]
+    assert analyze([]) == []
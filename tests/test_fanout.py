@@ -0,0 +1,126 @@
+import asyncio
+import json
+from types import SimpleNamespace
+
+from pymongo.errors import BulkWriteError
+
+from fanout_service import pairs, stream_fanout
+
+
+class FakeCollection:
+    def __init__(self, fail=None):
+        self.docs = []
+        self.fail = fail
+
+    async def insert_many(self, docs):
+        if self.fail == "all":
+            raise RuntimeError("primary stepped down")
+        if self.fail == "second":
+            self.docs.extend(docs[:1])
+            raise BulkWriteError({"nInserted": 1, "writeErrors": [{"index": 1, "code": 11000}]})
+        self.docs.extend(docs)
+
+
+def sub(content_type, platform, delay=0.0, fail=False):
+    return SimpleNamespace(content_type=content_type, platform=platform, delay=delay, fail=fail)
+
+
+async def build(s):
+    await asyncio.sleep(s.delay)
+    if s.fail:
+        raise RuntimeError("generation failed")
+    return {"id": f"{s.content_type}-{s.platform}", "content_type": s.content_type}
+
+
+def run(subs, collections, concurrency=4, after=None, prepare=None):
+    calls = []
+
+    async def after_insert(key, entries):
+        calls.append((key, [d["id"] for d, _, _ in entries]))
+        if after:
+            raise after
+
+    async def prep(key, doc):
+        if prepare:
+            raise prepare
+        return {"fp": doc["id"]}
+
+    async def go():
+        lines = [json.loads(line) async for line in stream_fanout(
+            subs, build, lambda s: s.content_type, prep, collections, after_insert, concurrency=concurrency)]
+        return lines
+
+    return asyncio.run(go()), calls
+
+
+def test_pairs_dedupe_in_request_order():
+    assert pairs(["reel", "ugc", "reel"], ["IG", "YT", "IG"]) == [("reel", "IG"), ("reel", "YT"), ("ugc", "IG"), ("ugc", "YT")]
+
+
+def test_results_stream_as_completed_and_are_pending_until_done():
+    reel, ugc = FakeCollection(), FakeCollection()
+    lines, calls = run([sub("reel", "IG", 0.05), sub("ugc", "IG", 0.0), sub("reel", "YT", 0.02)],
+                       {"reel": reel, "ugc": ugc})
+    assert [line["content"]["id"] for line in lines[:-1]] == ["ugc-IG", "reel-YT", "reel-IG"]
+    assert all(line["event"] == "result" and line["pending"] for line in lines[:-1])
+    done = lines[-1]
+    assert done["event"] == "done" and done["success"] and done["inserted"] == 3
+    assert sorted(done["inserted_ids"]) == ["reel-IG", "reel-YT", "ugc-IG"] and done["failed_ids"] == []
+    assert len(reel.docs) == 2 and len(ugc.docs) == 1  # one insert_many per collection
+    assert sorted(calls) == [("reel", ["reel-YT", "reel-IG"]), ("ugc", ["ugc-IG"])]
+
+
+def test_failed_pair_reports_an_error_and_the_rest_is_stored():
+    lines, _ = run([sub("reel", "IG", fail=True), sub("reel", "YT")], {"reel": FakeCollection()})
+    assert lines[0] == {"event": "error", "content_type": "reel", "platform": "IG", "error": "generation failed"}
+    assert lines[-1]["inserted_ids"] == ["reel-YT"] and not lines[-1]["success"]
+
+
+def test_failed_collection_does_not_hide_stored_ones():
+    reel, ugc = FakeCollection(), FakeCollection(fail="all")
+    lines, calls = run([sub("reel", "IG"), sub("ugc", "IG")], {"reel": reel, "ugc": ugc})
+    done = lines[-1]
+    assert done["inserted_ids"] == ["reel-IG"] and done["failed_ids"] == ["ugc-IG"]
+    assert not done["success"] and "primary stepped down" in done["errors"][0]
+    assert calls == [("reel", ["reel-IG"])]
+
+
+def test_partial_bulk_insert_reports_exact_ids():
+    lines, calls = run([sub("reel", "IG"), sub("reel", "YT", 0.01)], {"reel": FakeCollection(fail="second")})
+    assert lines[-1]["inserted_ids"] == ["reel-IG"] and lines[-1]["failed_ids"] == ["reel-YT"]
+    assert calls == [("reel", ["reel-IG"])]
+
+
+def test_prepare_failure_still_ends_with_done():
+    lines, _ = run([sub("reel", "IG")], {"reel": FakeCollection()}, prepare=RuntimeError("dedup down"))
+    assert [line["event"] for line in lines] == ["error", "done"]
+    assert lines[-1]["inserted"] == 0
+
+
+def test_post_insert_failure_keeps_inserted_ids():
+    lines, _ = run([sub("reel", "IG")], {"reel": FakeCollection()}, after=RuntimeError("stamp bump failed"))
+    assert lines[-1]["inserted_ids"] == ["reel-IG"] and not lines[-1]["success"]
+
+
+def test_disconnect_cancels_outstanding_generation():
+    started, finished = [], []
+
+    async def slow_build(s):
+        started.append(s.platform)
+        await asyncio.sleep(0 if s.platform == "fast" else 5)
+        finished.append(s.platform)
+        return {"id": s.platform}
+
+    async def noop(*args):
+        return None
+
+    async def go():
+        stream = stream_fanout([sub("reel", "fast"), sub("reel", "slow")], slow_build, lambda s: "reel",
+                               noop, {"reel": FakeCollection()}, noop)
+        first = await stream.__anext__()
+        await stream.aclose()  # client went away
+        await asyncio.sleep(0)
+        return json.loads(first)
+
+    first = asyncio.run(go())
+    assert first["content"]["id"] == "fast" and finished == ["fast"] and started == ["fast", "slow"]
@@ -0,0 +1,136 @@
+import asyncio
+from datetime import date
+from types import SimpleNamespace
+
+from pymongo.errors import DuplicateKeyError
+
+import festival_service
+from festival_service import FestivalPregenerator, cache_key, calendar_exhausted, occurrence, plan
+
+
+class FakeJobs:
+    """Single-document collection with Mongo's upsert semantics for the lease filter"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _matches(self, doc, q):
+        for field, cond in q.items():
+            value = doc.get(field)
+            if isinstance(cond, dict):
+                if not value < cond["$lt"]:
+                    return False
+            elif value != cond:
+                return False
+        return True
+
+    async def update_one(self, q, update, upsert=False):
+        doc = self.docs.get(q["_id"])
+        if doc is not None and self._matches(doc, q):
+            if "$inc" in update:
+                for field, n in update["$inc"].items():
+                    doc[field] = doc.get(field, 0) + n
+            doc.update(update.get("$set", {}))
+            return SimpleNamespace(matched_count=1)
+        if upsert:
+            if doc is not None:
+                raise DuplicateKeyError("E11000 duplicate key")
+            self.docs[q["_id"]] = {"_id": q["_id"], **update.get("$set", {}), **update.get("$inc", {})}
+        return SimpleNamespace(matched_count=0)
+
+    async def find_one(self, q):
+        return self.docs.get(q["_id"])
+
+
+CALENDAR = [("Diwali", date(2026, 11, 8))]
+
+
+def make(cache=None):
+    db = {festival_service.JOBS_COLLECTION: FakeJobs(), festival_service.CACHE_COLLECTION: FakeJobs()}
+    db[festival_service.CACHE_COLLECTION].docs = cache or {}
+
+    async def get_db():
+        return db
+
+    async def generate(params):
+        return "ideas", {"prompt_tokens": 10, "completion_tokens": 20}
+
+    return FestivalPregenerator(get_db, generate), db
+
+
+def test_lease_excludes_second_run_in_same_process():
+    pregen, db = make()
+
+    async def run():
+        first = await pregen._acquire(db)
+        second = await pregen._acquire(db)
+        await pregen._release(db, first)
+        third = await pregen._acquire(db)
+        return first, second, third
+
+    first, second, third = asyncio.run(run())
+    assert first and third and first != third
+    assert second is None
+
+
+def test_lookup_requires_exact_industry(monkeypatch):
+    monkeypatch.setattr(festival_service, "load_calendar", lambda: CALENDAR)
+    monkeypatch.setattr(festival_service, "local_today", lambda: date(2026, 10, 25))
+    day = occurrence(CALENDAR, "Diwali", date(2026, 10, 25))
+    key = cache_key("Diwali", day, "Instagram", "reel", "Landscaping")
+    pregen, _ = make({key: {"_id": key, "ai_content": "Diwali for a Landscaping brand"}})
+
+    async def run():
+        return (
+            await pregen.lookup("Diwali", "Instagram", "reel", "Landscaping"),
+            await pregen.lookup("Diwali", "Instagram", "reel", None),
+            await pregen.lookup("Diwali", "Instagram", "reel", "Real Estate"),
+        )
+
+    exact, missing, other = asyncio.run(run())
+    assert exact["ai_content"].endswith("Landscaping brand")
+    assert missing is None and other is None
+
+
+def test_plan_only_covers_lookahead_window():
+    entries = plan(CALENDAR, date(2026, 10, 25))
+    assert entries and all(e["festival"] == "Diwali" for e in entries)
+    assert plan(CALENDAR, date(2026, 11, 9)) == []
+
+
+def test_calendar_running_out_warns_once_per_day(caplog):
+    assert not calendar_exhausted(CALENDAR, date(2026, 10, 1), days=30)
+    assert calendar_exhausted(CALENDAR, date(2026, 10, 25), days=30)
+    pregen, _ = make()
+    with caplog.at_level("WARNING", logger="festival_service"):
+        pregen._check_calendar(CALENDAR, date(2026, 11, 1))
+        pregen._check_calendar(CALENDAR, date(2026, 11, 1))
+        pregen._check_calendar(CALENDAR, date(2026, 11, 2))
+    assert [r.getMessage().startswith("festival calendar ends 2026-11-08") for r in caplog.records] == [True, True]
+
+
+def test_run_stops_writing_once_lease_is_taken_over(monkeypatch):
+    monkeypatch.setattr(festival_service, "CONCURRENCY", 1)
+    pregen, db = make()
+    entries = [{"_id": f"e{i}", "festival": "Diwali", "festival_date": "2026-11-08"} for i in range(3)]
+    calls = []
+
+    async def pending(db_, today):
+        return list(entries)
+
+    async def generate(params):
+        calls.append(params)
+        if len(calls) == 2:
+            # Our lease expired mid-run and another instance acquired it
+            db[festival_service.JOBS_COLLECTION].docs["lease"]["owner"] = "someone-else"
+        return "ideas", {"prompt_tokens": 10, "completion_tokens": 20}
+
+    monkeypatch.setattr(pregen, "pending", pending)
+    monkeypatch.setattr(festival_service, "content_params", lambda entry: {})
+    pregen.generate = generate
+    report = asyncio.run(pregen.run())
+    assert report["stopped"] == "lease_lost"
+    assert report["generated"] == 1 and len(calls) == 2
+    assert set(db[festival_service.CACHE_COLLECTION].docs) == {"e0"}
+    # The new owner's lease is left alone
+    assert db[festival_service.JOBS_COLLECTION].docs["lease"]["owner"] == "someone-else"
@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+
+import hedging_service
+from hedging_service import HedgePolicy, Hedger, _endpoints_from_env
+
+
+def warmed(latency: float = 0.01, budget: float = 1.0) -> Hedger:
+    hedger = Hedger({"content": HedgePolicy("content", budget=budget)})
+    for _ in range(hedging_service.HEDGE_MIN_SAMPLES):
+        hedger.record("content", latency)
+    return hedger
+
+
+def test_hedge_wins_and_its_latency_is_recorded():
+    hedger = warmed()
+
+    async def slow():
+        await asyncio.sleep(1)
+        return "primary"
+
+    async def fast():
+        return "hedge"
+
+    result = asyncio.run(hedger.run("content", slow, fast))
+    assert result == ("hedge", "hedge")
+    stats = hedger.stats["content"]
+    assert stats.hedge_wins == 1
+    assert len(stats.latencies) == hedging_service.HEDGE_MIN_SAMPLES + 1
+    assert 0.01 <= stats.latencies[-1] < 0.5
+
+
+def test_caller_cancellation_cancels_both_calls():
+    hedger = warmed()
+    cancelled = []
+
+    async def call(name):
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append(name)
+            raise
+
+    async def run():
+        task = asyncio.ensure_future(hedger.run("content", lambda: call("primary"), lambda: call("hedge")))
+        await asyncio.sleep(0.05)  # past the 10ms p90: both calls are in flight
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert sorted(cancelled) == ["hedge", "primary"]
+
+
+def test_cancellation_before_hedge_cancels_primary():
+    hedger = Hedger({"content": HedgePolicy("content", budget=1.0)})  # no samples: default delay
+    cancelled = []
+
+    async def primary():
+        try:
+            await asyncio.sleep(5)
+        except asyncio.CancelledError:
+            cancelled.append("primary")
+            raise
+
+    async def run():
+        task = asyncio.ensure_future(hedger.run("content", primary, primary))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert cancelled == ["primary"]
+
+
+def test_zero_budget_never_hedges():
+    hedger = warmed(budget=0.0)
+    hedged = []
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "p"
+
+    async def hedge():
+        hedged.append(1)
+        return "h"
+
+    assert asyncio.run(hedger.run("content", slow, hedge)) == ("p", "primary")
+    assert hedged == []
+
+
+def test_per_endpoint_budgets_from_env(monkeypatch):
+    monkeypatch.setenv("DMM_HEDGE_ENDPOINTS", "strategy=0.25, content ,campaign=bad")
+    assert _endpoints_from_env() == {
+        "strategy": 0.25,
+        "content": hedging_service.HEDGE_BUDGET,
+        "campaign": hedging_service.HEDGE_BUDGET,
+    }
@@ -0,0 +1,173 @@
+import asyncio
+from datetime import timedelta
+
+from pymongo import _csot
+from pymongo.errors import DuplicateKeyError, ExecutionTimeout
+
+from deadline_service import DeadlineMiddleware
+from idempotency_service import COLLECTION, IdempotencyMiddleware, _utcnow
+
+
+class FakeKeys:
+    """In-memory idempotency_keys collection that, like pymongo, fails once the CSOT deadline has passed"""
+
+    def __init__(self):
+        self.docs = {}
+
+    def _check_deadline(self):
+        left = _csot.remaining()
+        if left is not None and left <= 0:
+            raise ExecutionTimeout("operation exceeded time limit")
+
+    async def insert_one(self, doc):
+        self._check_deadline()
+        if doc["_id"] in self.docs:
+            raise DuplicateKeyError("duplicate")
+        self.docs[doc["_id"]] = dict(doc)
+
+    async def update_one(self, q, update):
+        self._check_deadline()
+        doc = self.docs.get(q["_id"])
+        for field, cond in q.items():
+            value = (doc or {}).get(field)
+            if doc is not None and not (value < cond["$lt"] if isinstance(cond, dict) else value == cond):
+                doc = None
+        if doc is not None:
+            doc.update(update["$set"])
+
+        class Result:
+            modified_count = int(doc is not None)
+
+        return Result()
+
+    async def find_one(self, q):
+        self._check_deadline()
+        return self.docs.get(q["_id"])
+
+    async def delete_one(self, q):
+        self._check_deadline()
+        self.docs.pop(q["_id"], None)
+
+
+def stack(app, coll):
+    async def get_db():
+        return {COLLECTION: coll}
+
+    return DeadlineMiddleware(IdempotencyMiddleware(app, get_db=get_db))
+
+
+async def call(app, timeout: str = "5", body: bytes = b'{"a": 1}'):
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": body, "more_body": False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {
+        "type": "http", "method": "POST", "path": "/api/x",
+        "headers": [(b"idempotency-key", b"k1"), (b"x-request-timeout", timeout.encode())],
+    }
+    await app(scope, receive, send)
+    return sent[0]["status"], b"".join(m.get("body", b"") for m in sent[1:])
+
+
+def test_deadline_cancellation_releases_key():
+    coll, calls = FakeKeys(), []
+
+    async def slow_app(scope, receive, send):
+        calls.append(1)
+        await receive()
+        await asyncio.sleep(1)
+
+    async def fast_app(scope, receive, send):
+        calls.append(2)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"ok"})
+
+    async def run():
+        status, _ = await call(stack(slow_app, coll), timeout="0.05")
+        assert status == 504
+        assert coll.docs == {}  # released despite the expired request deadline
+        return await call(stack(fast_app, coll))
+
+    assert asyncio.run(run()) == (200, b"ok")
+    assert calls == [1, 2]
+
+
+def test_completed_response_is_replayed():
+    coll, calls = FakeKeys(), []
+
+    async def app(scope, receive, send):
+        calls.append(1)
+        await send({"type": "http.response.start", "status": 201, "headers": []})
+        await send({"type": "http.response.body", "body": b"created"})
+
+    async def run():
+        first = await call(stack(app, coll))
+        second = await call(stack(app, coll))
+        return first, second
+
+    assert asyncio.run(run()) == ((201, b"created"), (201, b"created"))
+    assert calls == [1]
+
+
+def respond(status, body, calls, delay=0.0):
+    async def app(scope, receive, send):
+        calls.append(status)
+        await asyncio.sleep(delay)
+        await send({"type": "http.response.start", "status": status, "headers": []})
+        await send({"type": "http.response.body", "body": body})
+
+    return app
+
+
+def test_concurrent_duplicates_run_once():
+    coll, calls = FakeKeys(), []
+    app = stack(respond(200, b"once", calls, delay=0.1), coll)
+
+    async def run():
+        return await asyncio.gather(*[call(app) for _ in range(5)])
+
+    assert asyncio.run(run()) == [(200, b"once")] * 5
+    assert calls == [200]
+
+
+def test_reused_key_with_another_body_is_rejected():
+    coll, calls = FakeKeys(), []
+    app = stack(respond(200, b"ok", calls), coll)
+
+    async def run():
+        await call(app)
+        return await call(app, body=b'{"a": 2}')
+
+    status, _ = asyncio.run(run())
+    assert status == 422 and calls == [200]
+
+
+def test_server_errors_are_not_stored():
+    coll, calls = FakeKeys(), []
+
+    async def run():
+        first = await call(stack(respond(503, b"down", calls), coll))
+        return first, await call(stack(respond(200, b"up", calls), coll))
+
+    assert asyncio.run(run()) == ((503, b"down"), (200, b"up"))
+    assert calls == [503, 200]
+
+
+def test_abandoned_claim_is_taken_over():
+    coll, calls = FakeKeys(), []
+    app = stack(respond(200, b"ok", calls), coll)
+
+    async def run():
+        await call(app)
+        record = next(iter(coll.docs.values()))
+        # A worker that died mid-request leaves an in_progress claim behind
+        record.update(state="in_progress", locked_until=_utcnow() - timedelta(seconds=1))
+        record.pop("response")
+        return await call(app)
+
+    assert asyncio.run(run()) == (200, b"ok")
+    assert calls == [200, 200]
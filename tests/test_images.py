@@ -0,0 +1,71 @@
+import asyncio
+import io
+
+import pytest
+
+PIL = pytest.importorskip("PIL")
+from PIL import Image  # noqa: E402
+
+import image_service  # noqa: E402
+from image_service import ImageDerivatives, content_hash, etag, render_variants  # noqa: E402
+
+
+def png(width, height):
+    buf = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+def test_render_variants_crops_to_each_aspect(tmp_path):
+    manifest = render_variants(png(1536, 1024), str(tmp_path))
+    sizes = {k: (v["width"], v["height"]) for k, v in manifest["variants"].items()}
+    assert sizes == {"thumb": (320, 213), "feed": (1080, 1080), "story": (1080, 1920), "link": (1200, 628)}
+    assert manifest["source"]["width"] == 1536
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["feed.webp", "link.webp", "manifest.json", "story.webp", "thumb.webp"]
+
+
+class InlineDerivatives(ImageDerivatives):
+    """Renders in-process and counts renders"""
+
+    def __init__(self):
+        super().__init__()
+        self.renders = 0
+
+    def _executor(self):
+        return None  # default thread pool
+
+    async def ingest(self, raw):
+        original = image_service.render_variants
+
+        def counting(*args):
+            self.renders += 1
+            return original(*args)
+
+        image_service.render_variants = counting
+        try:
+            return await super().ingest(raw)
+        finally:
+            image_service.render_variants = original
+
+
+def test_ingest_renders_once_per_content_and_returns_urls(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_service, "IMAGE_DIR", str(tmp_path))
+    raw = png(64, 64)
+    derivatives = InlineDerivatives()
+
+    async def run():
+        first = await asyncio.gather(*[derivatives.ingest(raw) for _ in range(4)])
+        return first, await derivatives.ingest(raw)
+
+    concurrent, cached = asyncio.run(run())
+    digest = content_hash(raw)
+    assert derivatives.renders == 1
+    assert all(r == cached for r in concurrent)
+    assert cached["variants"]["feed"]["url"] == f"/api/media/images/{digest}/feed"
+    assert etag(digest, "feed") == f'"{digest}-feed"'
+
+
+def test_ingest_rejects_oversized_input(monkeypatch):
+    monkeypatch.setattr(image_service, "MAX_INPUT_BYTES", 10)
+    with pytest.raises(ValueError):
+        asyncio.run(ImageDerivatives().ingest(b"x" * 11))
@@ -0,0 +1,128 @@
+import asyncio
+import itertools
+
+import pytest
+
+import llm_pool_service
+from llm_pool_service import ClientPool, ClientPools
+
+
+class Chat:
+    ids = itertools.count()
+
+    def __init__(self):
+        self.id = next(self.ids)
+        self.messages = [{"role": "system", "content": "be brief"}]
+
+
+def test_clients_are_reused_and_reset():
+    pools = ClientPools()
+
+    async def run():
+        async with pools.checkout("gpt-5", "sys", Chat) as first:
+            first.messages.append({"role": "user", "content": "hi"})
+        async with pools.checkout("gpt-5", "sys", Chat) as second:
+            return first, second
+
+    first, second = asyncio.run(run())
+    assert first is second and len(second.messages) == 1
+    assert pools.snapshot()[0]["created"] == 1 and pools.snapshot()[0]["acquired"] == 2
+
+
+class SessionChat:
+    """Keeps history in a store keyed by session id, like the provider SDK's chat client"""
+    history = {}
+
+    def __init__(self):
+        self.session_id = "dmm-0a1b2c3d"
+
+    def send(self, text):
+        self.history.setdefault(self.session_id, []).append(text)
+        return list(self.history[self.session_id])
+
+
+def test_each_checkout_gets_a_fresh_session():
+    pools = ClientPools()
+
+    async def run():
+        async with pools.checkout("gpt-5", "sys", SessionChat) as first:
+            first_session = first.session_id
+            first.send("brief for client A")
+        async with pools.checkout("gpt-5", "sys", SessionChat) as second:
+            return first, first_session, second, second.send("brief for client B")
+
+    first, first_session, second, seen = asyncio.run(run())
+    assert first is second and second.session_id != first_session
+    assert second.session_id.startswith("dmm-")
+    assert seen == ["brief for client B"]
+
+
+def test_pool_is_bounded_and_waiters_are_served():
+    pool = ClientPool(("m", "s"), Chat, size=2)
+    pools = ClientPools()
+    pools._pools[pool.key] = pool
+    active, peak = 0, 0
+
+    async def use():
+        nonlocal active, peak
+        async with pools.checkout("m", "s", Chat):
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async def run():
+        await asyncio.gather(*[use() for _ in range(10)])
+
+    asyncio.run(run())
+    assert peak == 2 and pool.created == 2 and pool.acquired == 10
+
+
+def test_failed_client_is_replaced_for_a_waiting_request():
+    pools = ClientPools()
+    pool = pools.pool("m", "s", Chat)
+    pool.size = 1
+
+    async def failing():
+        async with pools.checkout("m", "s", Chat):
+            await asyncio.sleep(0.01)
+            raise RuntimeError("provider error")
+
+    async def waiting():
+        await asyncio.sleep(0)
+        async with pools.checkout("m", "s", Chat) as client:
+            return client.id
+
+    async def run():
+        results = await asyncio.wait_for(asyncio.gather(failing(), waiting(), return_exceptions=True), 1)
+        return results
+
+    failed, client_id = asyncio.run(run())
+    assert isinstance(failed, RuntimeError) and isinstance(client_id, int)
+    assert pool.discarded == 1 and pool.created - pool.discarded == 1
+
+
+def test_worn_out_clients_are_retired(monkeypatch):
+    monkeypatch.setattr(llm_pool_service, "CLIENT_MAX_USES", 2)
+    pool = ClientPool(("m", "s"), Chat, size=1)
+
+    async def run():
+        ids = []
+        for _ in range(3):
+            slot = await pool.acquire()
+            ids.append(slot.client.id)
+            pool.release(slot, True)
+        return ids
+
+    a, b, c = asyncio.run(run())
+    assert a == b != c
+
+
+def test_warmup_survives_factory_errors():
+    pools = ClientPools()
+
+    def broken():
+        raise RuntimeError("no key")
+
+    pools.warmup([("m", "s", Chat), ("x", "s", broken)], per_pool=3)
+    assert [p["idle"] for p in pools.snapshot()] == [3, 0]
@@ -0,0 +1,111 @@
+import asyncio
+import os
+
+import pytest
+
+import deadline_service
+from media_cache_service import RangeFileResponse, VideoCache, cache_name, parse_range
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    ("bytes=0-1,5-6", None),  # multi-range: whole entity
+    ("items=0-1", None),
+    ("bytes=-", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header,size", [("bytes=1000-", 1000), ("bytes=5-2", 1000), ("bytes=-0", 1000), ("bytes=-1", 0)])
+def test_parse_range_unsatisfiable(header, size):
+    with pytest.raises(ValueError):
+        parse_range(header, size)
+
+
+def serve(response, method="GET", extensions=None):
+    sent = []
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": method, "extensions": extensions or {}}
+    asyncio.run(response(scope, None, send))
+    headers = {k.decode(): v.decode() for k, v in sent[0]["headers"]}
+    return sent[0]["status"], headers, b"".join(m.get("body", b"") for m in sent[1:]), sent
+
+
+@pytest.fixture
+def video(tmp_path):
+    path = tmp_path / "v.mp4"
+    path.write_bytes(bytes(range(256)) * 4)
+    return str(path)
+
+
+def test_range_response_serves_slices(video):
+    status, headers, body, _ = serve(RangeFileResponse(video, "video/mp4", "bytes=10-19"))
+    assert status == 206 and body == bytes(range(10, 20))
+    assert headers["content-range"] == "bytes 10-19/1024" and headers["content-length"] == "10"
+
+    status, headers, body, _ = serve(RangeFileResponse(video, "video/mp4"))
+    assert status == 200 and len(body) == 1024 and headers["accept-ranges"] == "bytes"
+
+    status, headers, _, _ = serve(RangeFileResponse(video, "video/mp4", "bytes=2000-"))
+    assert status == 416 and headers["content-range"] == "bytes */1024"
+
+
+def test_if_range_mismatch_sends_the_whole_file(video):
+    tag = RangeFileResponse(video, "video/mp4").headers["etag"]
+    assert serve(RangeFileResponse(video, "video/mp4", "bytes=0-0", if_range=tag))[0] == 206
+    assert serve(RangeFileResponse(video, "video/mp4", "bytes=0-0", if_range='"stale"'))[0] == 200
+
+
+def test_zero_copy_and_head(video):
+    _, _, _, sent = serve(RangeFileResponse(video, "video/mp4", "bytes=100-"),
+                          extensions={"http.response.zerocopysend": {}})
+    assert sent[1]["type"] == "http.response.zerocopysend" and (sent[1]["offset"], sent[1]["count"]) == (100, 924)
+    assert serve(RangeFileResponse(video, "video/mp4"), method="HEAD")[2] == b""
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    root = tmp_path / "videos"
+    root.mkdir()
+    for gid, atime in (("old", 100), ("mid", 200), ("new", 300)):
+        path = root / cache_name(gid, "video")
+        path.write_bytes(b"x" * 40)
+        os.utime(path, (atime, atime))
+    (root / "partial.mp4.part").write_bytes(b"x")
+    cache = VideoCache(root=str(root), quota=130)
+    assert cache.path("old", "video") is not None  # now most recently used
+    cache._evict_for(40)
+    assert cache.path("mid", "video") is None
+    assert cache.path("old", "video") and cache.path("new", "video")
+    snap = cache.snapshot()
+    assert snap["evicted"] == 1 and snap["used_bytes"] == 80 and not (root / "partial.mp4.part").exists()
+
+
+def test_download_escapes_the_request_deadline(tmp_path):
+    cache = VideoCache(root=str(tmp_path), quota=1000)
+    seen = []
+
+    async def download(name, url):
+        seen.append(deadline_service.remaining())
+        cache._entries[name] = 1
+
+    cache._download = download
+
+    async def request():
+        token = deadline_service._deadline.set(0.0)  # this request's budget is already spent
+        try:
+            task = cache.ensure("gen", "video", "https://cdn.example/v.mp4")
+        finally:
+            deadline_service._deadline.reset(token)
+        await task
+
+    asyncio.run(request())
+    assert seen == [None]
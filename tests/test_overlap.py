@@ -0,0 +1,91 @@
+import threading
+
+import numpy as np
+import pytest
+
+import overlap_service
+from audience_service import build_synthetic
+from overlap_service import OverlapEngine
+
+INDEX = build_synthetic(n_rows=20000, population=2_000_000)
+
+TARGETINGS = [
+    {"states": ["Maharashtra"], "interests": ["Gardening"]},
+    {"states": ["Maharashtra"], "age_min": 25, "age_max": 40},
+    {"cities": ["Mumbai"]},
+    {"interests": ["Home Decor"], "age_min": 30},
+    {"states": ["Karnataka"]},
+    {"age_min": 18, "age_max": 24},
+]
+
+
+def campaigns(targetings):
+    return [{"id": f"c{i}", "campaign_name": f"C{i}", "targeting": t} for i, t in enumerate(targetings)]
+
+
+def exact_shared(targetings):
+    bitmaps = [INDEX.compile(t)[0] for t in targetings]
+    return np.array([[int(np.bitwise_count(a & b).sum()) for b in bitmaps] for a in bitmaps])
+
+
+def test_matrix_matches_dense_popcount():
+    report = OverlapEngine(lambda: INDEX).matrix(campaigns(TARGETINGS))
+    expected = (exact_shared(TARGETINGS) * INDEX.scale).astype(np.int64)
+    assert np.array_equal(np.array(report["shared_reach"]), expected)
+    share = np.array(report["overlap_share"])
+    assert np.allclose(np.diag(share)[np.diag(expected) > 0], 1.0)
+    assert all(a["overlap_share"] >= report["alert_share"] for a in report["alerts"])
+
+
+def test_targeting_change_recomputes_one_row():
+    engine = OverlapEngine(lambda: INDEX)
+    docs = campaigns(TARGETINGS)
+    engine.matrix(docs)
+    before = engine.stats["pairs_computed"]
+    docs[2] = {**docs[2], "targeting": {"cities": ["Pune"]}}
+    report = engine.matrix(docs)
+    assert engine.stats["pairs_computed"] - before == len(docs)
+    assert engine.stats["invalidated"] == 1
+    expected = (exact_shared([d["targeting"] for d in docs]) * INDEX.scale).astype(np.int64)
+    assert np.array_equal(np.array(report["shared_reach"]), expected)
+
+
+def test_more_targetings_than_cache_slots(monkeypatch):
+    monkeypatch.setattr(overlap_service, "CACHE_SIZE", 2)
+    engine = OverlapEngine(lambda: INDEX)
+    report = engine.matrix(campaigns(TARGETINGS))
+    assert report["unique_targetings"] == len(TARGETINGS)
+    # Pinned entries survive the call; the next compile trims back to size
+    engine.compile({"states": ["Delhi"]})
+    assert len(engine._compiled) == 2
+
+
+@pytest.mark.parametrize("threads", [8])
+def test_concurrent_calls(threads):
+    engine = OverlapEngine(lambda: INDEX)
+    expected = (exact_shared(TARGETINGS) * INDEX.scale).astype(np.int64)
+    errors, results = [], []
+
+    def run(offset):
+        try:
+            # Different subsets and orders force slot allocation, growth and invalidation to interleave
+            order = TARGETINGS[offset % 3:] + TARGETINGS[:offset % 3]
+            report = engine.matrix(campaigns(order))
+            results.append((order, np.array(report["shared_reach"])))
+        except Exception as e:  # pragma: no cover - surfaced by the assertion below
+            errors.append(e)
+
+    workers = [threading.Thread(target=run, args=(i,)) for i in range(threads)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert not errors
+    for order, shared in results:
+        idx = [TARGETINGS.index(t) for t in order]
+        assert np.array_equal(shared, expected[np.ix_(idx, idx)])
+
+
+def test_index_version_identifies_table():
+    assert INDEX.version == build_synthetic(n_rows=20000, population=2_000_000).version
+    assert INDEX.version != build_synthetic(n_rows=20000, population=2_000_000, seed=8).version
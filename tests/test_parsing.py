@@ -0,0 +1,49 @@
+import pytest
+
+from parsing_service import JsonScanner, extract_json, parse_sections
+
+
+@pytest.mark.parametrize("text,expected,status", [
+    ('Here you go:\n```json\n{"a": 1, "b": "}{"}\n```\nThanks!', {"a": 1, "b": "}{"}, "ok"),
+    ('{"a": [1, 2,], "b": {"c": 3,},}', {"a": [1, 2], "b": {"c": 3}}, "ok"),
+    ('{"a": "say \\"hi\\"", "b": [1, 2', {"a": 'say "hi"', "b": [1, 2]}, "repaired"),
+    ('{"a": {"b": "trunc', {"a": {"b": "trunc"}}, "repaired"),
+    ('{"a": 1, "b":', {"a": 1}, "repaired"),
+    ('{"a": 1, "b', {"a": 1}, "repaired"),
+    ('{"a": ["x", "y', {"a": ["x", "y"]}, "repaired"),
+    ("no json here", None, "none"),
+    ("", None, "none"),
+])
+def test_extract_json(text, expected, status):
+    assert extract_json(text) == (expected, status)
+
+
+def test_scanner_is_incremental():
+    scanner = JsonScanner()
+    assert scanner.feed('prefix {"a": "{') is None
+    assert scanner.feed('"') is None
+    assert scanner.feed('} trailing {"b": 2}') == '{"a": "{"}'
+
+
+def test_parse_sections_maps_fuzzy_keys_once():
+    text = '{"strategy": {"Market Analysis": "m", "Content Strategy": "c", "Channel Mix": "ch", ' \
+           '"Budget Allocation": "b", "KPIs & Metrics": "k", "Timeline": "t", "challenges": "x"}}'
+    out = parse_sections("strategy", text)
+    assert out["parse_status"] == "parsed" and out["parse_missing"] == []
+    assert out["sections"]["kpis"] == "k" and out["sections"]["challenges"] == "x"
+
+
+def test_parse_sections_coerces_hashtags_and_reports_missing():
+    out = parse_sections("content", '{"concepts": [1], "hashtags": {"brand": ["diwali", "#Sale"], "x": "diwali"}}')
+    assert out["sections"]["hashtags"] == ["#diwali", "#Sale"]
+    assert out["parse_status"] == "partial"
+    assert "visual_style" in out["parse_missing"] and "concepts" not in out["parse_missing"]
+
+
+def test_parse_sections_truncated_is_partial_and_garbage_unparsed():
+    assert parse_sections("campaign", '{"timeline": "4 weeks", "risks": ["x"')["parse_status"] == "partial"
+    assert parse_sections("campaign", "I cannot help") == {
+        "sections": {}, "parse_status": "unparsed",
+        "parse_missing": ["channel_budget", "timeline", "creative_requirements", "targeting", "roi_kpis", "risks",
+                          "ab_tests"],
+    }
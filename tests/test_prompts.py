@@ -0,0 +1,50 @@
+import pytest
+
+import prompt_service
+from prompt_service import PromptRegistry, _water_fill, count_tokens, targeting_summary, truncate_to_tokens
+
+
+@pytest.mark.parametrize("sizes,available,expected", [
+    ([("a", 10), ("b", 10)], 100, {"a": 10, "b": 10}),
+    ([("a", 10), ("b", 500), ("c", 500)], 210, {"a": 10, "b": 100, "c": 100}),
+    ([("a", 300), ("b", 30)], 100, {"b": 30, "a": 70}),
+    ([("a", 5)], 0, {"a": 0}),
+    ([], 50, {}),
+])
+def test_water_fill_keeps_short_fields_whole(sizes, available, expected):
+    limits = _water_fill(sizes, available)
+    assert limits == expected
+    assert sum(limits.values()) <= available
+
+
+def test_truncate_fits_budget_and_keeps_head_and_tail():
+    text = "HEAD " + "word " * 2000 + "TAIL"
+    out = truncate_to_tokens(text, 100)
+    assert count_tokens(out) <= 110  # re-tokenizing at the seams may shift a token or two
+    assert out.startswith("HEAD") and out.endswith("TAIL") and prompt_service.TRUNCATION_MARKER in out
+    assert truncate_to_tokens("short", 100) == "short"
+
+
+def test_render_truncates_only_truncatable_fields_within_budget(monkeypatch):
+    monkeypatch.setitem(prompt_service.MODEL_INPUT_BUDGETS, "tiny", 200)
+    registry = PromptRegistry()
+    registry.register("t", "Company: {company}\nBrief: {brief}\nNotes: {notes}", truncatable=("brief", "notes"))
+    rendered = registry.render("t", "tiny", company="Acme", brief="b " * 1000, notes="short note")
+    assert rendered.truncated_fields == ["brief"]
+    assert "Acme" in rendered.text and "short note" in rendered.text
+    assert rendered.prompt_tokens <= 210
+    usage = rendered.usage("a reply")
+    assert usage["template"] == "t" and usage["input_budget"] == 200 and usage["completion_tokens"] > 0
+
+
+def test_render_leaves_prompts_under_budget_untouched():
+    rendered = prompt_service.registry.render("content", "gpt-5", content_type="reel", brief="Diwali sale")
+    assert rendered.truncated_fields == [] and "Diwali sale" in rendered.text
+    assert "{" not in rendered.text
+
+
+def test_targeting_summary_skips_empty_fields():
+    assert targeting_summary(None) == "None"
+    assert targeting_summary({"states": [], "schedule": {}}) == "None"
+    summary = targeting_summary({"age_min": 25, "states": ["Goa", "Kerala"], "interests": ["travel"]})
+    assert summary == "Age: 25--; Geo: states=Goa, Kerala; Interests: travel"
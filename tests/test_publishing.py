@@ -0,0 +1,165 @@
+import asyncio
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import publishing_service
+from publishing_service import PUBLISH_TZ, GraphRateLimited, MetaGraphClient, PageRateLimiter, due_time
+
+
+def ts(text):
+    return datetime.fromisoformat(text).replace(tzinfo=PUBLISH_TZ)
+
+
+NOW = ts("2026-10-19T10:30:00")
+
+
+@pytest.mark.parametrize("schedule,expected", [
+    (None, "2026-10-19T10:30:00"),
+    ({"dayparts": ["morning"]}, "2026-10-19T10:30:00"),  # already inside the window
+    ({"dayparts": ["evenings"]}, "2026-10-19T18:00:00"),
+    ({"dayparts": ["early_morning"]}, "2026-10-20T06:00:00"),  # today's window has passed
+    ({"dayparts": ["night", "afternoon"]}, "2026-10-19T12:00:00"),  # earliest of several windows
+    ({"dayparts": ["unknown"]}, "2026-10-19T10:30:00"),
+    ({"start_date": "2026-11-01"}, "2026-11-01T00:00:00"),
+    ({"start_date": "2026-11-01", "dayparts": ["evening"]}, "2026-11-01T18:00:00"),
+    ({"start_date": "2026-10-01", "dayparts": ["morning"]}, "2026-10-19T10:30:00"),  # past start: now
+    ({"start_date": "2026-11-01T12:00:00+00:00"}, "2026-11-01T17:30:00"),  # explicit offset converted to IST
+    ({"end_date": "2026-10-19", "dayparts": ["evenings"]}, "2026-10-19T18:00:00"),  # date-only end covers the day
+    ({"end_date": "2026-10-19", "dayparts": ["early_morning"]}, None),  # next slot is after the campaign
+    ({"start_date": "2026-11-01", "end_date": "2026-10-31"}, None),
+    ({"end_date": "2026-10-19T10:00:00"}, None),  # ended this morning
+])
+def test_due_time(schedule, expected):
+    due = due_time(schedule, now=NOW)
+    assert due == (ts(expected) if expected else None)
+    assert due is None or due.tzinfo == timezone.utc
+
+
+def test_due_time_late_night_rolls_to_the_next_window():
+    assert due_time({"dayparts": ["night"]}, now=ts("2026-10-19T23:59:00")) == ts("2026-10-19T23:59:00")
+    assert due_time({"dayparts": ["night"]}, now=ts("2026-10-20T00:00:01")) == ts("2026-10-20T21:00:00")
+
+
+class Clock:
+    now = 100.0
+
+    def time(self):
+        return self.now
+
+
+class FakeLimits:
+    """Collection subset the limiter uses: equality filters, $set/$max, upsert with a unique _id"""
+
+    def __init__(self):
+        self.docs = {}
+
+    async def find_one(self, q):
+        return self.docs.get(q["_id"])
+
+    async def update_one(self, q, update, upsert=False):
+        doc = self.docs.get(q["_id"])
+        if doc is not None and all(doc.get(k) == v for k, v in q.items()):
+            doc.update(update.get("$set", {}))
+            for field, v in update.get("$max", {}).items():
+                doc[field] = max(doc.get(field, v), v)
+            return SimpleNamespace(matched_count=1)
+        if upsert:
+            if doc is not None:
+                raise DuplicateKeyError("E11000 duplicate key")
+            self.docs[q["_id"]] = {"_id": q["_id"], **update.get("$set", {}), **update.get("$max", {})}
+        return SimpleNamespace(matched_count=0)
+
+
+def limiter(monkeypatch, clock, limits=None, **kw):
+    monkeypatch.setattr(publishing_service.time, "time", clock.time)
+    db = {publishing_service.LIMITS_COLLECTION: limits or FakeLimits()}
+
+    async def get_db():
+        return db
+
+    return PageRateLimiter(get_db, **kw)
+
+
+def test_rate_limiter_allows_a_burst_then_staggers(monkeypatch):
+    clock = Clock()
+    pages = limiter(monkeypatch, clock, rate_per_minute=10, burst=3)
+
+    async def run():
+        waits = [await pages.reserve("page") for _ in range(5)]
+        other = await pages.reserve("other-page")
+        clock.now += 60
+        return waits, other, await pages.reserve("page")
+
+    waits, other, later = asyncio.run(run())
+    assert waits == [0, 0, 0, 6, 12]
+    assert other == 0 and later == 0
+
+
+def test_rate_limiter_budget_is_shared_across_processes(monkeypatch):
+    clock = Clock()
+    limits = FakeLimits()
+    first = limiter(monkeypatch, clock, limits, rate_per_minute=10, burst=3)
+    second = limiter(monkeypatch, clock, limits, rate_per_minute=10, burst=3)
+
+    async def run():
+        return [await (first if i % 2 else second).reserve("page") for i in range(5)]
+
+    assert asyncio.run(run()) == [0, 0, 0, 6, 12]
+
+
+def test_rate_limiter_retries_when_another_process_books_first(monkeypatch):
+    clock = Clock()
+    limits = FakeLimits()
+    pages = limiter(monkeypatch, clock, limits, rate_per_minute=10, burst=1)
+    find_one = limits.find_one
+
+    async def racing_find_one(q):
+        doc = await find_one(q)
+        if not racing_find_one.raced:
+            # Another worker books the slot between our read and our write
+            racing_find_one.raced = True
+            limits.docs[q["_id"]] = {"_id": q["_id"], "tat": clock.now + 6}
+        return doc
+
+    racing_find_one.raced = False
+    limits.find_one = racing_find_one
+    assert asyncio.run(pages.reserve("page")) == 6
+    assert limits.docs["page"]["tat"] == clock.now + 12
+
+
+def test_rate_limiter_pause_defers_the_page(monkeypatch):
+    clock = Clock()
+    pages = limiter(monkeypatch, clock, rate_per_minute=10, burst=3)
+
+    async def run():
+        await pages.pause("page", 300)
+        return await pages.reserve("page")
+
+    assert asyncio.run(run()) == 300
+
+
+def graph_reply(monkeypatch, response):
+    real = httpx.AsyncClient
+    transport = httpx.MockTransport(lambda request: response)
+    monkeypatch.setattr(publishing_service.httpx, "AsyncClient", lambda **kw: real(transport=transport, **kw))
+    return MetaGraphClient("token").publish("page", "hello")
+
+
+@pytest.mark.parametrize("response,raises", [
+    (httpx.Response(502, text="<html>Bad Gateway</html>"), httpx.HTTPStatusError),
+    (httpx.Response(500, json=["unexpected"]), httpx.HTTPStatusError),
+    (httpx.Response(400, json={"error": {"code": 100, "message": "Invalid parameter"}}), httpx.HTTPStatusError),
+    (httpx.Response(400, json={"error": {"code": 32}}, headers={"retry-after": "60"}), GraphRateLimited),
+    (httpx.Response(429, text="slow down"), GraphRateLimited),
+])
+def test_graph_errors_fall_back_to_status_when_body_is_not_json(monkeypatch, response, raises):
+    with pytest.raises(raises):
+        asyncio.run(graph_reply(monkeypatch, response))
+
+
+def test_graph_publish_returns_post_id(monkeypatch):
+    assert asyncio.run(graph_reply(monkeypatch, httpx.Response(200, json={"id": "1_2", "post_id": "1_3"}))) == "1_3"
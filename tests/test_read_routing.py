@@ -0,0 +1,86 @@
+import asyncio
+import time
+from datetime import datetime, timedelta, timezone
+
+from etag_service import VersionStamps
+from read_routing_service import PRIMARY, SECONDARY, ReadRouter
+
+
+class FakeClient:
+    def get_database(self, name, read_preference=None):
+        return object()
+
+
+class FakeStampCollection:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def find(self, query):
+        rows = [r for r in self.rows if r["_id"] in query["_id"]["$in"]]
+
+        class Cursor:
+            async def to_list(self, length=None):
+                return rows
+
+        return Cursor()
+
+
+def make_router(last_write, lag=2.0):
+    router = ReadRouter(FakeClient, "db", last_write=last_write, routes={"list": SECONDARY})
+    router.lag_seconds, router.lag_checked = lag, time.monotonic()
+    return router
+
+
+def test_recent_write_pins_route_and_blocks_secondary_etag():
+    writes = {"marketing_reels": 0.5}
+    router = make_router(writes.get)
+    assert router.mode_for("list", ("marketing_reels",)) == PRIMARY
+    assert not router.has_writes(router._db(SECONDARY), ("marketing_reels",))
+    assert router.has_writes(router._db(PRIMARY), ("marketing_reels",))
+
+    writes["marketing_reels"] = 30.0
+    assert router.mode_for("list", ("marketing_reels",)) == SECONDARY
+    assert router.has_writes(router._db(SECONDARY), ("marketing_reels",))
+
+
+def test_unknown_lag_never_trusts_secondary():
+    router = make_router(lambda name: None, lag=None)
+    assert router.mode_for("list", ()) == PRIMARY
+    assert not router.has_writes(router._db(SECONDARY), ())
+
+
+def test_stamps_learn_other_workers_writes():
+    at = datetime.now(timezone.utc) - timedelta(seconds=3)
+    coll = FakeStampCollection([{"_id": "marketing_ugc", "epoch": "e", "v": 7, "at": at}])
+
+    async def get_db():
+        return {"collection_versions": coll}
+
+    stamps = VersionStamps(get_db, ttl=0)
+    assert stamps.since_write("marketing_ugc") is None
+    assert asyncio.run(stamps.stamps(["marketing_ugc"])) == {"marketing_ugc": "e.7"}
+    assert 2.5 < stamps.since_write("marketing_ugc") < 10
+
+
+def test_lag_probe_escapes_request_deadline():
+    from deadline_service import _deadline, remaining
+
+    seen = []
+
+    class Admin:
+        async def command(self, name):
+            seen.append(remaining())
+            raise RuntimeError("standalone")
+
+    class Client(FakeClient):
+        admin = Admin()
+
+    router = ReadRouter(Client, "db", routes={"list": SECONDARY})
+
+    async def request():
+        _deadline.set(time.monotonic() - 1)
+        router.mode_for("list")
+        await router._probe
+
+    asyncio.run(request())
+    assert seen == [None]
@@ -0,0 +1,49 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from revision_service import _clean, apply_patch, make_patch
+from timestamp_service import as_datetime
+
+BEFORE = {
+    "id": "c1",
+    "status": "Pending Approval",
+    "targeting": {"states": ["Maharashtra"], "age_min": 25, "a/b": 1},
+    "channels": ["Google", "Meta"],
+}
+
+
+@pytest.mark.parametrize("after", [
+    {**BEFORE, "status": "Approved"},
+    {**BEFORE, "targeting": {"states": ["Goa"], "age_min": 25}},
+    {k: v for k, v in BEFORE.items() if k != "channels"},
+    {**BEFORE, "channels": ["Meta"], "approved_by": "asha"},
+    BEFORE,
+])
+def test_patch_round_trip(after):
+    patch = make_patch(BEFORE, after)
+    assert apply_patch(BEFORE, patch) == after
+    assert (patch == []) == (after == BEFORE)
+
+
+def test_patch_is_minimal_and_escapes_paths():
+    patch = make_patch(BEFORE, {**BEFORE, "targeting": {**BEFORE["targeting"], "a/b": 2}})
+    assert patch == [{"op": "replace", "path": "/targeting/a~1b", "value": 2}]
+
+
+def test_apply_patch_does_not_mutate_input():
+    snapshot = {"targeting": {"states": ["Goa"]}}
+    apply_patch(snapshot, [{"op": "add", "path": "/targeting/states/-", "value": "Kerala"}])
+    assert snapshot == {"targeting": {"states": ["Goa"]}}
+
+
+def test_clean_drops_bookkeeping():
+    assert _clean({"_id": 1, "version": 3, "status": "x"}) == {"status": "x"}
+
+
+def test_as_datetime_reads_every_legacy_format():
+    expected = datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert as_datetime(expected.timestamp()) == expected
+    assert as_datetime("2026-01-02T03:04:05Z") == expected
+    assert as_datetime(expected.replace(tzinfo=None)) == expected
+    assert as_datetime(True) is None and as_datetime("not a date") is None
@@ -0,0 +1,42 @@
+import pytest
+
+from budget_service import allocate
+from simulation_service import campaign_spend, simulate
+
+
+def test_clicks_saturate_like_the_budget_curve():
+    plan = allocate(["google_ads", "youtube_ads"], 3_000_000, 30)
+    spend = {c["channel"]: c["total_budget"] for c in plan["channels"]}
+    sim = simulate(spend, 30, trials=20000, seed=7)
+    for planned, simulated in zip(plan["channels"], sim["channels"]):
+        assert simulated["clicks"]["mean"] == pytest.approx(planned["expected_clicks"], rel=0.1)
+        assert simulated["saturation"] == pytest.approx(planned["saturation"], abs=0.1)
+
+
+def test_spend_past_saturation_buys_impressions_not_clicks():
+    low = simulate({"linkedin_ads": 100_000}, 30, seed=1)
+    high = simulate({"linkedin_ads": 10_000_000}, 30, seed=1)
+    assert high["impressions"]["mean"] == pytest.approx(100 * low["impressions"]["mean"], rel=0.05)
+    # 800 clicks/day is the ceiling however much is spent
+    assert high["clicks"]["p95"] <= 800 * 30
+    assert high["channels"][0]["saturation"] > 0.9
+    assert high["roi"]["mean"] < low["roi"]["mean"]
+
+
+def test_reach_caps_impressions():
+    capped = simulate({"facebook_ads": 500_000}, 14, reach=10_000, seed=2)
+    assert capped["impressions"]["p95"] <= 10_000 * 3 * 2 + 1
+
+
+def test_empty_and_seeded():
+    assert simulate({"google_ads": 0}, 30)["trials"] == 0
+    assert simulate({"google_ads": 50_000}, 30, seed=4) | {"elapsed_ms": 0} == \
+        simulate({"google_ads": 50_000}, 30, seed=4) | {"elapsed_ms": 0}
+
+
+def test_campaign_spend_prefers_manual_splits_then_saved_plan():
+    assert campaign_spend({"budget_splits": {"google_ads": 10, "facebook_ads": 0}}) == {"google_ads": 10.0, "facebook_ads": 0.0}
+    saved = {"budget_plan": {"channels": [{"channel": "sms_marketing", "total_budget": 42}]}}
+    assert campaign_spend(saved) == {"sms_marketing": 42.0}
+    optimized = campaign_spend({"channels": ["google_ads", "email_marketing"], "budget": 90_000, "duration_days": 30})
+    assert sum(optimized.values()) == pytest.approx(90_000, abs=1)
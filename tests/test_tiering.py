@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import tiering_service
+from tiering_service import ensure_tier_log_indexes, record, route, score, tier_stats
+
+
+def test_score_blends_capped_features():
+    empty = score([""], 0, None)
+    assert empty["score"] == 0.0
+    full = score(["word " * 2000], 50, {f"k{i}": "v" for i in range(20)})
+    assert full["score"] == 1.0
+    nested = score([], 0, {"schedule": {"start_date": "2026-11-01", "dayparts": []}, "states": ["Goa"], "age_min": None})
+    assert nested["targeting_fields"] == 2.0
+
+
+@pytest.mark.parametrize("template,s,tier", [
+    ("content", 0.1, "nano"),
+    ("content", 0.3, "mini"),
+    ("content", 0.9, "main"),
+    ("strategy", 0.1, "mini"),  # long structured output never goes to nano
+    ("campaign", 0.6, "main"),
+    ("unknown", 0.0, "nano"),
+])
+def test_route_applies_thresholds_and_template_floor(template, s, tier):
+    r = route(template, {"score": s}, "gpt-5", 60.0)
+    assert r.tier == tier
+    assert (r.model, r.timeout) == (tiering_service.TIERS[tier]["model"], tiering_service.TIERS[tier]["timeout"])
+
+
+def test_route_disabled_uses_defaults(monkeypatch):
+    monkeypatch.setattr(tiering_service, "TIERING_ENABLED", False)
+    r = route("content", {"score": 0.0}, "gpt-5", 42.0)
+    assert (r.tier, r.model, r.timeout) == ("main", "gpt-5", 42.0)
+
+
+def test_record_logs_outcome():
+    rows = []
+
+    class Log:
+        async def insert_one(self, doc):
+            rows.append(doc)
+
+    r = route("content", score(["short brief"], 1), "gpt-5", 60.0)
+    asyncio.run(record({tiering_service.TIER_LOG_COLLECTION: Log()}, r, 1.2345, False,
+                       {"prompt_tokens": 10}, "x" * 500))
+    assert rows[0]["tier"] == "nano" and rows[0]["latency_ms"] == 1234.5
+    assert len(rows[0]["error"]) == 200 and rows[0]["prompt_tokens"] == 10 and rows[0]["completion_tokens"] is None
+    # A BSON date, so the TTL index can expire it
+    assert isinstance(rows[0]["ts"], datetime) and rows[0]["ts"].tzinfo is not None
+
+
+def test_tier_stats_matches_datetime_cutoff_and_log_gets_ttl(monkeypatch):
+    monkeypatch.setattr(tiering_service, "TIER_LOG_TTL_DAYS", 30)
+    calls = {}
+
+    class Cursor:
+        async def to_list(self, length):
+            return [{"_id": {"template": "content", "tier": "nano"}, "calls": 4, "ok": 3, "avg_latency_ms": 10.0,
+                     "max_latency_ms": 20.0, "avg_score": 0.1, "avg_completion_tokens": 50.0}]
+
+    class Log:
+        def aggregate(self, pipeline):
+            calls["pipeline"] = pipeline
+            return Cursor()
+
+        async def update_many(self, q, update):
+            calls["legacy"] = (q, update)
+
+        async def create_index(self, keys, **kw):
+            calls["index"] = (keys, kw)
+
+    db = {tiering_service.TIER_LOG_COLLECTION: Log()}
+    rows = asyncio.run(tier_stats(db, since_seconds=3600))
+    cutoff = calls["pipeline"][0]["$match"]["ts"]["$gte"]
+    assert isinstance(cutoff, datetime)
+    assert abs(datetime.now(timezone.utc) - timedelta(hours=1) - cutoff) < timedelta(seconds=5)
+    assert rows[0]["success_rate"] == 0.75
+
+    asyncio.run(ensure_tier_log_indexes(db))
+    assert calls["legacy"][0] == {"ts": {"$type": "number"}}
+    assert calls["index"] == ([("ts", 1)], {"expireAfterSeconds": 30 * 86400, "name": "ts_ttl"})
@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+
+from timestamp_service import MIGRATIONS_COLLECTION, migrate_collection, range_filter
+
+BSON_TYPES = {"string": str, "double": float, "int": int, "long": int}
+
+
+class Cursor:
+    def __init__(self, docs):
+        self.docs = docs
+
+    def sort(self, field, direction):
+        self.docs.sort(key=lambda d: d[field])
+        return self
+
+    def limit(self, n):
+        self.docs = self.docs[:n]
+        return self
+
+    async def to_list(self, length=None):
+        return self.docs
+
+
+class FakeCollection:
+    """Just enough of find / bulk_write / update_one for the migration"""
+
+    def __init__(self, docs=()):
+        self.docs = {d["_id"]: dict(d) for d in docs}
+        self.writes = 0
+
+    @staticmethod
+    def _type_ok(value, t):
+        return isinstance(value, BSON_TYPES[t]) and not isinstance(value, bool)
+
+    def find(self, q, projection=None):
+        def match(d):
+            if "_id" in q and not d["_id"] > q["_id"]["$gt"]:
+                return False
+            return any(self._type_ok(d.get(f), c["$type"]) for clause in q["$or"] for f, c in clause.items())
+
+        return Cursor([dict(d) for d in self.docs.values() if match(d)])
+
+    async def bulk_write(self, ops, ordered=True):
+        self.writes += 1
+        for op in ops:
+            doc = self.docs[op._filter["_id"]]
+            if all(doc.get(k) == v for k, v in op._filter.items()):
+                doc.update(op._doc["$set"])
+
+    async def find_one(self, q):
+        return self.docs.get(q["_id"])
+
+    async def update_one(self, q, update, upsert=False):
+        self.docs.setdefault(q["_id"], {"_id": q["_id"]}).update(update["$set"])
+
+
+def make_db():
+    docs = [
+        {"_id": 1, "created_at": "2026-01-02T03:04:05", "updated_at": "2026-01-02T03:04:05Z"},
+        {"_id": 2, "created_at": 1767323045.5},
+        {"_id": 3, "created_at": datetime(2026, 1, 1, tzinfo=timezone.utc)},
+        {"_id": 4, "created_at": "garbage"},
+        {"_id": 5, "created_at": True},
+    ]
+    return {"marketing_x": FakeCollection(docs), MIGRATIONS_COLLECTION: FakeCollection()}
+
+
+def test_migration_converts_legacy_values_and_is_idempotent():
+    db = make_db()
+    report = asyncio.run(migrate_collection(db, "marketing_x", batch_size=2))
+    assert (report["converted"], report["skipped"], report["done"]) == (3, 1, True)
+    docs = db["marketing_x"].docs
+    assert docs[1]["created_at"] == datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc) == docs[1]["updated_at"]
+    assert docs[2]["created_at"].year == 2026
+    assert docs[4]["created_at"] == "garbage" and docs[5]["created_at"] is True
+    again = asyncio.run(migrate_collection(db, "marketing_x"))
+    assert again["resumed"] and again["converted"] == 3
+
+
+def test_migration_resumes_after_an_interruption():
+    db = make_db()
+
+    async def crash(name, n, converted):
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        asyncio.run(migrate_collection(db, "marketing_x", batch_size=2, on_batch=crash))
+    assert db[MIGRATIONS_COLLECTION].docs["timestamps:marketing_x"]["last_id"] == 2
+    report = asyncio.run(migrate_collection(db, "marketing_x", batch_size=2))
+    assert report["resumed"] and report["converted"] == 3 and report["skipped"] == 1
+
+
+def test_dry_run_writes_nothing():
+    db = make_db()
+    report = asyncio.run(migrate_collection(db, "marketing_x", dry_run=True))
+    assert report["converted"] == 3 and not report["done"]
+    assert db["marketing_x"].writes == 0 and db[MIGRATIONS_COLLECTION].docs == {}
+
+
+def test_range_filter_matches_both_storage_formats():
+    start = datetime(2026, 10, 1, tzinfo=timezone.utc)
+    q = range_filter("created_at", start)
+    assert q == {"$or": [
+        {"created_at": {"$type": "date", "$gte": start}},
+        {"created_at": {"$type": "string", "$gte": "2026-10-01T00:00:00+00:00"}},
+    ]}
+    assert range_filter("created_at") == {"$or": [{"created_at": {"$type": "date"}}, {"created_at": {"$type": "string"}}]}